@@ -4,6 +4,10 @@ from pemfc_dash.main import app #, celery_app
 server = app.server
 # celery_app = celery_app
 if __name__ == "__main__":
+    from pemfc_dash.dash_app import prepare_cache
+    from pemfc_dash.metrics import reset
+    prepare_cache()
+    reset()
     # [print(num, x) for num, x in enumerate(dl.ID_LIST) ]
     app.run_server(debug=True, use_reloader=False)
     # app.run_server(debug=True, use_reloader=False,
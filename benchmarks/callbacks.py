@@ -0,0 +1,242 @@
+"""
+Benchmarks of the dashboard callbacks with synthetic stack results
+
+    python benchmarks/callbacks.py [--output results.json]
+                                   [--compare baseline.json]
+
+Synthetic results (pemfc_dash.synthetic) are generated for each combination
+of cell count and channel nodes and stored in a FileSystemStore in a
+temporary directory. The graph and table callbacks are timed through the
+functions building their responses (heatmap_figure, line_graph_figure and
+the table columns of list_to_table), i.e. the work of a callback on a
+figure cache miss. Each benchmark is timed over a fixed number of
+repetitions after one warm-up call; every repetition loads its arrays from
+the store again (fresh ResultStore, empty memory cache), as a callback does
+on the first view of a variable. The peak of traced memory allocations and
+the serialized size of the callback response (payload) are recorded in a
+separate call, so they do not distort the timings.
+
+Results are written as JSON; with --compare the median times are compared
+to a previous run of the same benchmarks.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import plotly
+from dash_extensions.enrich import FileSystemStore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pemfc_dash import dash_functions as df, synthetic  # noqa: E402
+from pemfc_dash import main  # noqa: E402
+from pemfc_dash.lru_cache import LRUCache  # noqa: E402
+from pemfc_dash.results import ResultStore  # noqa: E402
+
+CELLS = (1, 10, 100, 500)
+NODES = (10, 100, 1000)
+REPEAT = 5
+
+HEATMAP_VARIABLE = 'Current Density'
+LINE_VARIABLE = ('Cathode Channel Mole Fraction', 'O2')
+
+
+def payload_size(obj):
+    """
+    Size of obj serialized as by Dash for a callback response
+    """
+    return len(json.dumps(obj, cls=plotly.utils.PlotlyJSONEncoder)
+               .encode('utf-8'))
+
+
+def measure(func, repeat=REPEAT):
+    """
+    Median and minimum wall time of func() over repeat calls after one
+    warm-up call, peak traced memory and payload size of its result
+    """
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'median_s': statistics.median(times), 'min_s': min(times),
+            'peak_memory_bytes': peak,
+            'payload_bytes': payload_size(result)
+            if result is not None else 0}
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def fresh_store(cache_dir):
+    return ResultStore(FileSystemStore(cache_dir=cache_dir),
+                       memory_cache=LRUCache(max_entries=256))
+
+
+def result_benchmarks(n_cells, n_nodes, repeat):
+    """
+    Benchmarks depending on the size of the results
+    """
+    results = synthetic.synthetic_results(n_cells, n_nodes)
+    cells = ['Cell {}'.format(num) for num in range(n_cells)]
+    rows = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        store_dir = os.path.join(cache_dir, 'store')
+        round_trip_dir = os.path.join(cache_dir, 'round_trip')
+        fresh_store(store_dir).store('bench', *results)
+
+        def open_results():
+            return fresh_store(store_dir).open('bench')
+
+        def heatmap():
+            return main.heatmap_figure(open_results(), HEATMAP_VARIABLE)
+
+        def line_graph():
+            return main.line_graph_figure(open_results(), *LINE_VARIABLE)
+
+        def table():
+            columns = df.local_table_columns(open_results(),
+                                             *LINE_VARIABLE, cells)
+            return {'columns': df.table_column_specs(columns),
+                    'data': df.columns_to_records(columns)}
+
+        def store_round_trip():
+            store = fresh_store(round_trip_dir)
+            store.store('bench', *results)
+            handle = fresh_store(round_trip_dir).open('bench')
+            handle.manifest
+            for name, var in handle.variables.items():
+                for sub_name in var['sub_variables'] or [None]:
+                    handle.array(name, sub_name)
+
+        benchmarks = {'update_heatmap_graph': heatmap,
+                      'update_line_graph': line_graph,
+                      'list_to_table': table,
+                      'store_round_trip': store_round_trip}
+        for name, func in benchmarks.items():
+            row = {'name': name, 'cells': n_cells, 'nodes': n_nodes,
+                   **measure(func, repeat)}
+            if name == 'store_round_trip':
+                row['payload_bytes'] = directory_size(round_trip_dir)
+            rows.append(row)
+    return rows
+
+
+def input_benchmarks(repeat):
+    """
+    Benchmarks of the input processing, independent of the results
+    """
+    schema = main.INPUT_SCHEMA
+    fields = list(schema.fields.values())
+    values = [field.default for field in fields]
+    ids = [{'type': field.type, 'id': field.id, 'specifier': None}
+           for field in fields]
+    single = [i for i, field in enumerate(fields)
+              if field.type != 'multiinput']
+    multi = [i for i, field in enumerate(fields)
+             if field.type == 'multiinput']
+
+    def process_inputs():
+        return df.process_inputs([values[i] for i in single],
+                                 [values[i] for i in multi],
+                                 [ids[i] for i in single],
+                                 [ids[i] for i in multi])
+
+    def schema_input_data():
+        return schema.input_data(values, ids)
+
+    settings = {}
+    for name, value in schema.values(values, ids).items():
+        section = settings
+        keys = name.split('-')
+        for key in keys[:-1]:
+            section = section.setdefault(key, {})
+        section[keys[-1]] = value
+    contents = 'data:application/json;base64,' + base64.b64encode(
+        json.dumps(settings).encode('utf-8')).decode('ascii')
+
+    def parse_contents():
+        return df.parse_contents(contents, schema.entry_names)
+
+    return [{'name': name, 'cells': None, 'nodes': None,
+             **measure(func, repeat)}
+            for name, func in (('process_inputs', process_inputs),
+                               ('input_schema', schema_input_data),
+                               ('parse_contents', parse_contents))]
+
+
+def environment():
+    return {'python': platform.python_version(),
+            'numpy': np.__version__, 'plotly': plotly.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor()}
+
+
+def compare(rows, baseline):
+    """
+    Print ratio of median times to those of a baseline run
+    """
+    reference = {(row['name'], row['cells'], row['nodes']): row
+                 for row in baseline['benchmarks']}
+    print('\n{:<22} {:>6} {:>6} {:>12} {:>12} {:>8}'.format(
+        'benchmark', 'cells', 'nodes', 'median / ms', 'baseline', 'ratio'))
+    for row in rows:
+        ref = reference.get((row['name'], row['cells'], row['nodes']))
+        if ref is None:
+            continue
+        print('{:<22} {:>6} {:>6} {:>12.2f} {:>12.2f} {:>8.2f}'.format(
+            row['name'], str(row['cells']), str(row['nodes']),
+            row['median_s'] * 1e3, ref['median_s'] * 1e3,
+            row['median_s'] / ref['median_s'] if ref['median_s'] else 0.0))
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cells', type=int, nargs='+', default=CELLS)
+    parser.add_argument('--nodes', type=int, nargs='+', default=NODES)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='JSON file of a previous run')
+    args = parser.parse_args(argv)
+
+    rows = input_benchmarks(args.repeat)
+    for n_cells in args.cells:
+        for n_nodes in args.nodes:
+            rows.extend(result_benchmarks(n_cells, n_nodes, args.repeat))
+
+    print('{:<22} {:>6} {:>6} {:>12} {:>12} {:>14} {:>12}'.format(
+        'benchmark', 'cells', 'nodes', 'median / ms', 'min / ms',
+        'peak mem / kB', 'payload / kB'))
+    for row in rows:
+        print('{:<22} {:>6} {:>6} {:>12.2f} {:>12.2f} {:>14.1f} {:>12.1f}'
+              .format(row['name'], str(row['cells']), str(row['nodes']),
+                      row['median_s'] * 1e3, row['min_s'] * 1e3,
+                      row['peak_memory_bytes'] / 1024,
+                      row['payload_bytes'] / 1024))
+
+    output = {'environment': environment(), 'repeat': args.repeat,
+              'benchmarks': rows}
+    with open(args.output, 'w') as file:
+        json.dump(output, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(rows, json.load(file))
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,416 @@
+"""
+Load test of the dashboard web tier with concurrent simulated users
+
+    PEMFC_DASH_SIMULATION_BACKEND=fake PEMFC_DASH_FAKE_LATENCY=2 \
+        gunicorn -c gunicorn.conf.py
+    python benchmarks/load_test.py http://localhost:8080 --users 20
+
+Each user loads the page and repeats the flow Run Simulation -> select
+other heat map and line graph variables -> export results, with the
+requests a browser would send: the callback graph is read from
+/_dash-dependencies, component values from /_dash-layout, and every change
+of a component value triggers the server-side callbacks depending on it
+(including the cascades between callbacks, the polling of the job interval
+and the proxy outputs of the MultiplexerTransform). Clientside callbacks
+are not executed; the session id is set by the harness.
+
+Run the server with the fake simulation backend (pemfc_dash.fake_solver), so
+the solve time is known and the scaling limits of the web tier can be
+measured in isolation. By default, an input value is perturbed for every
+run, so runs are not served from the simulation cache (--cached to turn
+this off).
+
+Latency is reported per endpoint (callback trigger and output) as
+p50/p95/p99; uses the standard library only.
+"""
+import argparse
+import collections
+import json
+import math
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# namespace of inline clientside callbacks, used by the MultiplexerTransform
+# to copy proxy outputs to their targets
+INLINE_NAMESPACE = '_dashprivate_clientside_funcs'
+WILDCARDS = (['ALL'], ['MATCH'], ['ALLSMALLER'])
+
+
+def id_key(component_id):
+    """
+    String form of a component id as used by Dash in responses
+    """
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, sort_keys=True, separators=(',', ':'))
+    return component_id
+
+
+def parse_outputs(output):
+    """
+    [(id, property), ...] of the output string of a callback
+    """
+    multi = output.startswith('..') and output.endswith('..')
+    parts = output[2:-2].split('...') if multi else [output]
+    outputs = []
+    for part in parts:
+        component_id, prop = part.rsplit('.', 1)
+        if component_id.startswith('{'):
+            component_id = json.loads(component_id)
+        outputs.append((component_id, prop))
+    return outputs, multi
+
+
+def is_pattern(component_id):
+    return isinstance(component_id, dict) \
+        and any(value in WILDCARDS for value in component_id.values())
+
+
+def matches(pattern, component_id):
+    if not isinstance(component_id, dict) \
+            or set(pattern) != set(component_id):
+        return False
+    return all(value in WILDCARDS or component_id[key] == value
+               for key, value in pattern.items())
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    # nearest rank
+    index = max(math.ceil(p / 100.0 * len(ordered)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+class Recorder:
+    """
+    Thread-safe latency and error records per endpoint
+    """
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, error=False):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if error:
+                self.errors[endpoint] += 1
+
+    def summary(self):
+        rows = []
+        with self._lock:
+            for endpoint, values in sorted(self.latencies.items()):
+                rows.append({'endpoint': endpoint, 'count': len(values),
+                             'errors': self.errors[endpoint],
+                             'p50_ms': percentile(values, 50) * 1e3,
+                             'p95_ms': percentile(values, 95) * 1e3,
+                             'p99_ms': percentile(values, 99) * 1e3,
+                             'max_ms': max(values) * 1e3,
+                             'mean_ms': statistics.mean(values) * 1e3})
+        return rows
+
+
+class DashClient:
+    """
+    Minimal emulation of the Dash renderer for one browser session
+    """
+
+    def __init__(self, base_url, recorder, timeout=60.0, poll_interval=1.0):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.recorder = recorder
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.values = {}
+        self.components = {}
+        self.callbacks = []
+        self.proxies = {}
+
+    # --- HTTP ---
+
+    def _request(self, endpoint, path, body=None):
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        request = urllib.request.Request(
+            self.base_url + path, data=data,
+            headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) \
+                    as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as E:
+            status, content = E.code, b''
+        except (urllib.error.URLError, OSError):
+            status, content = None, b''
+        elapsed = time.perf_counter() - start
+        error = status is None or status >= 400
+        self.recorder.record(endpoint, elapsed, error=error)
+        return status, content
+
+    # --- page load ---
+
+    def _walk(self, node):
+        if isinstance(node, list):
+            for child in node:
+                self._walk(child)
+        elif isinstance(node, dict) and 'props' in node:
+            props = node['props']
+            if 'id' in props:
+                key = id_key(props['id'])
+                self.components[key] = props['id']
+                for prop, value in props.items():
+                    if prop != 'id':
+                        self.values[(key, prop)] = value
+            for value in props.values():
+                if isinstance(value, (list, dict)):
+                    self._walk(value)
+
+    def load_page(self):
+        self._request('GET /', '')
+        _, layout = self._request('GET /_dash-layout', '_dash-layout')
+        _, dependencies = self._request('GET /_dash-dependencies',
+                                        '_dash-dependencies')
+        self._walk(json.loads(layout))
+        for callback in json.loads(dependencies):
+            outputs, multi = parse_outputs(callback['output'])
+            callback = {**callback, 'outputs': outputs, 'multi': multi}
+            clientside = callback.get('clientside_function')
+            if clientside is None:
+                self.callbacks.append(callback)
+            elif clientside.get('namespace') == INLINE_NAMESPACE \
+                    and not multi:
+                target = (id_key(outputs[0][0]), outputs[0][1])
+                for inp in callback['inputs']:
+                    self.proxies[(id_key(inp['id']), inp['property'])] = \
+                        target
+        initial = [callback for callback in self.callbacks
+                   if not callback.get('prevent_initial_call')
+                   and not any(is_pattern(inp['id'])
+                               for inp in callback['inputs'])]
+        for callback in initial:
+            self._fire(callback, [])
+
+    # --- callbacks ---
+
+    def _spec(self, spec, with_value=True):
+        component_id, prop = spec['id'], spec['property']
+        if is_pattern(component_id):
+            return [{'id': self.components[key], 'property': prop,
+                     **({'value': self.values.get((key, prop))}
+                        if with_value else {})}
+                    for key in self.components
+                    if matches(component_id, self.components[key])]
+        entry = {'id': component_id, 'property': prop}
+        if with_value:
+            entry['value'] = self.values.get((id_key(component_id), prop))
+        return entry
+
+    def _triggered_by(self, callback, changed):
+        for inp in callback['inputs']:
+            for key, prop in changed:
+                if prop != inp['property']:
+                    continue
+                if is_pattern(inp['id']):
+                    if matches(inp['id'], self.components.get(key)):
+                        return True
+                elif id_key(inp['id']) == key:
+                    return True
+        return False
+
+    def _fire(self, callback, changed):
+        """
+        Send update request of callback and apply its response; returns the
+        changed (id, property) keys
+        """
+        outputs = [self._spec({'id': component_id, 'property': prop},
+                              with_value=False)
+                   for component_id, prop in callback['outputs']]
+        body = {'output': callback['output'],
+                'outputs': outputs if callback['multi'] else outputs[0],
+                'inputs': [self._spec(inp) for inp in callback['inputs']],
+                'state': [self._spec(state)
+                          for state in callback.get('state', [])],
+                'changedPropIds': ['{}.{}'.format(key, prop)
+                                   for key, prop in changed]}
+        first_output = callback['outputs'][0]
+        endpoint = '{} -> {}.{}'.format(
+            ', '.join('{}.{}'.format(key, prop) for key, prop in changed)
+            or 'initial', id_key(first_output[0]), first_output[1])
+        status, content = self._request(endpoint, '_dash-update-component',
+                                        body)
+        if status != 200 or not content:
+            return []
+        response = json.loads(content).get('response', {})
+        if 'props' in response:
+            # single output response of older Dash versions
+            response = {id_key(first_output[0]): response['props']}
+        updated = []
+        for key, props in response.items():
+            for prop, value in props.items():
+                self.values[(key, prop)] = value
+                updated.append((key, prop))
+                target = self.proxies.get((key, prop))
+                if target is not None:
+                    self.values[target] = value
+                    updated.append(target)
+        return updated
+
+    def set_values(self, changes):
+        """
+        Change component values as by user interaction and run all
+        callbacks triggered directly or by their outputs
+        """
+        changed = []
+        for key, value in changes.items():
+            self.values[key] = value
+            changed.append(key)
+        for _ in range(10):
+            if not changed:
+                break
+            updated = []
+            for callback in self.callbacks:
+                if self._triggered_by(callback, changed):
+                    updated.extend(self._fire(callback, changed))
+            changed = updated
+
+    def click(self, button):
+        key = (button, 'n_clicks')
+        self.set_values({key: (self.values.get(key) or 0) + 1})
+
+    # --- flow ---
+
+    def perturb_input(self, rng):
+        """
+        Change a numeric settings input slightly, so the run is not served
+        from the simulation cache
+        """
+        for key, component_id in self.components.items():
+            if not isinstance(component_id, dict) \
+                    or component_id.get('type') != 'input':
+                continue
+            value = self.values.get((key, 'value'))
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(value, bool) or number == 0.0:
+                continue
+            new_value = number * (1.0 + rng.uniform(1e-6, 1e-3))
+            self.values[(key, 'value')] = str(new_value) \
+                if isinstance(value, str) else new_value
+            return
+
+    def run_simulation(self, run_timeout):
+        """
+        Click Run Simulation and poll the job until a new run id arrives;
+        returns True on success
+        """
+        run_key = ('result_data_store', 'data')
+        interval_key = ('job_interval', 'disabled')
+        previous = self.values.get(run_key)
+        # set again by the server when the job has finished or failed
+        self.values[interval_key] = None
+        start = time.perf_counter()
+        self.click('run_button')
+        while self.values.get(run_key) in (None, previous):
+            if self.values.get(interval_key) is True \
+                    or time.perf_counter() - start > run_timeout:
+                self.recorder.record('flow: run simulation',
+                                     time.perf_counter() - start, error=True)
+                return False
+            time.sleep(self.poll_interval)
+            key = ('job_interval', 'n_intervals')
+            self.set_values({key: (self.values.get(key) or 0) + 1})
+        self.recorder.record('flow: run simulation',
+                             time.perf_counter() - start)
+        return True
+
+    def select_other(self, dropdown, rng):
+        options = self.values.get((dropdown, 'options')) or []
+        current = self.values.get((dropdown, 'value'))
+        others = [option['value'] for option in options
+                  if option['value'] != current]
+        if others:
+            self.set_values({(dropdown, 'value'): rng.choice(others)})
+
+
+def user_session(base_url, recorder, args, user):
+    rng = random.Random(args.seed + user)
+    client = DashClient(base_url, recorder, timeout=args.timeout,
+                        poll_interval=args.poll_interval)
+    client.load_page()
+    client.values[('session_id', 'data')] = str(uuid.UUID(
+        int=rng.getrandbits(128)))
+    for _ in range(args.iterations):
+        if not args.cached:
+            client.perturb_input(rng)
+        if not client.run_simulation(args.run_timeout):
+            continue
+        time.sleep(args.think)
+        client.select_other('dropdown_heatmap', rng)
+        client.select_other('dropdown_line', rng)
+        time.sleep(args.think)
+        start = time.perf_counter()
+        client.click('export_results_b')
+        recorder.record('flow: export', time.perf_counter() - start)
+        time.sleep(args.think)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('url', help='base url of the dashboard')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=3,
+                        help='flows per user')
+    parser.add_argument('--ramp-up', type=float, default=5.0,
+                        help='seconds over which users are started')
+    parser.add_argument('--think', type=float, default=0.5,
+                        help='seconds between user actions')
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help='timeout of single requests')
+    parser.add_argument('--run-timeout', type=float, default=600.0)
+    parser.add_argument('--cached', action='store_true',
+                        help='run identical settings (simulation cache)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args(argv)
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        futures = []
+        for user in range(args.users):
+            futures.append(executor.submit(user_session, args.url, recorder,
+                                           args, user))
+            time.sleep(args.ramp_up / max(args.users, 1))
+        for future in futures:
+            future.result()
+    duration = time.perf_counter() - start
+
+    rows = recorder.summary()
+    width = max([len(row['endpoint']) for row in rows] + [8])
+    print('{:<{w}} {:>6} {:>6} {:>9} {:>9} {:>9} {:>9}'.format(
+        'endpoint', 'count', 'errors', 'p50/ms', 'p95/ms', 'p99/ms',
+        'max/ms', w=width))
+    for row in rows:
+        print('{:<{w}} {:>6} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}'
+              .format(row['endpoint'], row['count'], row['errors'],
+                      row['p50_ms'], row['p95_ms'], row['p99_ms'],
+                      row['max_ms'], w=width))
+    print('\n{} users, {} flows each, {:.1f} s'.format(
+        args.users, args.iterations, duration))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'users': args.users, 'iterations': args.iterations,
+                       'duration_s': duration, 'endpoints': rows}, file,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration for the PEMFC dashboard
+
+    gunicorn -c gunicorn.conf.py
+
+The app is created once in the master process (preload_app) and forked into
+the workers; the bind address is taken from the PORT environment variable,
+the number of workers from WEB_CONCURRENCY.
+"""
+import os
+
+wsgi_app = 'pemfc_dash.wsgi:create_server()'
+preload_app = True
+bind = ':' + os.environ.get('PORT', '8080')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = 0
+
+
+def on_starting(server):
+    from pemfc_dash import dash_app, metrics
+    dash_app.prepare_cache()
+    metrics.reset()
@@ -0,0 +1,276 @@
+"""
+Admission control in front of the job queue
+
+Simulation jobs are only passed to the job queue while the number of active
+jobs (queued or running in the job queue) is below MAX_ACTIVE_JOBS and the
+requesting session has less than MAX_SESSION_JOBS active jobs. All other
+jobs wait in an admission queue, which is bounded globally (MAX_QUEUED_JOBS)
+and per session (MAX_SESSION_QUEUED); requests beyond these bounds are
+rejected right away instead of waiting for an unpredictable time.
+
+Waiting jobs are admitted in fair order: the next job is taken from the
+session with the fewest active jobs, jobs of the same session in the order
+of their requests. Waiting jobs are admitted whenever a session polls its
+jobs, so no scheduler process is needed. Jobs not polled for STALE_TIMEOUT
+seconds (closed browser tabs) are dropped from the admission queue.
+
+The sessions waiting for each job (requesting or joining it) are tracked,
+so a job is only cancelled once no other session is waiting for it.
+
+The admission state is kept on the caching backend and changed within a
+lock shared by all workers, so the limits hold across all web workers. It is
+stored without timeout, so the backend must not prune entries on its own
+(see dash_app.create_file_system_store).
+"""
+import copy
+import os
+import time
+
+# Maximum number of jobs queued or running in the job queue
+MAX_ACTIVE_JOBS = int(os.environ.get('PEMFC_DASH_MAX_ACTIVE_JOBS',
+                                     os.cpu_count() or 1))
+# Maximum number of active jobs of a single session
+MAX_SESSION_JOBS = int(os.environ.get('PEMFC_DASH_MAX_SESSION_JOBS', 2))
+# Maximum number of jobs waiting for admission
+MAX_QUEUED_JOBS = int(os.environ.get('PEMFC_DASH_MAX_QUEUED_JOBS', 100))
+# Maximum number of waiting jobs of a single session
+MAX_SESSION_QUEUED = int(os.environ.get('PEMFC_DASH_MAX_SESSION_QUEUED', 50))
+# Seconds after which waiting jobs not polled anymore are dropped
+STALE_TIMEOUT = 30
+
+
+class AdmissionError(Exception):
+    """
+    Raised if a job is rejected; reason is 'queue-full' or 'session-limit'
+    """
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+class AdmissionControl:
+    """
+    Admission queue of jobs identified by their job id; identical jobs
+    requested by several sessions are queued and admitted once
+    """
+
+    prefix = 'admission'
+
+    def __init__(self, job_queue, max_active=MAX_ACTIVE_JOBS,
+                 max_session_active=MAX_SESSION_JOBS,
+                 max_queued=MAX_QUEUED_JOBS,
+                 max_session_queued=MAX_SESSION_QUEUED,
+                 stale_timeout=STALE_TIMEOUT):
+        self.job_queue = job_queue
+        self.backend = job_queue.backend
+        self.max_active = max_active
+        self.max_session_active = max_session_active
+        self.max_queued = max_queued
+        self.max_session_queued = max_session_queued
+        self.stale_timeout = stale_timeout
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def _lock(self):
+        return self.job_queue.locks.lock(self._key('state'))
+
+    def _load_state(self):
+        """
+        State {'active': {job_id: session}, 'waiting': [entry, ...],
+        'waiters': {job_id: [session, ...]}} with waiting entries
+        {'job_id', 'session', 'requested', 'polled'}
+        """
+        state = self.backend.get(self._key('state')) \
+            or {'active': {}, 'waiting': []}
+        state.setdefault('waiters', {})
+        return state
+
+    @staticmethod
+    def _add_waiter(state, job_id, session):
+        waiters = state['waiters'].setdefault(job_id, [])
+        if session not in waiters:
+            waiters.append(session)
+
+    def _store_state(self, state):
+        self.backend.set(self._key('state'), state, timeout=0)
+
+    def _refresh(self, state, now):
+        """
+        Release finished jobs and drop stale waiting jobs
+        """
+        state['active'] = {job_id: session for job_id, session
+                           in state['active'].items()
+                           if self.job_queue.is_active(job_id)}
+        waiting = []
+        for entry in state['waiting']:
+            if now - entry['polled'] > self.stale_timeout:
+                self.backend.delete(self._key(entry['job_id']))
+            else:
+                waiting.append(entry)
+        state['waiting'] = waiting
+        job_ids = set(state['active']).union(
+            entry['job_id'] for entry in waiting)
+        state['waiters'] = {job_id: sessions for job_id, sessions
+                            in state['waiters'].items() if job_id in job_ids}
+
+    @staticmethod
+    def _session_counts(state):
+        counts = {}
+        for session in state['active'].values():
+            counts[session] = counts.get(session, 0) + 1
+        return counts
+
+    def _fair_order(self, state):
+        """
+        Waiting entries in order of admission: the session with the fewest
+        active (and previously ordered) jobs first, ties by request time
+        """
+        counts = self._session_counts(state)
+        remaining = sorted(state['waiting'], key=lambda e: e['requested'])
+        order = []
+        while remaining:
+            entry = min(remaining,
+                        key=lambda e: (counts.get(e['session'], 0),
+                                       e['requested']))
+            remaining.remove(entry)
+            order.append(entry)
+            counts[entry['session']] = counts.get(entry['session'], 0) + 1
+        return order
+
+    def _admit(self, state):
+        """
+        Pass waiting jobs to the job queue as long as there is capacity
+        """
+        counts = self._session_counts(state)
+        for entry in self._fair_order(state):
+            if len(state['active']) >= self.max_active:
+                break
+            session = entry['session']
+            if counts.get(session, 0) >= self.max_session_active:
+                continue
+            payload = self.backend.get(self._key(entry['job_id']))
+            state['waiting'].remove(entry)
+            self.backend.delete(self._key(entry['job_id']))
+            if payload is None:
+                continue
+            func, args = payload
+            self.job_queue.submit(entry['job_id'], func, *args)
+            state['active'][entry['job_id']] = session
+            counts[session] = counts.get(session, 0) + 1
+
+    def _position(self, state, job_id):
+        for position, entry in enumerate(self._fair_order(state), 1):
+            if entry['job_id'] == job_id:
+                return position
+        return None
+
+    def request(self, job_id, session, func, *args):
+        """
+        Submit func(*args) under job_id to the job queue or queue it for
+        admission; returns None if the job has been admitted (or joins an
+        identical active job), otherwise its position in the admission
+        queue. Raises AdmissionError if the job is rejected.
+        """
+        now = time.time()
+        with self._lock():
+            state = self._load_state()
+            self._refresh(state, now)
+            if job_id in state['active'] \
+                    or self.job_queue.is_active(job_id):
+                state['active'].setdefault(job_id, session)
+                self._add_waiter(state, job_id, session)
+                self._store_state(state)
+                return None
+            for entry in state['waiting']:
+                if entry['job_id'] == job_id:
+                    entry['polled'] = now
+                    self._add_waiter(state, job_id, session)
+                    self._store_state(state)
+                    return self._position(state, job_id)
+
+            counts = self._session_counts(state)
+            if not state['waiting'] \
+                    and len(state['active']) < self.max_active \
+                    and counts.get(session, 0) < self.max_session_active:
+                self.job_queue.submit(job_id, func, *args)
+                state['active'][job_id] = session
+                self._add_waiter(state, job_id, session)
+                self._store_state(state)
+                return None
+
+            if len(state['waiting']) >= self.max_queued:
+                raise AdmissionError(
+                    'queue-full', f'All {self.max_queued} places of the '
+                                  f'simulation queue are taken')
+            n_session = sum(1 for entry in state['waiting']
+                            if entry['session'] == session)
+            if n_session >= self.max_session_queued:
+                raise AdmissionError(
+                    'session-limit', f'Only {self.max_session_queued} '
+                                     f'simulations can be queued at once')
+            self.backend.set(self._key(job_id), (func, args), timeout=0)
+            state['waiting'].append({'job_id': job_id, 'session': session,
+                                     'requested': now, 'polled': now})
+            self._add_waiter(state, job_id, session)
+            self._admit(state)
+            self._store_state(state)
+            return self._position(state, job_id)
+
+    def poll(self, job_ids):
+        """
+        Admit waiting jobs if capacity has become available and return the
+        positions {job_id: position} of the given jobs in the admission
+        queue (None for jobs not waiting)
+        """
+        now = time.time()
+        job_ids = set(job_ids)
+        with self._lock():
+            state = self._load_state()
+            previous = copy.deepcopy(state)
+            for entry in state['waiting']:
+                # poll times are only needed to detect stale entries, so
+                # they are written back after a third of the stale timeout
+                if entry['job_id'] in job_ids and \
+                        now - entry['polled'] > self.stale_timeout / 3:
+                    entry['polled'] = now
+            self._refresh(state, now)
+            self._admit(state)
+            if state != previous:
+                self._store_state(state)
+            order = [entry['job_id'] for entry in self._fair_order(state)]
+        return {job_id: order.index(job_id) + 1 if job_id in order else None
+                for job_id in job_ids}
+
+    def cancel(self, job_id, session):
+        """
+        Stop waiting for job on behalf of session; the job is removed from
+        the admission queue if no other session is waiting for it. Returns
+        True if no other session is waiting (so the job may be cancelled in
+        the job queue as well), False if the job is kept for other sessions
+        (which then own it)
+        """
+        with self._lock():
+            state = self._load_state()
+            others = [waiter for waiter in state['waiters'].pop(job_id, [])
+                      if waiter != session]
+            for entry in state['waiting']:
+                if entry['job_id'] == job_id:
+                    if others:
+                        entry['session'] = others[0]
+                    else:
+                        state['waiting'].remove(entry)
+                        self.backend.delete(self._key(job_id))
+                    break
+            if others:
+                state['waiters'][job_id] = others
+                if job_id in state['active']:
+                    state['active'][job_id] = others[0]
+            self._store_state(state)
+        return not others
+
+    def stats(self):
+        state = self._load_state()
+        return {'active': len(state['active']),
+                'waiting': len(state['waiting'])}
@@ -0,0 +1,50 @@
+if (!window.dash_clientside) {
+  window.dash_clientside = {};
+}
+window.dash_clientside.line_graph = {
+  /*
+   * Sets the cells selected in the checklist: all cells for new options
+   * (new line graph) and Select All, none for Clear All and the visible
+   * traces after legend clicks.
+   */
+  update_checklist: function(options, select_all_clicks, clear_all_clicks,
+                             restyle_data, figure) {
+    const no_update = window.dash_clientside.no_update;
+    if (!options) {
+      return no_update;
+    }
+    const triggered = window.dash_clientside.callback_context.triggered.map(
+      t => t.prop_id);
+    if (triggered.includes('clear_all_button.n_clicks')) {
+      return [];
+    }
+    if (triggered.includes('line_graph.restyleData')) {
+      if (!figure || !restyle_data || !restyle_data[0].visible) {
+        return no_update;
+      }
+      const update = restyle_data[0].visible;
+      const indices = restyle_data[1];
+      const state = figure.data.map(trace => trace.visible !== 'legendonly');
+      indices.forEach(function(index, i) {
+        state[index] = update[i % update.length] === true;
+      });
+      return figure.data.filter((trace, i) => state[i]).map(
+        trace => trace.name);
+    }
+    return options.map(option => option.value);
+  },
+  /*
+   * Updates only the visibility of the line graph traces in the browser to
+   * the cells selected in the checklist, the trace data is never sent back
+   * to the server.
+   */
+  update_visibility: function(checklist, figure) {
+    if (!figure) {
+      return window.dash_clientside.no_update;
+    }
+    const visible = checklist || [];
+    const data = figure.data.map(trace => Object.assign({}, trace, {
+      visible: visible.includes(trace.name) ? true : 'legendonly'}));
+    return Object.assign({}, figure, {data: data});
+  }
+};
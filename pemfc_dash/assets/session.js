@@ -0,0 +1,19 @@
+if (!window.dash_clientside) {
+  window.dash_clientside = {};
+}
+window.dash_clientside.session = {
+  /*
+   * Creates a random id for the browser session once; the id is kept in
+   * session storage and identifies the session for the admission control
+   * of simulation jobs (see pemfc_dash.admission).
+   */
+  init_id: function(timestamp, session_id) {
+    if (session_id) {
+      return window.dash_clientside.no_update;
+    }
+    if (window.crypto && window.crypto.randomUUID) {
+      return window.crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+  }
+};
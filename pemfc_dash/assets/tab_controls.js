@@ -0,0 +1,40 @@
+if (!window.dash_clientside) {
+  window.dash_clientside = {};
+}
+window.dash_clientside.tab_controls = {
+  /*
+   * Shows the containers of the options chosen in the 'dropdown_activate'
+   * dropdowns and hides all others; maps.visibility relates each container
+   * to its option (see dash_layout.control_maps).
+   */
+  update_visibility: function(values, container_ids, maps) {
+    const no_update = window.dash_clientside.no_update;
+    const chosen = new Set(values);
+    return container_ids.map(function(container_id) {
+      const option = maps.visibility[container_id.id];
+      if (option === undefined) {
+        return no_update;
+      }
+      return chosen.has(option) ? null : {'display': 'none'};
+    });
+  },
+
+  /*
+   * Enables the base width inputs only if their dropdown (maps.disabled)
+   * is set to maps.enable_value.
+   */
+  update_disabled: function(values, source_ids, target_ids, maps) {
+    const no_update = window.dash_clientside.no_update;
+    const sources = {};
+    source_ids.forEach(function(source_id, i) {
+      sources[source_id.id] = values[i];
+    });
+    return target_ids.map(function(target_id) {
+      const source = maps.disabled[target_id.id];
+      if (source === undefined || !(source in sources)) {
+        return no_update;
+      }
+      return sources[source] !== maps.enable_value;
+    });
+  }
+};
@@ -1,13 +1,30 @@
 
 # import dash_bootstrap_components as dbc
-# from dash.long_callback import CeleryLongCallbackManager, \
-#     DiskcacheLongCallbackManager
 import os
 import redis
 import shutil
+import threading
 from dash_extensions.enrich import DashProxy, MultiplexerTransform, \
     ServersideOutputTransform, RedisStore, FileSystemStore
 
+from pemfc_dash.results import ResultStore
+from pemfc_dash.figure_cache import FigureCache
+from pemfc_dash.simulation_cache import SimulationCache
+from pemfc_dash.jobs import LocalJobQueue, RedisJobQueue
+from pemfc_dash.admission import AdmissionControl
+from pemfc_dash.locks import FileLocks, RedisLocks
+from pemfc_dash.metrics import CallbackMetrics
+from pemfc_dash import profiling
+
+try:
+    import pemfc_dash.redis_credentials as rc
+except ImportError:
+    rc = None
+
+CACHE_DIR = '/temp/file_system_store'
+# lock files next to (not inside) the file system cache
+LOCK_DIR = '/temp/file_system_store_locks'
+
 
 def clear_cache(path):
     if os.path.exists(path):
@@ -15,37 +32,118 @@ def clear_cache(path):
     os.makedirs(path)
 
 
-try:
-    import pemfc_dash.redis_credentials as rc
-    caching_backend = RedisStore(
+def prepare_cache():
+    """
+    Start with an empty file system cache if no Redis server is configured;
+    called once on startup (gunicorn master or development server) instead
+    of on import, so workers do not wipe each others cache
+    """
+    if rc is None:
+        clear_cache(CACHE_DIR)
+
+
+class ProcessLocal:
+    """
+    Proxy to an object created on first use in each process, so connections
+    are never shared between a preloading gunicorn master and its forked
+    workers
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._pid = None
+        self._obj = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._obj = self._factory()
+                    self._pid = pid
+        return self._obj
+
+    def __getstate__(self):
+        # only the factory is passed on to other processes (job workers)
+        return {'_factory': self._factory}
+
+    def __setstate__(self, state):
+        self.__init__(state['_factory'])
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self._get(), name)
+
+
+def create_file_system_store():
+    """
+    File system store without a file count threshold: cachelib would
+    otherwise prune files (control state first, then single files of live
+    runs) once the threshold is exceeded; the disk use of results is bounded
+    by the eviction of the simulation cache instead
+    """
+    return FileSystemStore(cache_dir=CACHE_DIR, threshold=0)
+
+
+def create_caching_backend():
+    """
+    Redis store if configured and reachable, otherwise file system store;
+    load and store times are recorded by the callback metrics
+    """
+    if rc is None:
+        return metrics.instrument_backend(create_file_system_store())
+    backend = RedisStore(
         host=rc.HOST_NAME,
         password=rc.PASSWORD,
         port=rc.PORT,
         default_timeout=900)
     try:
-        caching_backend.delete('test')
+        backend.delete('test')
     except (redis.exceptions.ConnectionError, ConnectionRefusedError) as E:
-        caching_backend = FileSystemStore(cache_dir='/temp/file_system_store')
+        backend = create_file_system_store()
     except (redis.exceptions.ResponseError, redis.exceptions.RedisError):
         pass
-except ImportError:
-    tmpdir = os.path.join(os.getcwd(), '/temp/file_system_store')
-    clear_cache(tmpdir)
-    caching_backend = FileSystemStore(cache_dir=tmpdir)
+    return metrics.instrument_backend(backend)
+
 
+def create_job_locks():
+    """
+    Redis locks if results are kept on Redis, otherwise file locks shared by
+    the workers of this node
+    """
+    if isinstance(caching_backend._get(), RedisStore):
+        return RedisLocks(redis.Redis(host=rc.HOST_NAME, password=rc.PASSWORD,
+                                      port=rc.PORT))
+    return FileLocks(LOCK_DIR)
 
-# from celery import Celery
-# import diskcache
 
-# cache = diskcache.Cache("./cache")
-# long_callback_manager = DiskcacheLongCallbackManager(cache)
+# Timing and payload size of all callbacks, served on /metrics
+metrics = CallbackMetrics()
+caching_backend = ProcessLocal(create_caching_backend)
+job_locks = ProcessLocal(create_job_locks)
 
-# celery_app = Celery(
-#     __name__, broker="redis://localhost:6379/0",
-#     backend="redis://localhost:6379/1")
-# long_callback_manager = CeleryLongCallbackManager(celery_app)
+# Stores local results array by array for callbacks to load only what they
+# need; results are kept by their settings to skip repeated identical runs
+result_store = ResultStore(caching_backend)
+simulation_cache = SimulationCache(result_store, locks=job_locks)
+# Figures of viewed variables are kept for switching back to them
+figure_cache = FigureCache()
 
-# app = dash.Dash(__name__, long_callback_manager=long_callback_manager)
+# Simulations run in the background instead of the web worker; the Redis
+# backed queue requires separate workers (python -m pemfc_dash.jobs)
+if os.environ.get('PEMFC_DASH_JOB_QUEUE', 'local') == 'redis':
+    job_queue = RedisJobQueue(
+        caching_backend,
+        ProcessLocal(lambda: redis.Redis(host=rc.HOST_NAME,
+                                         password=rc.PASSWORD,
+                                         port=rc.PORT)),
+        locks=job_locks)
+else:
+    job_queue = LocalJobQueue(caching_backend, locks=job_locks)
+# Bounds the number of active and waiting jobs globally and per session
+admission = AdmissionControl(job_queue)
 
 dbc_css = ("https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates@V1.0.2/dbc.min.css")
 bs_4_css = ('https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0-alpha.6/css'
@@ -57,9 +155,48 @@ app = DashProxy(__name__, external_stylesheets=external_stylesheets,
                 suppress_callback_exceptions=True,
                 transforms=[MultiplexerTransform(),
                             ServersideOutputTransform(backend=caching_backend)])
+metrics.instrument(app)
+profiling.add_admin_login(app.server)
+
+
+def collect_job_metrics():
+    """
+    Gauges of the job admission and the simulation cache shared by all
+    workers
+    """
+    stats = admission.stats()
+    return [('pemfc_dash_jobs_active', 'gauge',
+             'Jobs queued or running in the job queue',
+             [({}, stats['active'])]),
+            ('pemfc_dash_jobs_waiting', 'gauge',
+             'Jobs waiting for admission', [({}, stats['waiting'])]),
+            ('pemfc_dash_cached_results', 'gauge',
+             'Results in the simulation cache',
+             [({}, simulation_cache.stats()['entries'])])]
+
+
+metrics.add_collector(collect_job_metrics)
+metrics.add_process_counter('pemfc_dash_simulation_cache_hits_total',
+                            'Simulation cache lookups finding a result',
+                            lambda: simulation_cache.hits)
+metrics.add_process_counter('pemfc_dash_simulation_cache_misses_total',
+                            'Simulation cache lookups without result',
+                            lambda: simulation_cache.misses)
+
+
+def figure_cache_counter(kind, field):
+    return lambda: figure_cache.stats()[kind][field]
+
+
+for kind, description in (('hit', 'returned from the figure cache'),
+                          ('build', 'built on figure cache misses')):
+    metrics.add_process_counter(f'pemfc_dash_figure_cache_{kind}s_total',
+                                f'Figures {description}',
+                                figure_cache_counter(kind, 'count'))
+    metrics.add_process_counter(
+        f'pemfc_dash_figure_cache_{kind}_seconds_total',
+        f'Time spent on figures {description}',
+        figure_cache_counter(kind, 'total_time'))
 
-# app = dash.Dash(__name__, external_stylesheets=external_stylesheets,
-#                 long_callback_manager=long_callback_manager,
-#                 suppress_callback_exceptions=True)
 # app = dash.Dash(__name__, suppress_callback_exceptions=True)
 # server = app.server
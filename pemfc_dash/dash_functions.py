@@ -2,9 +2,11 @@ from functools import wraps
 from flask_caching import Cache
 import base64
 import io
+import re
 import json
 import copy
 import collections
+import numpy as np
 from glom import glom
 
 from . import dash_layout as dl
@@ -59,19 +61,26 @@ def multi_inputs(dicts):
     return dict_list
 
 
-def parse_contents(contents):
+def parse_contents(contents, names=None):
     """
     Used in parsing contents from JSON file and process parsed data
     for each components
     (parsed data has to be in the order of initialised Dash IDs)
+
+    names: settings names to look up (e.g. InputSchema.entry_names),
+           derived from dl.ID_LIST if not given
     """
     content_type, content_string = contents.split(',')
 
     decoded = base64.b64decode(content_string)
     j_file = json.load(io.StringIO(decoded.decode('utf-8')))
 
-    name_lists = [ids['id'].split('-') if ids['id'][-1:].isnumeric() is False
-                  else ids['id'][:-2].split('-') for ids in dl.ID_LIST]
+    if names is None:
+        name_lists = [ids['id'].split('-') if ids['id'][-1:].isnumeric()
+                      is False else ids['id'][:-2].split('-')
+                      for ids in dl.ID_LIST]
+    else:
+        name_lists = [name.split('-') for name in names]
     error_list = []
     js_out = {}
     for n in name_lists:
@@ -125,6 +134,86 @@ def process_inputs(inputs, multiinputs, id_inputs, id_multiinputs):
     return new_dict_data
 
 
+def cell_numbers(cell_names):
+    """
+    Sorted cell numbers from checklist values ('Cell 0', 'Cell 1', ...)
+    """
+    return sorted(int(re.sub(r'[^0-9]', '', name)) for name in cell_names)
+
+
+def local_table_columns(results, var_key, sub_key, cell_names, suffix='',
+                        x_key='Channel Location'):
+    """
+    Table model of a local variable for the given cells, built column-wise
+    from the stored arrays: {x_key: x-values, 'Cell 0' + suffix: values, ...}
+
+    results: ResultHandle of the run
+    """
+    # cell-centred coordinates, precomputed at store time
+    xvalues = results.axes(x_key)[1]
+    yvalues = np.asarray(results.array(var_key, sub_key))
+    if yvalues.ndim == 1:
+        yvalues = yvalues[np.newaxis]
+    n = min(len(xvalues), yvalues.shape[-1])
+    columns = {x_key: xvalues[:n]}
+    for num in cell_numbers(cell_names):
+        columns['Cell {}'.format(num) + suffix] = yvalues[num, :n]
+    return columns
+
+
+def table_column_specs(columns, x_key='Channel Location'):
+    """
+    DataTable column definitions for a table model
+    """
+    return [{'id': x_key, 'name': x_key, 'deletable': True}
+            if col_id == x_key else
+            {'deletable': True, 'renamable': True, 'selectable': True,
+             'name': col_id.split('-')[0], 'id': col_id}
+            for col_id in columns]
+
+
+def columns_to_records(columns):
+    """
+    Convert table model to the list of row dictionaries used by DataTable;
+    missing values (NaN) are converted to None
+    """
+    keys = list(columns)
+    arrays = []
+    for key in keys:
+        array = np.asarray(columns[key], dtype=float)
+        arrays.append(np.where(np.isnan(array), None, array).tolist())
+    return [dict(zip(keys, row)) for row in zip(*arrays)]
+
+
+def records_to_columns(records, keys):
+    """
+    Convert DataTable rows back to a table model
+    """
+    return {key: np.array([np.nan if row.get(key) is None else row[key]
+                           for row in records], dtype=float)
+            for key in keys}
+
+
+def merge_columns(left, right, on='Channel Location'):
+    """
+    Outer join of two table models on column 'on'; rows missing in one of
+    the models are filled with NaN
+    """
+    x_left = np.asarray(left[on], dtype=float)
+    x_right = np.asarray(right[on], dtype=float)
+    xvalues = np.union1d(x_left, x_right)
+    merged = {on: xvalues}
+    for model, x_model in ((left, x_left), (right, x_right)):
+        positions = np.searchsorted(xvalues, x_model)
+        for key, values in model.items():
+            if key == on:
+                continue
+            column = np.full(len(xvalues), np.nan)
+            column[positions] = values
+            merged[key] = column
+    return merged
+
+
 def dict_inputs(value='', ids=''):
     """
     DEPRECATED
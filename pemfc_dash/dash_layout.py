@@ -1,7 +1,9 @@
 import dash_bootstrap_components as dbc
 from dash import html
 from dash import dcc
+from dash import dash_table
 import copy
+import threading
 
 ID_LIST = []  # Keep track with generated IDs
 CONTAINER_LIST = []
@@ -9,6 +11,10 @@ CONTAINER_LIST = []
 
 # Keep track with generated container IDs (generated at  frame level)
 
+# Rendered tab contents (memoized per process, see def tab_content)
+_TAB_CONTENTS = {}
+_TAB_LOCK = threading.Lock()
+
 
 def make_list(lst) -> list:
     """
@@ -20,7 +26,7 @@ def make_list(lst) -> list:
         return lst
 
 
-def tab_container(tab_dicts: list) -> dcc.Tabs:
+def tab_container(tab_dicts: list, lazy=False) -> dcc.Tabs:
     """
      ToDo:
      - documentation
@@ -28,10 +34,18 @@ def tab_container(tab_dicts: list) -> dcc.Tabs:
 
      Input:
         gui_input.main_frame_dicts from pemfc_gui.input
+        lazy: only the first tab is rendered, all other tabs contain an
+              empty container {'type': 'tab_content', 'id': 'tab<n>'}, which
+              is filled by a callback when the tab is selected first
     """
 
+    def content(n):
+        if not lazy or n == 0:
+            return tab_content(tab_dicts, n)
+        return html.Div(id={'type': 'tab_content', 'id': f'tab{n + 1}'})
+
     tabs = dcc.Tabs(
-        [dcc.Tab(html.Div(frame(tabdict)),
+        [dcc.Tab(content(n),
                  label=tabdict['title'],
                  value=f"tab{n + 1}",
                  className='custom-tab',
@@ -44,6 +58,112 @@ def tab_container(tab_dicts: list) -> dcc.Tabs:
     return tabs
 
 
+def tab_content(tab_dicts: list, n: int) -> html.Div:
+    """
+    Component tree of tab n, rendered only once per process
+    """
+    key = (id(tab_dicts), n)
+    with _TAB_LOCK:
+        if key not in _TAB_CONTENTS:
+            _TAB_CONTENTS[key] = html.Div(frame(tab_dicts[n]))
+        return _TAB_CONTENTS[key]
+
+
+def set_input_values(component, values):
+    """
+    Copy of a component tree with the values of the input components given
+    by {input id: value} changed
+    """
+    component = copy.deepcopy(component)
+    stack = [component]
+    while stack:
+        comp = stack.pop()
+        comp_id = getattr(comp, 'id', None)
+        if isinstance(comp_id, dict) and comp_id.get('id') in values:
+            comp.value = values[comp_id['id']]
+        children = getattr(comp, 'children', None)
+        if isinstance(children, (list, tuple)):
+            stack.extend(children)
+        elif hasattr(children, 'to_plotly_json'):
+            stack.append(children)
+    return component
+
+
+def _walk_layout(frame_dict):
+    """
+    Frame and widget dicts in the order of the rendered components (see
+    def frame, sub_frame and implement_widget)
+    """
+    if 'type' in frame_dict:
+        yield frame_dict
+        return
+    yield frame_dict
+    if 'sub_frame_dicts' in frame_dict:
+        for sub in frame_dict['sub_frame_dicts']:
+            yield from _walk_layout(sub)
+    elif 'widget_dicts' in frame_dict:
+        for widget in label_gui_to_dash(frame_dict['widget_dicts']):
+            yield from _walk_layout(widget)
+
+
+def _widget_ids(widget):
+    """
+    Dash ids of the input components created by row_input for widget
+    """
+    ids = widget['sim_name'] if 'sim_name' in widget else widget.get('ids', '')
+    dict_ids, id_list, _ = id_val_gui_to_dash(
+        widget.get('label', ''), ids, widget.get('value', ''),
+        widget.get('number'), widget['type'])
+    return list(dict_ids) if widget['type'] == 'EntrySet' else id_list
+
+
+def control_maps(tab_dicts: list) -> dict:
+    """
+    Maps for the clientside callbacks of the settings tabs (see
+    assets/tab_controls.js), precomputed from the widget dicts of all tabs:
+        visibility: {container id: option of a 'dropdown_activate' dropdown
+                     showing the container}
+        disabled: {id of 'disable_basewidth' input: id of the
+                   'dropdown_activate_basewidth' dropdown enabling it}
+        enable_value: dropdown value enabling the base width inputs
+    Containers and options as well as inputs and dropdowns are related by
+    their position in the layout.
+    """
+    containers, options, targets, sources = [], [], [], []
+    for tab_dict in tab_dicts:
+        for item in _walk_layout(tab_dict):
+            spec = item.get('specifier')
+            if 'type' not in item:
+                if spec == 'visibility' and 'widget_dicts' in item \
+                        and 'sub_frame_dicts' not in item:
+                    containers.append(item['title'])
+                continue
+            if item['type'] not in ('EntrySet', 'ComboboxSet',
+                                    'CheckButtonSet', 'Label'):
+                continue
+            ids = _widget_ids(item) if item['type'] != 'Label' else []
+            if spec == 'visibility':
+                container_ids = item['sim_name'] if 'sim_name' in item \
+                    else item.get('ids', '')
+                _, id_list, _ = id_val_gui_to_dash(
+                    item.get('label', ''), container_ids,
+                    item.get('value', ''), item.get('number'), item['type'])
+                if id_list:
+                    containers.append(id_list[0])
+            elif spec == 'dropdown_activate':
+                dd_options = item.get('options') or \
+                    [{'label': val, 'value': val} for val in item['value']]
+                options.extend(opt['value'] for _ in ids
+                               for opt in dd_options)
+            elif spec == 'disable_basewidth':
+                targets.extend(ids)
+            elif spec == 'dropdown_activate_basewidth':
+                sources.extend(ids)
+    return {'visibility': dict(zip(containers, options)),
+            'disabled': dict(zip(targets, sources)),
+            'enable_value': 'trapezoidal'}
+
+
 def val_container(ids, types='output'):
     row_break = html.Div(className='row-break')
     div_per_row = int(len(ids) / 2)
@@ -447,6 +567,137 @@ def row_input(label='', ids='', value='', type='', dimensions='', options='',
     return inputs
 
 
+def sweep_settings_container(id_list):
+    """
+    Settings for parameter sweeps: selection of the varied inputs and a table
+    with range and number of steps for each of them
+
+    id_list: list of input IDs ({'type': ..., 'id': ...}) available for
+             the sweep
+    """
+    options = [{'label': id_l['id'], 'value': id_l['id']} for id_l in id_list
+               if id_l['type'] == 'input']
+    columns = [{'name': 'Parameter', 'id': 'id', 'editable': False},
+               {'name': 'Start', 'id': 'start', 'type': 'numeric'},
+               {'name': 'Stop', 'id': 'stop', 'type': 'numeric'},
+               {'name': 'Steps', 'id': 'steps', 'type': 'numeric'}]
+    return html.Div(
+        [html.Div('Parameter Sweep', className='title'),
+         dcc.Dropdown(id='sweep_parameters', options=options, multi=True,
+                      placeholder='Select Parameters',
+                      className='dropdown_input'),
+         dash_table.DataTable(id='sweep_parameter_table', columns=columns,
+                              data=[], editable=True),
+         html.Div(
+             [html.Button('Run Sweep', id='sweep_button',
+                          className='settings_button'),
+              html.Div(id='sweep_status', style={'margin-left': '10px'})],
+             style={'display': 'flex', 'align-items': 'center',
+                    'margin-top': '5px'}),
+         dcc.Store(id='sweep_jobs'),
+         dcc.Interval(id='sweep_interval', interval=1000, disabled=True)],
+        id='sweep_setting', className='pretty_container neat-spacing')
+
+
+def sweep_results_container():
+    """
+    Table and plot of global results for each point of a parameter sweep
+    """
+    return html.Div(
+        [html.Div('Parameter Sweep Results', className='title'),
+         dcc.Store(id='sweep_results'),
+         dcc.Dropdown(id='dropdown_sweep', placeholder='Select Variable',
+                      className='dropdown_input'),
+         dcc.Graph(id='sweep_graph'),
+         html.Div(dash_table.DataTable(id='sweep_table',
+                                       export_format='csv'),
+                  style={'overflow': 'auto'})],
+        id='sweep_container', className='pretty_container',
+        style={'display': 'none'})
+
+
+def export_container(format_options):
+    """
+    Controls for the server-side export of local results; exports the
+    checked cells of the line graph or all cells if none are checked
+    """
+    return html.Div(
+        [dcc.Dropdown(id='export_variables', multi=True,
+                      placeholder='All Variables',
+                      className='dropdown_input',
+                      style={'min-width': '300px'}),
+         dcc.Dropdown(id='export_format', options=format_options,
+                      value=format_options[0]['value'], clearable=False,
+                      className='dropdown_input'),
+         html.Button('Export Results', id='export_results_b',
+                     className='local_data_buttons'),
+         dcc.Download(id='results_download')],
+        style={'display': 'flex', 'flex-wrap': 'wrap',
+               'margin-bottom': '5px'})
+
+
+def progress_container():
+    """
+    Live convergence plot of the running simulation, hidden while no
+    simulation is running
+    """
+    return html.Div(
+        [html.Div(id='progress_text', style={'margin-top': '5px'}),
+         dcc.Graph(id='progress_graph', style={'height': '200px'},
+                   config={'displayModeBar': False})],
+        id='progress_container', style={'display': 'none'})
+
+
+def admin_container():
+    """
+    Profiling controls for admins, hidden unless the request carries the
+    admin cookie set by the /admin login (see profiling.is_admin)
+    """
+    return html.Div(
+        [dcc.Checklist(id='profile_run',
+                       options=[{'label': 'Profile this run', 'value': 1}],
+                       value=[]),
+         html.Button('Download Profile', id='profile_download_b',
+                     className='settings_button'),
+         dcc.Download(id='profile_download')],
+        id='admin_container',
+        style={'display': 'none'})
+
+
+def job_status_display(status):
+    """
+    Status line shown below the settings buttons while a simulation job is
+    queued or running, or after it has been stopped
+    """
+    if status is None:
+        return None
+    if status['state'] == 'waiting':
+        text = 'Waiting for free simulation slot (position {})...'.format(
+            status['position'])
+    else:
+        text = {'queued': 'Simulation queued...',
+                'running': 'Simulation running...'}.get(status['state'])
+    if status['state'] == 'cancelled':
+        return html.Div('Simulation stopped')
+    if text is None:
+        return None
+    return [dbc.Spinner(size='sm'),
+            html.Div(text, style={'margin-left': '10px'})]
+
+
+def sweep_status_display(n_finished, n_total, stopped=False):
+    """
+    Progress of a parameter sweep shown next to the Run Sweep button
+    """
+    text = f'{n_finished} / {n_total} points finished'
+    if stopped:
+        return 'Sweep stopped, ' + text
+    if n_finished < n_total:
+        return [dbc.Spinner(size='sm'),
+                html.Div(text, style={'margin-left': '10px'})]
+    return text
+
+
 graph_font_props = {'small': {'size': 12, 'color': 'black', 'family': 'Arial'},
                     'medium': {'size': 16, 'color': 'black', 'family': 'Arial'},
                     'large': {'size': 20, 'color': 'black', 'family': 'Arial'}}
@@ -31,6 +31,37 @@ def modal_process(error_type, error=''):
                           "please check inputs!"),
                  html.Div(style=space),
                  html.Div(error, style=space)]},
+         'sweep-error':
+            {'title': 'Parameter Sweep Error',
+             'body':
+                [html.Div("Parameter sweep could not be started, please "
+                          "check start, stop and number of steps of each "
+                          "parameter!"),
+                 html.Div(style=space),
+                 html.Div(error, style=space)]},
+         'queued':
+            {'title': 'Simulation Queued',
+             'body':
+                [html.Div("All simulation slots are busy at the moment, "
+                          "your simulation has been queued."),
+                 html.Div(style=space),
+                 html.Div("Position in queue: {}".format(error),
+                          style={**space, **bold}),
+                 html.Div("The simulation starts automatically, please keep "
+                          "this page open!", style=space)]},
+         'server-busy':
+            {'title': 'Server Busy',
+             'body':
+                [html.Div("The simulation could not be queued, please try "
+                          "again later!"),
+                 html.Div(style=space),
+                 html.Div(error, style=space)]},
+         'results-expired':
+            {'title': 'Results Expired',
+             'body':
+                [html.Div("The results of this simulation have been removed "
+                          "from the server, please run the simulation "
+                          "again!")]},
          'loaded':
             {'title': 'JSON file has been loaded!',
              'body':
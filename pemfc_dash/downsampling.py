@@ -0,0 +1,94 @@
+"""
+Level-of-detail reduction of local results for plotting
+
+Line traces are decimated by keeping minimum and maximum of each bucket, so
+peaks stay visible; surfaces are reduced by averaging blocks of neighbouring
+cells and channel nodes. Both are bounded by a point budget, so the render
+cost of a figure does not grow with the size of the stack model.
+"""
+import os
+
+import numpy as np
+
+# Maximum number of points of all traces of a line graph
+LINE_POINT_BUDGET = int(os.environ.get('PEMFC_DASH_LINE_POINTS', 20000))
+# Minimum number of points per trace, regardless of the number of traces
+MIN_TRACE_POINTS = 100
+# Maximum number of grid points of a surface plot
+SURFACE_POINT_BUDGET = int(os.environ.get('PEMFC_DASH_SURFACE_POINTS', 40000))
+
+
+def trace_point_budget(n_traces, budget=LINE_POINT_BUDGET):
+    return max(budget // max(n_traces, 1), MIN_TRACE_POINTS)
+
+
+def minmax_indices(y, max_points):
+    """
+    Indices of the minimum and maximum of max_points / 2 buckets of y,
+    including first and last point
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    n_buckets = max(max_points // 2, 1)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    indices = [0, n - 1]
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop > start:
+            segment = y[start:stop]
+            indices.append(start + int(np.argmin(segment)))
+            indices.append(start + int(np.argmax(segment)))
+    return np.unique(indices)
+
+
+def decimate_line(x, y, max_points, x_range=None):
+    """
+    Min/max preserving decimation of a single trace; with x_range only the
+    points within this range (and their direct neighbours) are kept, so
+    zooming in refines the trace up to full resolution
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x_range is not None:
+        lower, upper = sorted(x_range)
+        inside = np.nonzero((x >= lower) & (x <= upper))[0]
+        if len(inside):
+            start = max(inside[0] - 1, 0)
+            stop = min(inside[-1] + 2, len(x))
+            x, y = x[start:stop], y[start:stop]
+    indices = minmax_indices(y, max_points)
+    return x[indices], y[indices]
+
+
+def _block_mean(values, factor, axis):
+    """
+    Average consecutive blocks of size factor along axis; a shorter last
+    block is averaged over its actual size
+    """
+    if factor <= 1:
+        return values
+    n = values.shape[axis]
+    starts = np.arange(0, n, factor)
+    sums = np.add.reduceat(values, starts, axis=axis)
+    counts = np.diff(np.append(starts, n))
+    shape = [1] * values.ndim
+    shape[axis] = len(counts)
+    return sums / counts.reshape(shape)
+
+
+def block_average_surface(x, y, z, max_points=SURFACE_POINT_BUDGET):
+    """
+    Reduce surface z (shape: len(y) x len(x)) and its axes by block
+    averaging, until the number of grid points fits into max_points
+    """
+    z = np.asarray(z, dtype=float)
+    if z.ndim != 2 or z.size <= max_points:
+        return x, y, z
+    n_y, n_x = z.shape
+    factor = int(np.ceil(np.sqrt(z.size / max_points)))
+    factor_y = min(factor, n_y)
+    factor_x = int(np.ceil(z.size / factor_y / max_points))
+    z = _block_mean(_block_mean(z, factor_y, 0), factor_x, 1)
+    x = _block_mean(np.asarray(x, dtype=float), factor_x, 0)
+    y = _block_mean(np.asarray(y, dtype=float), factor_y, 0)
+    return x, y, z
@@ -0,0 +1,167 @@
+"""
+Server-side export of stored local results as CSV, compressed NPZ or Parquet
+
+All formats are written directly from the arrays in the ResultStore, so
+large stacks never pass through the DataTable state of the browser. CSV
+and Parquet are written in long format with one row per value (Variable,
+Units, Cell, Node, Channel Location, Value; Parquet keeps the units in its
+metadata), so files load directly with pandas.read_csv/read_parquet.
+Parquet export requires the optional pyarrow package.
+"""
+import io
+import json
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FORMATS = {'csv': 'CSV', 'npz': 'NPZ (compressed)', 'parquet': 'Parquet'}
+
+X_KEY = 'Channel Location'
+
+
+def available_formats():
+    return [{'label': label, 'value': value} for value, label
+            in FORMATS.items() if value != 'parquet' or pa is not None]
+
+
+def iter_variables(results, names=None, cells=None):
+    """
+    Yield (label, units, array, xkey) of the selected local variables and
+    all their sub variables; arrays with one row per cell are reduced to the
+    given cell numbers. Names are variable names (exporting all their sub
+    variables) or tuples (name, sub_name) of single sub variables.
+    """
+    variables = results.variables
+    for name in names or variables:
+        name, sub_names = name if isinstance(name, tuple) else (name, None)
+        var = variables[name]
+        if var['sub_variables'] is None:
+            entries = [(name, None, var)]
+        else:
+            entries = [(name + ' - ' + sub_name, sub_name, sub_var)
+                       for sub_name, sub_var in var['sub_variables'].items()
+                       if sub_names is None or sub_name == sub_names]
+        for label, sub_name, entry in entries:
+            if entry['dtype'] == 'object':
+                continue
+            array = results.array(name, sub_name)
+            if cells is not None and array.ndim > 1:
+                array = array[[c for c in cells if c < array.shape[0]]]
+            yield label, entry['units'], array, var['xkey']
+
+
+def iter_long(results, names=None, cells=None):
+    """
+    Yield (label, units, cell ids, node numbers, channel locations, values)
+    of the selected variables in long format (one entry per value);
+    channel locations are None for variables not given over the channel
+    """
+    for label, units, array, xkey in iter_variables(results, names, cells):
+        rows = np.atleast_2d(array)
+        cell_ids = np.asarray(cells if cells is not None and array.ndim > 1
+                              else range(len(rows)))
+        n_rows, n_nodes = rows.shape[0], rows.shape[-1]
+        location = None
+        if xkey == X_KEY:
+            location = np.tile(results.axis(X_KEY, n_nodes), n_rows)
+        yield label, units, np.repeat(cell_ids[:n_rows], n_nodes), \
+            np.tile(np.arange(n_nodes), n_rows), location, rows.reshape(-1)
+
+
+def _csv_text(text):
+    return '"{}"'.format(str(text or '').replace('"', '""'))
+
+
+def iter_csv(results, names=None, cells=None, chunk_size=10000):
+    """
+    Stream CSV text in long format with the columns Variable, Units, Cell,
+    Node, Channel Location and Value
+    """
+    yield ','.join(_csv_text(column) for column in (
+        'Variable', 'Units', 'Cell', 'Node', X_KEY, 'Value')) + '\n'
+    for label, units, cell_col, node_col, location, values \
+            in iter_long(results, names, cells):
+        # label and units are part of the row format
+        prefix = (_csv_text(label) + ',' + _csv_text(units) + ',') \
+            .replace('%', '%%')
+        if location is None:
+            data = np.column_stack([cell_col, node_col, values])
+            fmt = prefix + '%d,%d,,%.10g'
+        else:
+            data = np.column_stack([cell_col, node_col, location, values])
+            fmt = prefix + '%d,%d,%.10g,%.10g'
+        for start in range(0, len(data), chunk_size):
+            buffer = io.StringIO()
+            np.savetxt(buffer, data[start:start + chunk_size], fmt=fmt)
+            yield buffer.getvalue()
+
+
+def write_csv(buffer, results, names=None, cells=None):
+    for chunk in iter_csv(results, names, cells):
+        buffer.write(chunk.encode('utf-8'))
+
+
+def write_npz(buffer, results, names=None, cells=None):
+    """
+    Compressed NPZ archive with one array per variable and a JSON index of
+    units and exported cells
+    """
+    arrays = {}
+    index = {'cells': cells, 'units': {}}
+    for label, units, array, _ in iter_variables(results, names, cells):
+        arrays[label] = array
+        index['units'][label] = units
+    arrays['__index__'] = np.array(json.dumps(index))
+    np.savez_compressed(buffer, **arrays)
+
+
+def write_parquet(buffer, results, names=None, cells=None):
+    """
+    Parquet file in long format with columns Variable, Cell, Node, Channel
+    Location, Value; units are stored in the schema metadata
+    """
+    if pq is None:
+        raise ImportError('Parquet export requires the pyarrow package')
+    labels, cell_col, node_col, locations, values = [], [], [], [], []
+    units = {}
+    for label, unit, cells_l, nodes_l, location, values_l \
+            in iter_long(results, names, cells):
+        labels.append(np.full(len(values_l), label, dtype=object))
+        cell_col.append(cells_l)
+        node_col.append(nodes_l)
+        locations.append(np.full(len(values_l), np.nan)
+                         if location is None else location)
+        values.append(values_l)
+        units[label] = unit
+    if not values:
+        labels = cell_col = node_col = locations = values = [np.array([])]
+    table = pa.table(
+        {'Variable': pa.array(np.concatenate(labels), type=pa.string()),
+         'Cell': np.concatenate(cell_col).astype(np.int32),
+         'Node': np.concatenate(node_col).astype(np.int32),
+         X_KEY: np.concatenate(locations).astype(np.float64),
+         'Value': np.concatenate(values).astype(np.float64)})
+    table = table.replace_schema_metadata(
+        {'units': json.dumps(units)})
+    pq.write_table(table, buffer, compression='zstd')
+
+
+WRITERS = {'csv': write_csv, 'npz': write_npz, 'parquet': write_parquet}
+
+
+def export_results(results, file_format, names=None, cells=None,
+                   name='results'):
+    """
+    Return (writer, filename) for dcc.send_bytes
+    """
+    writer = WRITERS[file_format]
+
+    def write(buffer):
+        writer(buffer, results, names, cells)
+
+    return write, name + '.' + file_format
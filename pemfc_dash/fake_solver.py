@@ -0,0 +1,54 @@
+"""
+Stand-in for the pemfc solver returning synthetic results
+
+Results have the structure of the pemfc output (see pemfc_dash.synthetic)
+and are derived from the digest of the settings, so identical settings give
+identical results and different settings different ones. The solve is
+emulated by a number of iterations spread over the configured latency,
+which publish progress and can be cancelled like the real solver.
+
+Configuration by environment variables:
+    PEMFC_DASH_FAKE_LATENCY: seconds per simulation (default: 1.0)
+    PEMFC_DASH_FAKE_CELLS: number of cells (default: 10)
+    PEMFC_DASH_FAKE_NODES: number of channel nodes (default: 100)
+    PEMFC_DASH_FAKE_ITERATIONS: number of solver iterations (default: 20)
+"""
+import os
+import time
+
+from pemfc_dash import jobs, profiling, simulation, synthetic
+from pemfc_dash.simulation_cache import settings_digest
+
+
+class FakeBackend(simulation.SimulationBackend):
+
+    def __init__(self, latency=1.0, n_cells=10, n_nodes=100, iterations=20):
+        self.latency = latency
+        self.n_cells = n_cells
+        self.n_nodes = n_nodes
+        self.iterations = max(iterations, 1)
+
+    @classmethod
+    def from_environment(cls):
+        env = os.environ
+        return cls(latency=float(env.get('PEMFC_DASH_FAKE_LATENCY', 1.0)),
+                   n_cells=int(env.get('PEMFC_DASH_FAKE_CELLS', 10)),
+                   n_nodes=int(env.get('PEMFC_DASH_FAKE_NODES', 100)),
+                   iterations=int(env.get('PEMFC_DASH_FAKE_ITERATIONS', 20)))
+
+    def run(self, settings):
+        seed = int(settings_digest(settings)[:8], 16)
+        job = jobs.current_job()
+        reporter = simulation.ProgressReporter(job) \
+            if job is not None else None
+        with profiling.stage('solver'):
+            for iteration in range(self.iterations):
+                time.sleep(self.latency / self.iterations)
+                if reporter is not None:
+                    reporter.update(
+                        10.0 ** -(iteration * 6.0 / self.iterations))
+            if reporter is not None:
+                reporter.publish()
+        with profiling.stage('result_conversion'):
+            return synthetic.synthetic_results(self.n_cells, self.n_nodes,
+                                               seed)
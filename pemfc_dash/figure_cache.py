@@ -0,0 +1,51 @@
+"""
+Per-process cache of graph figures
+
+Figures are kept as plotly figure dictionaries (Figure.to_dict, so data
+arrays remain NumPy arrays and are serialized by Dash with each response)
+and keyed by run id and the selected variables; as stored runs never
+change, switching back to a variable already viewed returns the cached
+figure without rebuilding it. Timing statistics are recorded separately for
+cache hits and rebuilds and exported as per-process counters on /metrics.
+"""
+import threading
+import time
+
+from pemfc_dash.lru_cache import LRUCache
+
+
+class FigureCache:
+
+    def __init__(self, max_entries=64):
+        self.figures = LRUCache(max_entries=max_entries)
+        self._timings = {'hit': [0, 0.0], 'build': [0, 0.0]}
+        self._lock = threading.Lock()
+
+    def _record(self, kind, start):
+        with self._lock:
+            timing = self._timings[kind]
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+
+    def get_or_build(self, key, build):
+        """
+        Return cached figure for key or call build() and cache its result;
+        build may return a plotly Figure, which is stored as dictionary
+        """
+        start = time.perf_counter()
+        figure = self.figures.get(key)
+        if figure is not None:
+            self._record('hit', start)
+            return figure
+        figure = build()
+        if hasattr(figure, 'to_dict'):
+            figure = figure.to_dict()
+        self.figures.set(key, figure)
+        self._record('build', start)
+        return figure
+
+    def stats(self):
+        with self._lock:
+            return {kind: {'count': count, 'total_time': total,
+                           'mean_time': total / count if count else 0.0}
+                    for kind, (count, total) in self._timings.items()}
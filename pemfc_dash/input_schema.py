@@ -0,0 +1,234 @@
+"""
+Input schema compiled once from the widget dictionaries of pemfc_gui
+
+Every input component of the dashboard is described by an immutable field:
+its Dash id, the settings name (Dash id without index suffix), the path in
+the simulation settings, the position within a multi-value input, the
+widget type, its default value and the index of its tab. Callbacks convert
+the values of all input components into the simulation input data in a
+single pass by looking up these fields, instead of parsing the ids on every
+request.
+"""
+import collections
+import re
+import types
+
+from . import dash_functions as df, dash_layout as dl
+
+InputField = collections.namedtuple(
+    'InputField', ['id', 'type', 'name', 'sim_path', 'position', 'widget',
+                   'default', 'tab'], defaults=[None])
+
+# Dash ids of multi-value inputs are suffixed by '_<index>'
+_INDEX_SUFFIX = re.compile(r'^(.*)_(\d+)$')
+
+
+def _split_id(input_id):
+    """
+    Settings name and position of a Dash id ('name_1' -> ('name', 1))
+    """
+    match = _INDEX_SUFFIX.match(input_id)
+    if match is None:
+        return input_id, None
+    return match.group(1), int(match.group(2))
+
+
+def coerce_value(val, widget=None):
+    """
+    Convert component value to its simulation type: numeric strings to
+    int/float, checklist values to bool (same conversion as
+    dash_functions.unstringify and process_inputs)
+    """
+    if isinstance(val, list):
+        if widget == 'CheckButtonSet' or len(val) == 0 \
+                or (len(val) == 1 and val[0] == 1):
+            return bool(val)
+        try:
+            return [float(v) for v in val]
+        except (ValueError, TypeError):
+            return val
+    if isinstance(val, str):
+        try:
+            return float(val) if '.' in val else int(val)
+        except ValueError:
+            return val
+    return val
+
+
+def _widget_fields(widget, tab=None):
+    """
+    Input fields of a single widget, using the same id generation as
+    dash_layout.row_input
+    """
+    widget_type = widget.get('type', '')
+    if widget_type not in ('EntrySet', 'ComboboxSet', 'CheckButtonSet'):
+        return []
+    value = widget.get('value', '')
+    ids = widget['sim_name'] if 'sim_name' in widget else widget.get('ids', '')
+    dict_ids, id_list, inp_type = dl.id_val_gui_to_dash(
+        widget.get('label', ''), ids, value, widget.get('number'),
+        widget_type)
+    if widget_type == 'EntrySet':
+        defaults = dict_ids
+    elif widget_type == 'ComboboxSet':
+        default = value if widget.get('options') else value[0]
+        defaults = {input_id: default for input_id in id_list}
+    else:
+        values = dl.make_list(value)
+        defaults = {input_id: dl.checklist(val)
+                    for input_id, val in zip(id_list, values)}
+    fields = []
+    for input_id, default in defaults.items():
+        name, position = _split_id(input_id)
+        fields.append(InputField(input_id, inp_type, name,
+                                 tuple(name.split('-')), position,
+                                 widget_type, default, tab))
+    return fields
+
+
+def _iter_widgets(frame_dict):
+    for sub_frame in frame_dict.get('sub_frame_dicts', []):
+        yield from _iter_widgets(sub_frame)
+    for widget in frame_dict.get('widget_dicts', []):
+        if 'type' in widget:
+            yield widget
+        else:
+            yield from _iter_widgets(widget)
+
+
+class InputSchema:
+    """
+    Immutable mapping of Dash input ids to their input fields
+    """
+
+    def __init__(self, fields):
+        self.fields = types.MappingProxyType(
+            {field.id: field for field in fields})
+        self.sim_paths = types.MappingProxyType(
+            {field.name: field.sim_path for field in fields})
+        group_sizes = collections.Counter(
+            field.name for field in fields if field.position is not None)
+        self.group_sizes = types.MappingProxyType(dict(group_sizes))
+        # Settings names loaded from settings files (only entry fields are
+        # registered in dash_layout.ID_LIST)
+        self.entry_names = tuple(dict.fromkeys(
+            field.name for field in fields if field.widget == 'EntrySet'))
+
+    @classmethod
+    def from_frame_dicts(cls, tab_dicts):
+        """
+        Compile schema from gui_input.main_frame_dicts
+        """
+        fields = []
+        for tab, tab_dict in enumerate(tab_dicts):
+            for widget in _iter_widgets(tab_dict):
+                fields.extend(_widget_fields(widget, tab))
+        return cls(fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __contains__(self, input_id):
+        return input_id in self.fields
+
+    def field(self, input_id):
+        """
+        Field of input_id; ids unknown to the schema are derived from the
+        id itself
+        """
+        field = self.fields.get(input_id)
+        if field is None:
+            name, position = _split_id(input_id)
+            field = InputField(input_id, None, name, tuple(name.split('-')),
+                               position, None, None)
+        return field
+
+    def tab_fields(self, tab):
+        """
+        Fields of the inputs in tab (index of gui_input.main_frame_dicts)
+        """
+        return [field for field in self.fields.values() if field.tab == tab]
+
+    def missing_fields(self, ids):
+        """
+        Fields not among the given component ids (inputs of tabs which
+        have not been rendered yet)
+        """
+        present = {id_dict['id'] for id_dict in ids}
+        return [field for field in self.fields.values()
+                if field.id not in present]
+
+    def values(self, values, ids, pending=None):
+        """
+        Dictionary {name: value} of component values and ids (as passed by
+        the ALL pattern-matching states); values of multi-value inputs are
+        combined into lists ordered by their position. Fields missing in ids
+        take their value from pending ({input id: value}, values loaded for
+        tabs not rendered yet) or their default value.
+        """
+        pending = pending or {}
+        missing = self.missing_fields(ids)
+        values = list(values) + [pending.get(field.id, field.default)
+                                 for field in missing]
+        ids = list(ids) + [{'id': field.id} for field in missing]
+        data = {}
+        for id_dict, val in zip(ids, values):
+            field = self.field(id_dict['id'])
+            val = coerce_value(val, field.widget)
+            if field.position is None:
+                data[field.name] = val
+                continue
+            group = data.get(field.name)
+            if not isinstance(group, list) or len(group) <= field.position:
+                size = max(self.group_sizes.get(field.name, 0),
+                           field.position + 1)
+                new_group = [None] * size
+                if isinstance(group, list):
+                    new_group[:len(group)] = group
+                group = data[field.name] = new_group
+            group[field.position] = val
+        return data
+
+    def input_data(self, values, ids, pending=None):
+        """
+        Simulation input data {name: {'sim_name': path, 'value': value}}
+        as required by pemfc_gui.data_transfer.gui_to_sim_transfer
+        """
+        return {name: {'sim_name': list(self.sim_paths.get(name)
+                                        or name.split('-')),
+                       'value': val}
+                for name, val in self.values(values, ids, pending).items()}
+
+    def update_values(self, settings, values, ids):
+        """
+        Component values updated from a {name: value} dictionary of loaded
+        settings; list values are distributed over the components of
+        multi-value inputs by their position
+        """
+        new_values = []
+        for id_dict, val in zip(ids, values):
+            field = self.field(id_dict['id'])
+            if field.name in settings:
+                new_val = settings[field.name]
+                if not isinstance(new_val, list):
+                    val = df.check_ifbool(new_val)
+                elif field.position is not None \
+                        and field.position < len(new_val):
+                    val = df.check_ifbool(new_val[field.position])
+            new_values.append(val)
+        return new_values
+
+    def pending_values(self, settings, ids, pending=None):
+        """
+        Values of loaded settings for the fields not among ids, which are
+        applied when their tab is rendered; only values differing from the
+        defaults are kept
+        """
+        pending = pending or {}
+        missing = self.missing_fields(ids)
+        new_values = self.update_values(
+            settings, [pending.get(field.id, field.default)
+                       for field in missing],
+            [{'id': field.id} for field in missing])
+        return {field.id: val for field, val in zip(missing, new_values)
+                if val != field.default}
@@ -0,0 +1,392 @@
+"""
+Background execution of simulation jobs
+
+LocalJobQueue runs jobs on a process pool owned by the web worker and needs no
+broker. RedisJobQueue pushes jobs onto a Redis list, from which they are
+executed by separate worker processes started with:
+
+    python -m pemfc_dash.jobs
+
+In both cases the job state is kept on the caching backend, so every web
+worker sharing the backend can poll it. Identical jobs (same job id) are
+coalesced by submitting and collecting them within single_flight(job_id),
+a lock shared by all workers (see pemfc_dash.locks).
+
+Jobs are cancelled by a flag on the backend: queued jobs are dropped, running
+jobs are interrupted by a watcher thread in the job process, which raises
+JobCancelled in the main thread of the job process (via SIGUSR1), so the
+solver stops within a fraction of a second and the worker is free again.
+Job functions can also call current_job().check() between iterations and
+publish their progress with current_job().publish(progress).
+
+Active jobs send heartbeats: running jobs from the watcher thread of the job
+process, jobs on the local process pool also from the web worker owning the
+pool. Jobs without heartbeat for STALE_TIMEOUT seconds (e.g. the owning
+web worker has been recycled) are reported as failed, so they do not block
+the admission control until the job timeout.
+"""
+import os
+import pickle
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from pemfc_dash.locks import ThreadLocks
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# Seconds between checks of the cancel flag by running jobs
+CANCEL_POLL_INTERVAL = 0.5
+# Seconds between heartbeats of active jobs
+HEARTBEAT_INTERVAL = 5.0
+# Seconds without heartbeat after which an active job is considered lost
+STALE_TIMEOUT = 30.0
+
+
+class JobCancelled(BaseException):
+    """
+    Raised within cancelled jobs; derived from BaseException (as
+    KeyboardInterrupt), so it is not caught by error handling of the solver
+    """
+
+
+class JobContext:
+    """
+    Handle of a job passed to the process executing it, giving access to its
+    cancel flag on the backend
+    """
+
+    def __init__(self, backend, key, timeout):
+        self.backend = backend
+        self.key = key
+        self.timeout = timeout
+
+    def cancelled(self):
+        return bool(self.backend.get(self.key + ':cancel'))
+
+    def check(self):
+        """
+        Raise JobCancelled if the job has been cancelled
+        """
+        if self.cancelled():
+            raise JobCancelled()
+
+    def heartbeat(self, state=None):
+        """
+        Refresh the update time of the job state (and set it to state, if
+        given), as long as the job is queued or running
+        """
+        status = self.backend.get(self.key)
+        if status is None or status['state'] not in (QUEUED, RUNNING):
+            return
+        status = {**status, 'updated': time.time()}
+        if state is not None:
+            status['state'] = state
+        self.backend.set(self.key, status, timeout=self.timeout)
+
+    def publish(self, progress):
+        """
+        Store progress (dictionary) of the running job, see
+        JobQueue.progress
+        """
+        self.backend.set(self.key + ':progress', progress,
+                         timeout=self.timeout)
+
+
+_current_job = None
+_interruptible = False
+
+
+def current_job():
+    """
+    Context of the job executed by this process or None
+    """
+    return _current_job
+
+
+def _interrupt(signum, frame):
+    if _interruptible:
+        raise JobCancelled()
+
+
+def _install_interrupt():
+    """
+    Install the SIGUSR1 handler raising JobCancelled; returns False if jobs
+    cannot be interrupted (no SIGUSR1 on Windows, not in the main thread)
+    """
+    if not hasattr(signal, 'SIGUSR1'):
+        return False
+    if signal.getsignal(signal.SIGUSR1) is _interrupt:
+        return True
+    try:
+        signal.signal(signal.SIGUSR1, _interrupt)
+    except ValueError:
+        return False
+    return True
+
+
+def _watch(context, stop, interruptible):
+    """
+    Watcher thread of a running job sending heartbeats and interrupting the
+    job once it has been cancelled
+    """
+    beat = time.monotonic()
+    while not stop.wait(CANCEL_POLL_INTERVAL):
+        if time.monotonic() - beat >= HEARTBEAT_INTERVAL:
+            context.heartbeat()
+            beat = time.monotonic()
+        if interruptible and context.cancelled():
+            os.kill(os.getpid(), signal.SIGUSR1)
+            interruptible = False
+
+
+def run_job(context, func, args):
+    """
+    Execute func(*args) as job with the given context; raises JobCancelled
+    if the job is cancelled before or while running
+    """
+    global _current_job, _interruptible
+    context.check()
+    context.heartbeat(RUNNING)
+    stop = threading.Event()
+    watcher = threading.Thread(target=_watch,
+                               args=(context, stop, _install_interrupt()),
+                               daemon=True)
+    _current_job = context
+    _interruptible = True
+    try:
+        watcher.start()
+        return func(*args)
+    finally:
+        _interruptible = False
+        _current_job = None
+        stop.set()
+        watcher.join()
+
+
+class JobQueue:
+    """
+    Base class keeping the state of each job as dictionary
+    {'state': ..., 'result': ..., 'error': ...} on a cachelib compatible
+    backend
+    """
+
+    prefix = 'job'
+    # states refreshed by heartbeats, reported as failed once stale
+    heartbeat_states = (RUNNING,)
+
+    def __init__(self, backend, timeout=60 * 60, locks=None,
+                 stale_timeout=STALE_TIMEOUT):
+        self.backend = backend
+        self.timeout = timeout
+        self.locks = ThreadLocks() if locks is None else locks
+        self.stale_timeout = stale_timeout
+
+    def _key(self, job_id):
+        return f'{self.prefix}:{job_id}'
+
+    def _set_state(self, job_id, state, **kwargs):
+        self.backend.set(self._key(job_id),
+                         {'state': state, 'updated': time.time(), **kwargs},
+                         timeout=self.timeout)
+
+    def _context(self, job_id):
+        return JobContext(self.backend, self._key(job_id), self.timeout)
+
+    def _execute(self, job_id, func, args):
+        self._set_state(job_id, RUNNING)
+        try:
+            result = run_job(self._context(job_id), func, args)
+        except JobCancelled:
+            self._set_state(job_id, CANCELLED)
+        except Exception as E:
+            self._set_state(job_id, FAILED, error=repr(E),
+                            traceback=traceback.format_exc())
+        else:
+            self._set_state(job_id, FINISHED, result=result)
+
+    def single_flight(self, job_id):
+        """
+        Lock of job_id shared by all workers; lookup of existing results and
+        submission (or collection) of the job within this lock make sure
+        concurrent identical requests are computed only once
+        """
+        return self.locks.lock(self._key(job_id))
+
+    def is_active(self, job_id):
+        status = self.status(job_id)
+        return status is not None and status['state'] in (QUEUED, RUNNING)
+
+    def submit(self, job_id, func, *args):
+        """
+        Queue func(*args) under job_id; a job with the same id still queued
+        or running is not submitted a second time
+        """
+        raise NotImplementedError
+
+    def status(self, job_id):
+        """
+        Return state dictionary of the job or None if the job is unknown;
+        active jobs without heartbeat are reported as failed
+        """
+        status = self.backend.get(self._key(job_id))
+        if status is not None and status['state'] in self.heartbeat_states \
+                and time.time() - status['updated'] > self.stale_timeout:
+            status = {'state': FAILED, 'updated': status['updated'],
+                      'error': 'Simulation job has been lost, please run '
+                               'again!'}
+        return status
+
+    def cancel(self, job_id):
+        """
+        Cancel job: a queued job is not executed anymore, a running job is
+        interrupted
+        """
+        if not self.is_active(job_id):
+            return
+        self.backend.set(self._key(job_id) + ':cancel', True,
+                         timeout=self.timeout)
+
+    def progress(self, job_id):
+        """
+        Return the last progress published by the job or None
+        """
+        return self.backend.get(self._key(job_id) + ':progress')
+
+    def _clear_flags(self, job_id):
+        self.backend.delete(self._key(job_id) + ':cancel')
+        self.backend.delete(self._key(job_id) + ':progress')
+
+    def discard(self, job_id):
+        self.backend.delete(self._key(job_id))
+        self._clear_flags(job_id)
+
+
+class LocalJobQueue(JobQueue):
+    """
+    Executes jobs on a process pool of the current process; the pool is
+    created on first use together with a thread sending the heartbeats of
+    the jobs in the pool
+    """
+
+    heartbeat_states = (QUEUED, RUNNING)
+
+    def __init__(self, backend, max_workers=None, timeout=60 * 60,
+                 locks=None, stale_timeout=STALE_TIMEOUT):
+        super().__init__(backend, timeout=timeout, locks=locks,
+                         stale_timeout=stale_timeout)
+        self.max_workers = max_workers
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            threading.Thread(target=self._heartbeat, daemon=True).start()
+        return self._executor
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            # within the lock, so the final state set by _done is never
+            # overwritten by a heartbeat
+            with self._lock:
+                for job_id, future in self._futures.items():
+                    if not future.done():
+                        self._context(job_id).heartbeat()
+
+    def _done(self, job_id, future):
+        with self._lock:
+            if self._futures.get(job_id) is future:
+                del self._futures[job_id]
+        if future.cancelled():
+            self._set_state(job_id, CANCELLED)
+            return
+        try:
+            result = future.result()
+        except JobCancelled:
+            self._set_state(job_id, CANCELLED)
+        except Exception as E:
+            self._set_state(job_id, FAILED, error=repr(E),
+                            traceback=traceback.format_exc())
+        else:
+            self._set_state(job_id, FINISHED, result=result)
+
+    def submit(self, job_id, func, *args):
+        with self._lock:
+            if job_id in self._futures or self.is_active(job_id):
+                return job_id
+            self._clear_flags(job_id)
+            self._set_state(job_id, QUEUED)
+            future = self.executor.submit(run_job, self._context(job_id),
+                                          func, args)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._done(job_id, f))
+        return job_id
+
+    def cancel(self, job_id):
+        super().cancel(job_id)
+        # jobs of this process not started yet are removed from the pool
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()
+
+    def status(self, job_id):
+        status = super().status(job_id)
+        future = self._futures.get(job_id)
+        if status is not None and status['state'] == QUEUED \
+                and future is not None and future.running():
+            status = {**status, 'state': RUNNING}
+        return status
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Pushes jobs onto a Redis list; jobs are executed by worker processes
+    running RedisJobQueue.work()
+    """
+
+    queue_key = 'pemfc_dash:jobs'
+
+    def __init__(self, backend, connection, timeout=60 * 60, locks=None):
+        super().__init__(backend, timeout=timeout, locks=locks)
+        self.connection = connection
+
+    def submit(self, job_id, func, *args):
+        if self.is_active(job_id):
+            return job_id
+        self._clear_flags(job_id)
+        self._set_state(job_id, QUEUED)
+        self.connection.lpush(self.queue_key,
+                              pickle.dumps((job_id, func, args)))
+        return job_id
+
+    def work(self):
+        """
+        Worker loop executing queued jobs one after another; cancelled jobs
+        are skipped
+        """
+        while True:
+            _, payload = self.connection.brpop(self.queue_key)
+            job_id, func, args = pickle.loads(payload)
+            if self._context(job_id).cancelled():
+                self._set_state(job_id, CANCELLED)
+                continue
+            self._execute(job_id, func, args)
+
+
+if __name__ == '__main__':
+    from pemfc_dash.dash_app import job_queue
+
+    if not isinstance(job_queue, RedisJobQueue):
+        raise RuntimeError('Job workers require the Redis job queue, set '
+                           'PEMFC_DASH_JOB_QUEUE=redis')
+    job_queue.work()
@@ -0,0 +1,83 @@
+"""
+Named locks shared by all web workers
+
+Used to make check-and-submit of simulation jobs atomic (single-flight), so
+identical simulations requested at the same time by different sessions or
+workers are computed only once. RedisLocks work across nodes sharing the
+Redis server, FileLocks across the processes of a single node (as the
+FileSystemStore), ThreadLocks only within a single process.
+"""
+import collections
+import contextlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows
+    fcntl = None
+
+
+class ThreadLocks:
+
+    def __init__(self):
+        self._locks = collections.defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        with self._lock:
+            lock = self._locks[name]
+        with lock:
+            yield
+
+
+class FileLocks:
+    """
+    Exclusive flock on one file per name in directory
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._thread_locks = ThreadLocks()
+
+    def _path(self, name):
+        return os.path.join(self.directory,
+                            name.replace(':', '_').replace(os.sep, '_')
+                            + '.lock')
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        if fcntl is None:
+            with self._thread_locks.lock(name):
+                yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(name), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class RedisLocks:
+    """
+    Redis locks expiring after timeout seconds, so a crashed worker cannot
+    block others
+    """
+
+    prefix = 'lock'
+
+    def __init__(self, connection, timeout=60, blocking_timeout=30):
+        self.connection = connection
+        self.timeout = timeout
+        self.blocking_timeout = blocking_timeout
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        with self.connection.lock(f'{self.prefix}:{name}',
+                                  timeout=self.timeout,
+                                  blocking_timeout=self.blocking_timeout):
+            yield
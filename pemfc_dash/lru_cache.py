@@ -0,0 +1,90 @@
+"""
+Thread-safe least-recently-used cache for the memory of a single process
+"""
+import collections
+import sys
+import threading
+
+
+def sizeof(value):
+    """
+    Approximate memory size of value in bytes (NumPy arrays by their data)
+    """
+    return getattr(value, 'nbytes', None) or sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Mapping with eviction of the least recently used entries once
+    max_entries or max_bytes (total size of the stored values) is exceeded
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._total_bytes -= self._sizes.pop(key)
+                del self._data[key]
+            self._data[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+            while self._data and (
+                    len(self._data) > self.max_entries
+                    or (self.max_bytes is not None
+                        and self._total_bytes > self.max_bytes)):
+                old_key, _ = self._data.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_key)
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self._total_bytes -= self._sizes.pop(key)
+
+    def get_or_load(self, key, loader):
+        """
+        Return cached value for key or store and return loader(); None
+        values are not cached
+        """
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._total_bytes,
+                    'hits': self.hits, 'misses': self.misses}
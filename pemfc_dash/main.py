@@ -1,34 +1,37 @@
 # import pathlib
-import re
 import copy
+import functools
 import numpy as np
 import json
-import os
+import time
 
 import dash
-from dash_extensions.enrich import Output, Input, State, ALL, html, dcc, \
-    ServersideOutput
+from dash import ClientsideFunction
+from dash_extensions.enrich import Output, Input, State, ALL, html, dcc
 from dash import dash_table as dt
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
 
-import pemfc
-from pemfc.src import interpolation as ip
-from pemfc.data import input_dicts
-from pemfc import main_app
-from pemfc_gui import data_transfer
 import pemfc_gui.input as gui_input
 
 from . import dash_functions as df, dash_layout as dl, \
-    dash_modal as dm
-from pemfc_dash.dash_app import app
+    dash_modal as dm, downsampling as ds, export, jobs, profiling, \
+    simulation, sweep
+from .admission import AdmissionError
+from .input_schema import InputSchema
+from .results import ResultsExpired
+from pemfc_dash.dash_app import app, simulation_cache, job_queue, \
+    admission, result_store, figure_cache, caching_backend
 
 server = app.server
 
 app._favicon = 'logo-zbt.ico'
 app.title = 'PEMFC Model'
 
+# Input fields of all settings tabs, shared by the input callbacks
+INPUT_SCHEMA = InputSchema.from_frame_dicts(gui_input.main_frame_dicts)
+
 app.layout = dbc.Container([
     html.Div([  # HEADER (Header Row)
         html.Div(  # Logo
@@ -69,10 +72,27 @@ app.layout = dbc.Container([
         className='row'
     ),
     dcc.Store(id="input_data"),
-    dbc.Spinner(dcc.Store(id='result_data_store'), fullscreen=True,
-                spinner_class_name='loading_spinner',
-                fullscreen_class_name='loading_spinner_bg'),
+    # tabs rendered so far and loaded settings of inputs in tabs not rendered
+    # yet, see render_tab
+    dcc.Store(id='rendered_tabs', data=['tab1']),
+    dcc.Store(id='pending_inputs', data={}),
+    # option -> container maps for the clientside tab controls
+    dcc.Store(id='control_maps',
+              data=dl.control_maps(gui_input.main_frame_dicts)),
+    dcc.Store(id='result_data_store'),
+    # manifest of the run in result_data_store, see update_result_widgets
+    dcc.Store(id='results_manifest'),
+    # run id of results requested after they have expired, see
+    # report_expired_results
+    dcc.Store(id='expired_run'),
     dcc.Store(id='signal'),
+    # random id of the browser session for the admission control of jobs
+    dcc.Store(id='session_id', storage_type='session'),
+    # id of the background simulation job, polled by job_interval
+    dcc.Store(id='job_id'),
+    dcc.Interval(id='job_interval', interval=1000, disabled=True),
+    # page load shows the profiling controls to admins, see profiling
+    dcc.Location(id='url', refresh=False),
 
     # empty Div to trigger javascript file for graph resizing
     html.Div(id="output-clientside"),
@@ -81,7 +101,7 @@ app.layout = dbc.Container([
     html.Div(  # MIDDLE
         [html.Div(  # LEFT MIDDLE / (Menu Column)
             [html.Div(  # LEFT MIDDLE MIDDLE (Tabs with Settings)
-                [dl.tab_container(gui_input.main_frame_dicts)],
+                [dl.tab_container(gui_input.main_frame_dicts, lazy=True)],
                 id='setting_container',  # style={'flex': '1'}
             ),
                 html.Div(  # LEFT MIDDLE BOTTOM (Buttons)
@@ -99,6 +119,9 @@ app.layout = dbc.Container([
                                             className='settings_button',
                                             style={'display': 'flex'}),
                                 html.Button('Run Simulation', id='run_button',
+                                            className='settings_button',
+                                            style={'display': 'flex'}),
+                                html.Button('Stop', id='stop_button',
                                             className='settings_button',
                                             style={'display': 'flex'})
                             ],
@@ -107,9 +130,21 @@ app.layout = dbc.Container([
                                    # 'flex-direction': 'column',
                                    # 'margin': '5px',
                                    'justify-content': 'space-evenly'}
-                        )],
+                        ),
+                            html.Div(id='job_status',
+                                     style={'display': 'flex',
+                                            'justify-content': 'center',
+                                            'align-items': 'center',
+                                            'margin-top': '5px'}),
+                            dl.progress_container(),
+                            dl.admin_container()],
                         className='neat-spacing')], style={'flex': '1'},
-                    id='load_save_setting', className='pretty_container')],
+                    id='load_save_setting', className='pretty_container'),
+                # LEFT BOTTOM (Parameter Sweep)
+                dl.sweep_settings_container(
+                    [{'type': field.type, 'id': field.id} for field
+                     in INPUT_SCHEMA.fields.values()
+                     if field.widget == 'EntrySet'])],
             id="left-column", className='col-12 col-lg-4 mb-2'),
 
             html.Div(  # RIGHT MIDDLE  (Result Column)
@@ -211,15 +246,18 @@ app.layout = dbc.Container([
                                                          id='append_b',
                                                          className='local_data_buttons'),
                                              html.Button('Clear Table', id='clear_table_b',
-                                                         className='local_data_buttons')],
+                                                         className='local_data_buttons'),
+                                             html.Button('Download CSV',
+                                                         id='download_table_b',
+                                                         className='local_data_buttons'),
+                                             dcc.Download(id='table_download')],
                                          style={
                                              'display': 'flex',
                                              'flex-wrap': 'wrap',
                                              'margin-bottom': '5px'}
                                      )],
                                  # style={'width': '200px'}
-                             ),
-                                 dcc.Store(id='cells_data')],
+                             )],
                              style={'display': 'flex', 'flex-direction': 'column',
                                     'justify-content': 'left'}),
                          dbc.Spinner(dcc.Graph(id='line_graph'),
@@ -228,14 +266,16 @@ app.layout = dbc.Container([
                         className="pretty_container",
                         style={'display': 'flex', 'flex-direction':
                             'column', 'justify-content': 'space-evenly'}
-                    )],
+                    ),
+                    dl.sweep_results_container()],
                 id='right-column', className='col-12 col-lg-8 mb-2')],
         className="row",
         style={'justify-content': 'space-evenly'}),
 
     # Data Table created from "Plots"
-    html.Div(dt.DataTable(id='table', editable=True,
-                          column_selectable='multi'),
+    html.Div([dl.export_container(export.available_formats()),
+              dt.DataTable(id='table', editable=True,
+                           column_selectable='multi')],
              # columns=[{'filter_options': 'sensitive'}]),
              id='div_table', style={'overflow': 'auto',
                                     'position': 'relative',
@@ -274,52 +314,336 @@ app.layout = dbc.Container([
     style={'padding': '0px'})
 
 
+app.clientside_callback(
+    ClientsideFunction(namespace='session', function_name='init_id'),
+    Output('session_id', 'data'),
+    Input('session_id', 'modified_timestamp'),
+    State('session_id', 'data')
+)
+
+
+def submit_simulation(job_id, settings, session):
+    """
+    Single-flight submission of a simulation: returns (run_id, None) if the
+    settings have been simulated before; otherwise an identical job already
+    queued or running (in any worker) is joined or a new job is requested
+    from the admission control and (None, position in admission queue) is
+    returned (position None if the job has been admitted). Raises
+    AdmissionError if the job is rejected.
+    """
+    with job_queue.single_flight(job_id):
+        run_id = simulation_cache.get(job_id)
+        if run_id is not None:
+            return run_id, None
+        position = admission.request(job_id, session or 'anonymous',
+                                     simulation.run, settings)
+    return None, position
+
+
+def cancel_simulation(job_id, session):
+    """
+    Cancel job on behalf of session; jobs other sessions are still waiting
+    for (requested by them or joined) are left running for them
+    """
+    if admission.cancel(job_id, session or 'anonymous'):
+        job_queue.cancel(job_id)
+
+
+def job_statuses(job_ids):
+    """
+    Job status {job_id: status} including jobs waiting for admission, which
+    are not known to the job queue yet; only jobs unknown to the job queue
+    are polled at the admission control, which admits them if possible
+    """
+    statuses = {job_id: job_queue.status(job_id) for job_id in job_ids}
+    unknown = [job_id for job_id, status in statuses.items()
+               if status is None]
+    if unknown:
+        for job_id, position in admission.poll(unknown).items():
+            if position is not None:
+                statuses[job_id] = {'state': 'waiting', 'position': position}
+            else:
+                statuses[job_id] = job_queue.status(job_id)
+    return statuses
+
+
+def waiting_status(job_id):
+    """
+    Job status including jobs waiting for admission, see job_statuses
+    """
+    return job_statuses([job_id])[job_id]
+
+
+def collect_simulation(job_id, status):
+    """
+    Stores the result of a finished job once for all sessions waiting for it
+    and returns its run id
+    """
+    with job_queue.single_flight(job_id):
+        if not result_store.exists(job_id):
+            simulation_cache.set(job_id, status['result'])
+        job_queue.discard(job_id)
+    return job_id
+
+
+def submit_profiled_simulation(job_id, settings, session, profile):
+    """
+    Submission of a profiled simulation, which always runs a new job (the
+    simulation cache and jobs of unprofiled runs are bypassed); the profile
+    of the web worker part is kept until the job is collected. Returns the
+    position in the admission queue like submit_simulation.
+    """
+    profile_job = profiling.job_id(job_id)
+    with job_queue.single_flight(profile_job):
+        profiling.store_profile(caching_backend, 'pending:' + profile_job,
+                                profile)
+        try:
+            position = admission.request(profile_job, session or 'anonymous',
+                                         profiling.profiled_run, settings)
+        except AdmissionError:
+            profiling.delete_profile(caching_backend, 'pending:' + profile_job)
+            raise
+    return profile_job, position
+
+
+def collect_profiled_simulation(job_id, status):
+    """
+    Stores the result of a finished profiled job, timing its serialization
+    into the result store, and the merged profile of the web worker and the
+    job process under the run id
+    """
+    run_id = profiling.settings_key(job_id)
+    with job_queue.single_flight(job_id):
+        profile = profiling.load_profile(caching_backend, 'pending:' + job_id)
+        if profile is None:
+            profile = profiling.RunProfile()
+        profile.merge(status['result']['profile'])
+        with profiling.activate(profile), profile.profile('web'), \
+                profiling.stage('store_serialization'):
+            simulation_cache.set(run_id, status['result']['result'])
+        profiling.store_profile(caching_backend, run_id, profile)
+        profiling.delete_profile(caching_backend, 'pending:' + job_id)
+        job_queue.discard(job_id)
+    return run_id
+
+
+@app.callback(
+    Output('admin_container', 'style'),
+    Input('url', 'pathname')
+)
+def show_admin_container(pathname):
+    """
+    Shows the profiling controls if the request carries the admin cookie
+
+    @param pathname: path of the dashboard url (triggers on page load)
+    @return: container style
+    """
+    if profiling.is_admin():
+        return {'display': 'flex', 'flex-wrap': 'wrap',
+                'justify-content': 'space-evenly', 'margin-top': '5px'}
+    return {'display': 'none'}
+
+
 @app.callback(
-    ServersideOutput("result_data_store", "data"),
+    Output("result_data_store", "data"),
+    Output('job_id', 'data'),
+    Output('job_interval', 'disabled'),
+    Output('job_status', 'children'),
     Output('modal-title', 'children'),
     Output('modal-body', 'children'),
     Output('modal', 'is_open'),
     Input("signal", "data"),
+    Input('job_interval', 'n_intervals'),
     State('input_data', 'data'),
-    # interval=1e10,
+    State('job_id', 'data'),
+    State('session_id', 'data'),
+    State('profile_run', 'value'),
     State('modal', 'is_open'),
-    # running=[(Output("run_button", "disabled"), True, False)],
     prevent_initial_call=True
 )
-def run_simulation(signal, input_data, modal_state):
+def run_simulation(signal, n_intervals, input_data, job_id, session,
+                   profile_run, modal_state):
     """
-    ToDo: Documentation
-    Description:
-
-    @param signal:
-    @param input_data:
-    @param modal_state:
-    @return:
+    Submits the simulation as background job when triggered by the signal
+    from generate_inputs and afterwards polls the job status with each tick
+    of job_interval until the results are stored in the result store and
+    their run id can be passed to result_data_store. Results of settings
+    which have been simulated before are taken from the simulation cache
+    without running a job. New jobs pass the admission control first; if
+    they have to wait for a free slot, their position in the admission
+    queue is shown by the modal and the job status display. Admins can
+    profile the run (see profiling), which always runs a new job.
+
+    @param signal: run_button clicks passed on by generate_inputs
+    @param n_intervals: ticks of job_interval
+    @param input_data: input data from generate_inputs
+    @param job_id: id of the submitted job (digest of simulation settings)
+    @param session: id of the browser session
+    @param profile_run: value of the profile_run checklist
+    @param modal_state: open state of the modal
+    @return: run id, job id, interval disabled state, job status display,
+        modal title, modal body, modal state
     """
-
-    if signal is None:  # prevent_initial_call=True should be sufficient.
+    ctx = dash.callback_context.triggered[0]['prop_id']
+    if 'signal.data' in ctx:
+        if signal is None:  # prevent_initial_call=True should be sufficient.
+            raise PreventUpdate
+        try:
+            # Get default simulation settings from pemfc core module and
+            # change them according to dashboard user input; local outputs
+            # from simulation are avoided by the output overrides
+            if profile_run and profiling.is_admin():
+                profile = profiling.RunProfile()
+                with profiling.activate(profile), profile.profile('web'):
+                    settings, overlay = simulation.prepare_settings(
+                        input_data, simulation.OUTPUT_OVERRIDES)
+                    job_id = simulation.settings_key(overlay)
+                run_id = None
+                job_id, position = submit_profiled_simulation(
+                    job_id, settings, session, profile)
+            else:
+                settings, overlay = simulation.prepare_settings(
+                    input_data, simulation.OUTPUT_OVERRIDES)
+                job_id = simulation.settings_key(overlay)
+                run_id, position = submit_simulation(job_id, settings,
+                                                     session)
+            if run_id is not None:
+                return run_id, None, True, None, None, None, modal_state
+        except AdmissionError as E:
+            modal_title, modal_body = \
+                dm.modal_process('server-busy', error=str(E))
+            return dash.no_update, None, True, None, modal_title, \
+                modal_body, not modal_state
+        except Exception as E:
+            modal_title, modal_body = \
+                dm.modal_process('input-error', error=repr(E))
+            return dash.no_update, None, True, None, modal_title, \
+                modal_body, not modal_state
+        if position is not None:
+            modal_title, modal_body = \
+                dm.modal_process('queued', error=position)
+            return dash.no_update, job_id, False, \
+                dl.job_status_display({'state': 'waiting',
+                                       'position': position}), \
+                modal_title, modal_body, not modal_state
+        return dash.no_update, job_id, False, \
+            dl.job_status_display(job_queue.status(job_id)), \
+            None, None, modal_state
+
+    if job_id is None:
         raise PreventUpdate
-    try:
-        # Initially get default simulation settings from settings.json file
-        # in pemfc core module
-        pemfc_base_dir = os.path.dirname(pemfc.__file__)
-        with open(os.path.join(pemfc_base_dir, 'settings', 'settings.json')) \
-                as file:
-            settings = json.load(file)
-        # Change settings dictionary according to dashboard user input
-        settings, name_lists = \
-            data_transfer.gui_to_sim_transfer(input_data, settings)
-        # Avoid local outputs from simulation
-        settings['output']['save_csv'] = False
-        settings['output']['save_plot'] = False
-        # Run simulation
-        global_data, local_data, sim = main_app.main(settings=settings,
-                                                     save_settings=False)
-    except Exception as E:
+    status = waiting_status(job_id)
+    if status is None:
+        # Job of identical settings has already been collected by another
+        # session and its results are cached
+        run_id = simulation_cache.get(profiling.settings_key(job_id)
+                                      if profiling.is_profile_job(job_id)
+                                      else job_id)
+        if run_id is not None:
+            return run_id, None, True, None, None, None, modal_state
+        status = {'state': jobs.FAILED,
+                  'error': 'Simulation job has been lost, please run again!'}
+    if status['state'] == jobs.FINISHED:
+        if profiling.is_profile_job(job_id):
+            run_id = collect_profiled_simulation(job_id, status)
+        else:
+            run_id = collect_simulation(job_id, status)
+        return run_id, None, True, None, None, None, modal_state
+    elif status['state'] == jobs.FAILED:
+        # failed state is kept (until timeout) for other waiting sessions
         modal_title, modal_body = \
-            dm.modal_process('input-error', error=repr(E))
-        return None, modal_title, modal_body, not modal_state
-    return [global_data[0], local_data[0]], None, None, modal_state
+            dm.modal_process('input-error', error=status['error'])
+        return dash.no_update, None, True, None, modal_title, modal_body, \
+            not modal_state
+    elif status['state'] == jobs.CANCELLED:
+        return dash.no_update, None, True, \
+            dl.job_status_display(status), None, None, modal_state
+    return dash.no_update, dash.no_update, False, \
+        dl.job_status_display(status), dash.no_update, dash.no_update, \
+        dash.no_update
+
+
+@app.callback(
+    Output('job_id', 'data'),
+    Output('job_interval', 'disabled'),
+    Output('job_status', 'children'),
+    Output('sweep_jobs', 'data'),
+    Output('sweep_interval', 'disabled'),
+    Output('sweep_status', 'children'),
+    Input('stop_button', 'n_clicks'),
+    State('job_id', 'data'),
+    State('sweep_jobs', 'data'),
+    State('sweep_results', 'data'),
+    State('session_id', 'data'),
+    prevent_initial_call=True
+)
+def stop_simulation(n_clicks, job_id, sweep_jobs, sweep_results, session):
+    """
+    Cancels the simulation job and the sweep jobs of this session: waiting
+    or queued jobs are dropped, running jobs are interrupted, so their
+    workers are free for other jobs right away; points of the sweep not
+    submitted yet are dropped
+
+    @param n_clicks: stop_button clicks
+    @param job_id: id of the submitted job
+    @param sweep_jobs: jobs of the running parameter sweep
+    @param sweep_results: results of the running parameter sweep
+    @param session: id of the browser session
+    @return: job id, interval disabled state, job status display, sweep
+        jobs, sweep interval disabled state, sweep status display
+    """
+    if job_id is None and not sweep_jobs:
+        raise PreventUpdate
+    job_status = sweep_status = dash.no_update
+    if job_id is not None:
+        cancel_simulation(job_id, session)
+        job_status = dl.job_status_display({'state': jobs.CANCELLED})
+    if sweep_jobs:
+        for job in sweep_jobs['jobs']:
+            if job['job_id'] is not None:
+                cancel_simulation(job['job_id'], session)
+        n_finished = len(sweep_results['rows']) if sweep_results else 0
+        sweep_status = dl.sweep_status_display(
+            n_finished, n_finished + len(sweep_jobs['jobs']), stopped=True)
+    return None, True, job_status, None, True, sweep_status
+
+
+@app.callback(
+    Output('progress_container', 'style'),
+    Output('progress_text', 'children'),
+    Output('progress_graph', 'figure'),
+    Input('job_interval', 'n_intervals'),
+    Input('job_id', 'data'),
+    prevent_initial_call=True
+)
+def update_progress(n_intervals, job_id):
+    """
+    Shows the progress published by the running simulation job (see
+    simulation.ProgressReporter) as live convergence plot; a single backend
+    lookup per tick of job_interval
+
+    @param n_intervals: ticks of job_interval
+    @param job_id: id of the submitted job
+    @return: container style, progress text, convergence figure
+    """
+    progress = job_queue.progress(job_id) if job_id is not None else None
+    if progress is None:
+        return {'display': 'none'}, None, dash.no_update
+    elapsed = time.time() - progress['started']
+    text = 'Iteration: {}, Error: {}, Elapsed: {:.0f} s'.format(
+        progress['iteration'],
+        '{:.3e}'.format(progress['error'])
+        if progress['error'] is not None else '-', elapsed)
+    history = progress['history']
+    if not history:
+        return None, text, dash.no_update
+    iterations, errors = zip(*history)
+    fig = go.Figure(go.Scatter(x=iterations, y=errors, mode='lines'))
+    fig.update_layout(margin=dict(l=40, r=10, t=10, b=30),
+                      xaxis_title='Iteration',
+                      yaxis_title='Convergence Error',
+                      yaxis_type='log')
+    return None, text, fig
 
 
 # def try_simulation_store(**kwargs):
@@ -330,6 +654,67 @@ def run_simulation(signal, input_data, modal_state):
 #     return results
 
 
+@app.callback(
+    Output({'type': 'tab_content', 'id': ALL}, 'children'),
+    Output('rendered_tabs', 'data'),
+    Output('pending_inputs', 'data'),
+    Input('tabs', 'value'),
+    State({'type': 'tab_content', 'id': ALL}, 'id'),
+    State('rendered_tabs', 'data'),
+    State('pending_inputs', 'data'),
+    prevent_initial_call=True
+)
+def render_tab(tab, content_ids, rendered, pending):
+    """
+    Renders the settings of a tab when it is selected for the first time;
+    the component trees are memoized per process, only values of loaded
+    settings (pending_inputs) are applied to a copy
+
+    @param tab: value of the selected tab ('tab<n>')
+    @param content_ids: ids of the tab content containers
+    @param rendered: values of the tabs rendered so far
+    @param pending: loaded values of inputs in tabs not rendered yet
+    @return: tab contents, rendered tabs, remaining pending values
+    """
+    if tab in rendered:
+        raise PreventUpdate
+    n = int(tab[3:]) - 1
+    content = dl.tab_content(gui_input.main_frame_dicts, n)
+    tab_ids = {field.id for field in INPUT_SCHEMA.tab_fields(n)}
+    values = {k: v for k, v in (pending or {}).items() if k in tab_ids}
+    if values:
+        content = dl.set_input_values(content, values)
+        # values remain pending for inputs of other tabs only
+        pending = {k: v for k, v in pending.items() if k not in tab_ids}
+    return [content if content_id['id'] == tab else dash.no_update
+            for content_id in content_ids], rendered + [tab], pending
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='tab_controls',
+                       function_name='update_visibility'),
+    Output({'type': 'container', 'id': ALL, 'specifier': 'visibility'},
+           'style'),
+    Input({'type': 'input', 'id': ALL, 'specifier': 'dropdown_activate'},
+          'value'),
+    State({'type': 'container', 'id': ALL, 'specifier': 'visibility'}, 'id'),
+    State('control_maps', 'data')
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='tab_controls',
+                       function_name='update_disabled'),
+    Output({'type': ALL, 'id': ALL, 'specifier': 'disable_basewidth'},
+           'disabled'),
+    Input({'type': ALL, 'id': ALL, 'specifier': 'dropdown_activate_basewidth'},
+          'value'),
+    State({'type': ALL, 'id': ALL, 'specifier': 'dropdown_activate_basewidth'},
+          'id'),
+    State({'type': ALL, 'id': ALL, 'specifier': 'disable_basewidth'}, 'id'),
+    State('control_maps', 'data')
+)
+
+
 @app.callback(
     [Output('input_data', 'data'),
      Output('signal', 'data')],
@@ -337,9 +722,10 @@ def run_simulation(signal, input_data, modal_state):
     [State({'type': 'input', 'id': ALL, 'specifier': ALL}, 'value'),
      State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'value'),
      State({'type': 'input', 'id': ALL, 'specifier': ALL}, 'id'),
-     State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'id')],
+     State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'id'),
+     State('pending_inputs', 'data')],
     prevent_initial_call=True)
-def generate_inputs(n_click, inputs, inputs2, ids, ids2):
+def generate_inputs(n_click, inputs, inputs2, ids, ids2, pending):
     """
     #ToDO: Why seperation between run_simulation() and generate_inputs()
 
@@ -348,25 +734,43 @@ def generate_inputs(n_click, inputs, inputs2, ids, ids2):
     @param inputs2:
     @param ids:
     @param ids2:
+    @param pending: loaded values of inputs in tabs not rendered yet
     @return:
     """
 
-    dict_data = df.process_inputs(inputs, inputs2, ids, ids2)
-    input_data = {}
-    for k, v in dict_data.items():
-        input_data[k] = {'sim_name': k.split('-'), 'value': v}
+    input_data = INPUT_SCHEMA.input_data(inputs + inputs2, ids + ids2,
+                                         pending)
     return input_data, n_click
 
 
 @app.callback(
-    [Output('global_data_table', 'columns'),
+    [Output('results_manifest', 'data'),
+     Output('global_data_table', 'columns'),
      Output('global_data_table', 'data'),
-     Output('global_data_table', 'export_format')],
+     Output('global_data_table', 'export_format'),
+     Output('dropdown_heatmap', 'options'),
+     Output('dropdown_heatmap', 'value'),
+     Output('dropdown_line', 'options'),
+     Output('dropdown_line', 'value'),
+     Output('export_variables', 'options')],
     Input('result_data_store', 'data'),
     prevent_initial_call=True
 )
-def global_outputs_table(results):
-    global_result_dict = results[0]
+def update_result_widgets(run_id):
+    """
+    Fills global data table and variable dropdowns of a new run from its
+    manifest, which is loaded once and kept in results_manifest for the
+    sub variable dropdowns
+
+    @param run_id: run id from run_simulation
+    @return: manifest, table columns, data and export format, options and
+        values of heatmap and line graph dropdowns, export options
+    """
+    manifest = result_store.manifest(run_id)
+    if manifest is None:
+        raise PreventUpdate
+    simulation_cache.touch(run_id)
+    global_result_dict = manifest['global_data']
     names = list(global_result_dict.keys())
     values = [v['value'] for k, v in global_result_dict.items()]
     units = [v['units'] for k, v in global_result_dict.items()]
@@ -379,33 +783,24 @@ def global_outputs_table(results):
               column_names[1]: values[i],
               column_names[2]: units[i]} for i in range(len(values))]
 
-    return columns, datas, 'csv',
-
-
-@app.callback(
-    [Output('dropdown_heatmap', 'options'),
-     Output('dropdown_heatmap', 'value')],
-    Input('result_data_store', 'data'),
-    prevent_initial_call=True
-)
-def get_dropdown_options_heatmap(results):
-    local_data = results[1]
-    values = [{'label': key, 'value': key} for key in local_data
-              if 'xkey' in local_data[key]
-              and local_data[key]['xkey'] == 'Channel Location']
-    return values, 'Current Density'
+    variables = manifest['variables']
+    heatmap_options = [{'label': key, 'value': key} for key in variables
+                       if variables[key]['xkey'] == 'Channel Location']
+    line_options = [{'label': key, 'value': key} for key in variables]
+    return manifest, columns, datas, 'csv', heatmap_options, \
+        'Current Density', line_options, 'Current Density', line_options
 
 
-@app.callback(
-    [Output('dropdown_line', 'options'),
-     Output('dropdown_line', 'value')],
-    Input('result_data_store', 'data'),
-    prevent_initial_call=True
-)
-def get_dropdown_options_line_graph(results):
-    local_data = results[1]
-    values = [{'label': key, 'value': key} for key in local_data]
-    return values, 'Current Density'
+def sub_variable_options(manifest, dropdown_key):
+    """
+    Options, value and style of a sub variable dropdown
+    """
+    variable = manifest['variables'].get(dropdown_key)
+    sub_variables = None if variable is None else variable['sub_variables']
+    if sub_variables is None:
+        return [], None, {'visibility': 'hidden'}
+    options = [{'label': key, 'value': key} for key in sub_variables]
+    return options, options[0]['value'], {'visibility': 'visible'}
 
 
 @app.callback(
@@ -413,20 +808,12 @@ def get_dropdown_options_line_graph(results):
      Output('dropdown_heatmap_2', 'value'),
      Output('dropdown_heatmap_2', 'style')],
     [Input('dropdown_heatmap', 'value'),
-     Input('result_data_store', 'data')]
+     Input('results_manifest', 'data')]
 )
-def get_dropdown_options_heatmap_2(dropdown_key, results):
-    if dropdown_key is None or results is None:
+def get_dropdown_options_heatmap_2(dropdown_key, manifest):
+    if dropdown_key is None or manifest is None:
         raise PreventUpdate
-    else:
-        local_data = results[1]
-        if 'value' in local_data[dropdown_key]:
-            return [], None, {'visibility': 'hidden'}
-        else:
-            options = [{'label': key, 'value': key} for key in
-                       local_data[dropdown_key]]
-            value = options[0]['value']
-            return options, value, {'visibility': 'visible'}
+    return sub_variable_options(manifest, dropdown_key)
 
 
 @app.callback(
@@ -434,326 +821,377 @@ def get_dropdown_options_heatmap_2(dropdown_key, results):
      Output('dropdown_line2', 'value'),
      Output('dropdown_line2', 'style')],
     Input('dropdown_line', 'value'),
-    State('result_data_store', 'data'),
+    State('results_manifest', 'data'),
     prevent_initial_call=True
 )
-def get_dropdown_options_line_graph_2(dropdown_key, results):
-    if dropdown_key is None or results is None:
+def get_dropdown_options_line_graph_2(dropdown_key, manifest):
+    if dropdown_key is None or manifest is None:
         raise PreventUpdate
-    else:
-        local_data = results[1]
-        if 'value' in local_data[dropdown_key]:
-            return [], None, {'visibility': 'hidden'}
-        else:
-            options = [{'label': key, 'value': key} for key in
-                       local_data[dropdown_key]]
-            value = options[0]['value']
-            return options, value, {'visibility': 'visible'}
+    return sub_variable_options(manifest, dropdown_key)
+
+
+def report_expired_results(n_outputs):
+    """
+    Decorator of result callbacks with expired_run as additional last
+    output: if the results of the run are not stored anymore (ResultsExpired),
+    none of the n_outputs other outputs are updated and the run id is passed
+    to expired_run, which shows the modal (see show_expired_results)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                response = func(*args, **kwargs)
+            except ResultsExpired as E:
+                return (dash.no_update,) * n_outputs + (E.run_id,)
+            if n_outputs == 1:
+                response = (response,)
+            return tuple(response) + (dash.no_update,)
+        return wrapper
+    return decorator
+
+
+@app.callback(
+    Output('modal-title', 'children'),
+    Output('modal-body', 'children'),
+    Output('modal', 'is_open'),
+    Input('expired_run', 'data'),
+    prevent_initial_call=True
+)
+def show_expired_results(run_id):
+    """
+    Tells the user to run the simulation again, if results have been
+    requested after they have been removed from the result store
+
+    @param run_id: run id of the expired results
+    @return: modal title, modal body, modal state
+    """
+    if run_id is None:
+        raise PreventUpdate
+    modal_title, modal_body = dm.modal_process('results-expired')
+    return modal_title, modal_body, True
 
 
 @app.callback(
     Output("heatmap_graph", "figure"),
+    Output('expired_run', 'data'),
     [Input('dropdown_heatmap', 'value'),
      Input('dropdown_heatmap_2', 'value')],
     State('result_data_store', 'data'),
     prevent_initial_call=True
 )
-def update_heatmap_graph(dropdown_key, dropdown_key_2, results):
-    if dropdown_key is None or results is None:
+@report_expired_results(1)
+def update_heatmap_graph(dropdown_key, dropdown_key_2, run_id):
+    if dropdown_key is None or run_id is None:
         raise PreventUpdate
-    else:
-        local_data = results[1]
-
-        if 'value' in local_data[dropdown_key]:
-            zvalues = local_data[dropdown_key]['value']
-        elif dropdown_key_2 is not None:
-            zvalues = local_data[dropdown_key][dropdown_key_2]['value']
-        else:
-            raise PreventUpdate
-
-        x_key = local_data[dropdown_key]['xkey']
-        y_key = 'Cells'
-        xvalues = np.asarray(local_data[x_key]['value'])
-        if xvalues.ndim > 1:
-            xvalues = xvalues[0]
-        yvalues = np.asarray(local_data[y_key]['value'])
-        if yvalues.ndim > 1:
-            yvalues = yvalues[0]
-
-        n_y = len(yvalues)
-        n_x = xvalues.shape[-1]
-        n_z = yvalues.shape[-1]
+    results = result_store.open(run_id)
+    if results.variable(dropdown_key)['sub_variables'] is None:
+        dropdown_key_2 = None
+    elif dropdown_key_2 is None:
+        raise PreventUpdate
+    return figure_cache.get_or_build(
+        ('heatmap', run_id, dropdown_key, dropdown_key_2),
+        lambda: heatmap_figure(results, dropdown_key, dropdown_key_2))
 
-        if n_x == n_z + 1:
-            xvalues = ip.interpolate_1d(xvalues)
 
-        if dropdown_key_2 is None:
-            z_title = dropdown_key + ' / ' + local_data[dropdown_key]['units']
-        else:
-            z_title = dropdown_key + ' / ' \
-                      + local_data[dropdown_key][dropdown_key_2]['units']
-
-        # if n_y <= 20:
-        #     height = 300
-        # elif 20 < n_y <= 100:
-        #     height = 300 + n_y * 10.0
-        # else:
-        #     height = 1300
-
-        height = 800
-        # width = 500
-
-        font_props = dl.graph_font_props
-
-        base_axis_dict = \
-            {'tickfont': font_props['medium'],
-             'titlefont': font_props['large'],
-             'title': x_key + ' / ' + local_data[x_key]['units'],
-             'tickmode': 'array', 'showgrid': True}
-
-        tick_division_dict = \
-            {'fine': {'upper_limit': 10, 'value': 1},
-             'medium': {'upper_limit': 20, 'value': 2},
-             'medium_coarse': {'upper_limit': 50, 'value': 5},
-             'coarse': {'value': 10}}
-
-        def filter_tick_text(data, spacing=1):
-            return [str(data[i]) if i % spacing == 0 else ' '
-                    for i in range(len(data))]
-
-        def granular_tick_division(data, division=None):
-            n = len(data)
-            if division is None:
-                division = tick_division_dict
-            if n <= division['fine']['upper_limit']:
-                result = filter_tick_text(data, division['fine']['value'])
-            elif division['fine']['upper_limit'] < n \
-                    <= division['medium']['upper_limit']:
-                result = \
-                    filter_tick_text(data, division['medium']['value'])
-            elif division['medium']['upper_limit'] < n \
-                    <= division['medium_coarse']['upper_limit']:
-                result = filter_tick_text(
-                    data, division['medium_coarse']['value'])
-            else:
-                result = \
-                    filter_tick_text(data, division['coarse']['value'])
-            return result
-
-        # y_tick_labels[-1] = str(n_y - 1)
-
-        x_axis_dict = copy.deepcopy(base_axis_dict)
-        x_axis_dict['title'] = x_key + ' / ' + local_data[x_key]['units']
-        x_axis_dict['tickvals'] = local_data[x_key]['value']
-        x_axis_dict['ticktext'] = \
-            granular_tick_division(local_data[x_key]['value'])
-
-        y_axis_dict = copy.deepcopy(base_axis_dict)
-        y_axis_dict['title'] = y_key + ' / ' + local_data[y_key]['units']
-        y_axis_dict['tickvals'] = yvalues
-        y_axis_dict['ticktext'] = granular_tick_division(range(n_y))
-
-        z_axis_dict = copy.deepcopy(base_axis_dict)
-        z_axis_dict['title'] = z_title
-        # z_axis_dict['tickvals'] = zvalues
-
-        layout = go.Layout(
-            font=font_props['large'],
-            # title='Local Results in Heat Map',
-            titlefont=font_props['large'],
-            xaxis=x_axis_dict,
-            yaxis=y_axis_dict,
-            margin={'l': 75, 'r': 20, 't': 10, 'b': 20},
-            height=height
-        )
-        scene = dict(
-            xaxis=x_axis_dict,
-            yaxis=y_axis_dict,
-            zaxis=z_axis_dict)
-
-        heatmap = \
-            go.Surface(z=zvalues, x=xvalues, y=yvalues,  # xgap=1, ygap=1,
-                       colorbar={
-                           'tickfont': font_props['large'],
-                           'title': {
-                               'text': z_title,
-                               'font': {'size': font_props['large']['size']},
-                               'side': 'right'},
-                           # 'height': height - 300
-                           'lenmode': 'fraction',
-                           'len': 0.75
-                       })
-
-        fig = go.Figure(data=heatmap, layout=layout)
-        fig.update_layout(scene=scene)
+def heatmap_figure(results, dropdown_key, dropdown_key_2=None):
+    """
+    3D surface plot of a local variable over channel location and cells
 
+    @param results: ResultHandle of the run
+    @param dropdown_key: name of the local variable
+    @param dropdown_key_2: name of the sub variable, if any
+    @return: plotly figure
+    """
+    variables = results.variables
+    zvalues = results.array(dropdown_key, dropdown_key_2)
+
+    z_var = results.variable(dropdown_key, dropdown_key_2)
+
+    # node and cell-centred coordinates are precomputed at store time
+    x_key = variables[dropdown_key]['xkey']
+    y_key = 'Cells'
+    xvalues = results.axis(x_key, zvalues.shape[-1])
+    yvalues = results.axes(y_key)[0]
+
+    n_y = len(yvalues)
+
+    # Bound the size of the surface by averaging blocks of cells and nodes
+    xvalues, yvalues, zvalues = \
+        ds.block_average_surface(xvalues, yvalues, zvalues)
+
+    z_title = dropdown_key + ' / ' + z_var['units']
+
+    # if n_y <= 20:
+    #     height = 300
+    # elif 20 < n_y <= 100:
+    #     height = 300 + n_y * 10.0
+    # else:
+    #     height = 1300
+
+    height = 800
+    # width = 500
+
+    font_props = dl.graph_font_props
+
+    base_axis_dict = \
+        {'tickfont': font_props['medium'],
+         'titlefont': font_props['large'],
+         'title': x_key + ' / ' + variables[x_key]['units'],
+         'showgrid': True}
+
+    # spacing of the cell ticks by number of cells
+    tick_division = ((10, 1), (20, 2), (50, 5))
+
+    def cell_tick_spacing(n):
+        for upper_limit, spacing in tick_division:
+            if n <= upper_limit:
+                return spacing
+        return 10
+
+    # ticks of the channel location are placed by plotly, cell ticks are
+    # given by their spacing, so the size of the figure only depends on
+    # the (averaged) surface
+    x_axis_dict = copy.deepcopy(base_axis_dict)
+    x_axis_dict['title'] = x_key + ' / ' + variables[x_key]['units']
+
+    y_axis_dict = copy.deepcopy(base_axis_dict)
+    y_axis_dict['title'] = y_key + ' / ' + variables[y_key]['units']
+    y_axis_dict.update(tickmode='linear', tick0=0,
+                       dtick=cell_tick_spacing(n_y))
+
+    z_axis_dict = copy.deepcopy(base_axis_dict)
+    z_axis_dict['title'] = z_title
+
+    layout = go.Layout(
+        font=font_props['large'],
+        # title='Local Results in Heat Map',
+        titlefont=font_props['large'],
+        margin={'l': 75, 'r': 20, 't': 10, 'b': 20},
+        height=height
+    )
+    scene = dict(
+        xaxis=x_axis_dict,
+        yaxis=y_axis_dict,
+        zaxis=z_axis_dict)
+
+    heatmap = \
+        go.Surface(z=zvalues, x=xvalues, y=yvalues,  # xgap=1, ygap=1,
+                   # colorbar range of the complete (not averaged) values
+                   cmin=z_var.get('min'), cmax=z_var.get('max'),
+                   colorbar={
+                       'tickfont': font_props['large'],
+                       'title': {
+                           'text': z_title,
+                           'font': {'size': font_props['large']['size']},
+                           'side': 'right'},
+                       # 'height': height - 300
+                       'lenmode': 'fraction',
+                       'len': 0.75
+                   })
+
+    fig = go.Figure(data=heatmap, layout=layout)
+    fig.update_layout(scene=scene)
     return fig
 
 
 @app.callback(
     [Output('line_graph', 'figure'),
-     Output('cells_data', 'data'),
      Output('data_checklist', 'options'),
-     Output('data_checklist', 'value')],
+     Output('expired_run', 'data')],
     [Input('dropdown_line', 'value'),
      Input('dropdown_line2', 'value'),
-     Input('data_checklist', 'value'),
-     Input('select_all_button', 'n_clicks'),
-     Input('clear_all_button', 'n_clicks'),
-     Input('line_graph', 'restyleData')],
-    State('result_data_store', 'data'),
+     Input('line_graph', 'relayoutData')],
+    [State('result_data_store', 'data'),
+     State('data_checklist', 'value')],
     prevent_initial_call=True
 )
-def update_line_graph(drop1, drop2, checklist, select_all_clicks,
-                      clear_all_clicks, restyle_data, results):
+@report_expired_results(2)
+def update_line_graph(drop1, drop2, relayout_data, run_id, checklist):
+    """
+    Line graph with all cells visible for the selected variable; new cell
+    options reset the checklist and trace visibility is changed on the
+    client side (update_checklist and update_visibility in
+    assets/line_graph.js). Traces are decimated to a point budget and
+    refined to the visible x-range when zooming.
+    """
     ctx = dash.callback_context.triggered[0]['prop_id']
-    if drop1 is None or results is None:
+    if drop1 is None or run_id is None:
         raise PreventUpdate
-    else:
-
-        fig = go.Figure()
-        local_data = results[1]
-
-        default_x_key = 'Number'
-        x_key = local_data[drop1].get('xkey', default_x_key)
-
-        if drop2 is None:
-            y_title = drop1 + ' / ' + local_data[drop1]['units']
-        else:
-            y_title = drop1 + ' - ' + drop2 + ' / ' \
-                      + local_data[drop1][drop2]['units']
-
-        if x_key == default_x_key:
-            x_title = x_key + ' / -'
+    results = result_store.open(run_id)
+    if results.variable(drop1)['sub_variables'] is None:
+        drop2 = None
+    elif drop2 is None:
+        raise PreventUpdate
+    if 'line_graph.relayoutData' in ctx:
+        if relayout_data is None:
+            raise PreventUpdate
+        if 'xaxis.range[0]' in relayout_data:
+            x_range = [relayout_data['xaxis.range[0]'],
+                       relayout_data['xaxis.range[1]']]
+        elif 'xaxis.autorange' in relayout_data:
+            x_range = None
         else:
-            x_title = x_key + ' / ' + local_data[x_key]['units']
-
-        if 'Error' in y_title:
-            y_scale = 'log'
+            raise PreventUpdate
+        if x_range is None:
+            fig = figure_cache.get_or_build(
+                ('line', run_id, drop1, drop2),
+                lambda: line_graph_figure(results, drop1, drop2))['figure']
         else:
-            y_scale = 'linear'
-
-        layout = go.Layout(
-            font={'color': 'black', 'family': 'Arial'},
-            # title='Local Results in Heat Map',
-            titlefont={'size': 11, 'color': 'black'},
-            xaxis={'tickfont': {'size': 11}, 'titlefont': {'size': 14},
-                   'title': x_title},
-            yaxis={'tickfont': {'size': 11}, 'titlefont': {'size': 14},
-                   'title': y_title},
-            margin={'l': 100, 'r': 20, 't': 20, 'b': 20},
-            yaxis_type=y_scale)
+            fig = line_graph_figure(results, drop1, drop2,
+                                    x_range=x_range)['figure']
+        visible = set(checklist or [])
+        fig = {**fig, 'data': [
+            {**trace, 'visible': True if trace['name'] in visible
+             else 'legendonly'} for trace in fig['data']]}
+        return fig, dash.no_update
+    line_graph = figure_cache.get_or_build(
+        ('line', run_id, drop1, drop2),
+        lambda: line_graph_figure(results, drop1, drop2))
+    fig, cells = line_graph['figure'], line_graph['cells']
+
+    options = [{'label': cells[k]['name'], 'value': cells[k]['name']}
+               for k in cells]
+    return fig, options
+
+
+# The checklist value is only written by update_checklist and the figure
+# visibility only follows it, so there is no cycle between the callbacks
+app.clientside_callback(
+    ClientsideFunction(namespace='line_graph',
+                       function_name='update_checklist'),
+    Output('data_checklist', 'value'),
+    [Input('data_checklist', 'options'),
+     Input('select_all_button', 'n_clicks'),
+     Input('clear_all_button', 'n_clicks'),
+     Input('line_graph', 'restyleData')],
+    [State('line_graph', 'figure')],
+    prevent_initial_call=True
+)
 
-        fig.update_layout(layout)
+app.clientside_callback(
+    ClientsideFunction(namespace='line_graph',
+                       function_name='update_visibility'),
+    Output('line_graph', 'figure'),
+    Input('data_checklist', 'value'),
+    State('line_graph', 'figure'),
+    prevent_initial_call=True
+)
 
-        if 'value' in local_data[drop1]:
-            yvalues = np.asarray(local_data[drop1]['value'])
-        elif drop2 is not None:
-            yvalues = np.asarray(local_data[drop1][drop2]['value'])
-        else:
-            raise PreventUpdate
 
-        n_y = np.asarray(yvalues).shape[0]
-        if x_key in local_data:
-            xvalues = np.asarray(local_data[x_key]['value'])
-            if len(xvalues) == n_y + 1:
-                xvalues = ip.interpolate_1d(xvalues)
-        else:
-            xvalues = np.asarray(list(range(n_y)))
+def line_graph_figure(results, drop1, drop2=None, x_range=None):
+    """
+    Line plot of a local variable with one trace per cell, each trace
+    decimated to its share of the line point budget
+
+    @param results: ResultHandle of the run
+    @param drop1: name of the local variable
+    @param drop2: name of the sub variable, if any
+    @param x_range: [lower, upper] x-range to refine the traces to
+    @return: dict with figure (as dictionary) and names of the cells
+    """
+    fig = go.Figure()
+    variables = results.variables
 
-        if xvalues.ndim > 1:
-            xvalues = xvalues[0]
+    default_x_key = 'Number'
+    x_key = variables[drop1]['xkey'] or default_x_key
 
-        if yvalues.ndim == 1:
-            yvalues = [yvalues]
-        cells = {}
-        for num, yval in enumerate(yvalues):
-            fig.add_trace(go.Scatter(x=xvalues, y=yval,
-                                     mode='lines+markers',
-                                     name='Cell {}'.format(num)))
-            cells[num] = {'name': 'Cell {}'.format(num), 'data': yval}
+    if drop2 is None:
+        y_title = drop1 + ' / ' + variables[drop1]['units']
+    else:
+        y_title = drop1 + ' - ' + drop2 + ' / ' \
+                  + variables[drop1]['sub_variables'][drop2]['units']
 
-        options = [{'label': cells[k]['name'], 'value': cells[k]['name']}
-                   for k in cells]
-        value = ['Cell {}'.format(str(i)) for i in range(n_y)]
+    if x_key == default_x_key:
+        x_title = x_key + ' / -'
+    else:
+        x_title = x_key + ' / ' + variables[x_key]['units']
 
-        if checklist is None:
-            return fig, cells, options, value
-        else:
-            if 'clear_all_button.n_clicks' in ctx:
-                fig.for_each_trace(
-                    lambda trace: trace.update(visible='legendonly'))
-                return fig, cells, options, []
-            elif 'data_checklist.value' in ctx:
-                fig.for_each_trace(
-                    lambda trace: trace.update(
-                        visible=True) if trace.name in checklist
-                    else trace.update(visible='legendonly'))
-                return fig, cells, options, checklist
-            elif 'line_graph.restyleData' in ctx:
-                read = restyle_data[0]['visible']
-                if len(read) == 1:
-                    cell_name = cells[restyle_data[1][0]]['name']
-                    if read[0] is True:  # lose (legendonly)
-                        checklist.append(cell_name)
-                    else:
-                        if cell_name in checklist:
-                            checklist.remove(cell_name)
-                    value = [val for val in value if val in checklist]
-                else:
-                    value = [value[i] for i in range(n_y)
-                             if read[i] is True]
-                fig.for_each_trace(
-                    lambda trace: trace.update(
-                        visible=True) if trace.name in value
-                    else trace.update(visible='legendonly'))
-                # fig.plotly_restyle(restyle_data[0])
-                return fig, cells, options, value
-            else:
-                return fig, cells, options, value
+    if 'Error' in y_title:
+        y_scale = 'log'
+    else:
+        y_scale = 'linear'
+
+    layout = go.Layout(
+        font={'color': 'black', 'family': 'Arial'},
+        # title='Local Results in Heat Map',
+        titlefont={'size': 11, 'color': 'black'},
+        xaxis={'tickfont': {'size': 11}, 'titlefont': {'size': 14},
+               'title': x_title},
+        yaxis={'tickfont': {'size': 11}, 'titlefont': {'size': 14},
+               'title': y_title},
+        margin={'l': 100, 'r': 20, 't': 20, 'b': 20},
+        yaxis_type=y_scale,
+        # keep zoom state while traces are refined
+        uirevision=f'{drop1}-{drop2}')
+
+    fig.update_layout(layout)
+
+    yvalues = np.asarray(results.array(drop1, drop2))
+
+    n_x = yvalues.shape[-1]
+    if x_key in variables:
+        # nodes or cell centres, precomputed at store time
+        xvalues = results.axis(x_key, n_x)
+    else:
+        xvalues = np.arange(n_x)
+
+    if yvalues.ndim == 1:
+        yvalues = [yvalues]
+    # minimum, maximum and mean of each cell, precomputed at store time
+    stats = results.statistics(drop1, drop2)
+    cells = {}
+    max_points = ds.trace_point_budget(len(yvalues))
+    for num, yval in enumerate(yvalues):
+        x_plot, y_plot = ds.decimate_line(xvalues, yval, max_points,
+                                          x_range=x_range)
+        hover_template = '%{x:.4g}, %{y:.4g}'
+        if stats is not None:
+            hover_template += \
+                '<br>Cell min: {:.4g}, max: {:.4g}, mean: {:.4g}'.format(
+                    stats['min'][num], stats['max'][num],
+                    stats['mean'][num])
+        fig.add_trace(go.Scatter(x=x_plot, y=y_plot,
+                                 mode='lines+markers',
+                                 name='Cell {}'.format(num),
+                                 hovertemplate=hover_template))
+        cells[num] = {'name': 'Cell {}'.format(num)}
+    return {'figure': fig.to_dict(), 'cells': cells}
 
 
 @app.callback(
     [Output('table', 'columns'),
      Output('table', 'data'),
      Output('table', 'export_format'),
-     Output('append_check', 'data')],
+     Output('append_check', 'data'),
+     Output('expired_run', 'data')],
     [Input('export_b', 'n_clicks'),  # button1
      Input('append_b', 'n_clicks'),  # button2
      Input('clear_table_b', 'n_clicks')],
     [State('data_checklist', 'value'),  # from display
-     State('cells_data', 'data'),  # from line graph
+     State('dropdown_line', 'value'),
+     State('dropdown_line2', 'value'),
      State('result_data_store', 'data'),
      State('table', 'columns'),
      State('table', 'data'),
      State('append_check', 'data')],
     prevent_initial_call=True
 )
-def list_to_table(n1, n2, n3, data_checklist, cells_data, results,
+@report_expired_results(4)
+def list_to_table(n1, n2, n3, data_checklist, drop1, drop2, run_id,
                   table_columns, table_data, append_check):
+    """
+    Table of the line graph variable for the checked cells, built column-wise
+    from the stored arrays; appended tables are joined on channel location
+    """
     ctx = dash.callback_context.triggered[0]['prop_id']
-    if data_checklist is None or results is None:
+    if data_checklist is None or drop1 is None or run_id is None:
         raise PreventUpdate
     else:
-        local_data = results[1]
-        digit_list = \
-            sorted([int(re.sub('[^0-9\.]', '', inside))
-                    for inside in data_checklist])
-
         x_key = 'Channel Location'
-
-        index = [{'id': x_key, 'name': x_key,
-                  'deletable': True}]
-        columns = [{'deletable': True, 'renamable': True,
-                    'selectable': True, 'name': 'Cell {}'.format(d),
-                    'id': 'Cell {}'.format(d)} for d in digit_list]
-        # list with nested dict
-
-        xvalues = ip.interpolate_1d(np.asarray(local_data[x_key]['value']))
-        data = [{**{x_key: cell},
-                 **{cells_data[k]['name']: cells_data[k]['data'][num]
-                    for k in cells_data}}
-                for num, cell in enumerate(xvalues)]  # list with nested dict
+        results = result_store.open(run_id)
+        if results.variable(drop1)['sub_variables'] is None:
+            drop2 = None
 
         if append_check is None:
             appended = 0
@@ -761,37 +1199,29 @@ def list_to_table(n1, n2, n3, data_checklist, cells_data, results,
             appended = append_check
 
         if 'export_b.n_clicks' in ctx:
-            return index + columns, data, 'csv', appended
+            columns = df.local_table_columns(results, drop1, drop2,
+                                             data_checklist, x_key=x_key)
+            return df.table_column_specs(columns, x_key=x_key), \
+                df.columns_to_records(columns), 'csv', appended
         elif 'clear_table_b.n_clicks' in ctx:
             return [], [], 'none', appended
         elif 'append_b.n_clicks' in ctx:
-            if n1 is None or table_data == [] or table_columns == [] or \
-                    ctx == 'clear_table_b.n_clicks':
+            if n1 is None or not table_data or not table_columns:
                 raise PreventUpdate
             else:
                 appended += 1
-                app_columns = \
-                    [{'deletable': True, 'renamable': True,
-                      'selectable': True, 'name': 'Cell {}'.format(d),
-                      'id': 'Cell {}'.format(d) + '-' + str(appended)}
-                     for d in digit_list]
-                new_columns = table_columns + app_columns
-                app_datas = \
-                    [{**{x_key: cell},
-                      **{cells_data[k]['name'] + '-' + str(appended):
-                             cells_data[k]['data'][num]
-                         for k in cells_data}}
-                     for num, cell in enumerate(xvalues)]
-                new_data_list = []
-                new_data = \
-                    [{**table_data[i], **app_datas[i]}
-                     if table_data[i][x_key] == app_datas[i][x_key]
-                     else new_data_list.extend([table_data[i], app_datas[i]])
-                     for i in range(len(app_datas))]
-                new_data = list(filter(None.__ne__, new_data))
-                new_data.extend(new_data_list)
-
-                return new_columns, new_data, 'csv', appended
+                app_columns = df.local_table_columns(
+                    results, drop1, drop2, data_checklist,
+                    suffix='-' + str(appended), x_key=x_key)
+                table = df.records_to_columns(
+                    table_data, [col['id'] for col in table_columns])
+                new_table = df.merge_columns(table, app_columns, on=x_key)
+                new_columns = table_columns + [
+                    spec for spec in
+                    df.table_column_specs(app_columns, x_key=x_key)
+                    if spec['id'] != x_key]
+                return new_columns, df.columns_to_records(new_table), \
+                    'csv', appended
         else:
             if n1 is None or table_columns == []:
                 return table_columns, table_data, 'none', appended
@@ -799,9 +1229,307 @@ def list_to_table(n1, n2, n3, data_checklist, cells_data, results,
                 return table_columns, table_data, 'csv', appended
 
 
+@app.callback(
+    Output('profile_download', 'data'),
+    Input('profile_download_b', 'n_clicks'),
+    State('result_data_store', 'data'),
+    prevent_initial_call=True
+)
+def download_profile(n_clicks, run_id):
+    """
+    Zip archive with the stage breakdown and the cProfile statistics of the
+    profiled run shown in the dashboard (admins only)
+
+    @param n_clicks: profile_download_b clicks
+    @param run_id: run id of the shown results
+    @return: download data
+    """
+    if run_id is None or not profiling.is_admin():
+        raise PreventUpdate
+    profile = profiling.load_profile(caching_backend, run_id)
+    if profile is None:
+        raise PreventUpdate
+    return dcc.send_bytes(profile.write_archive, filename='profile.zip')
+
+
+@app.callback(
+    Output('table_download', 'data'),
+    Output('expired_run', 'data'),
+    Input('download_table_b', 'n_clicks'),
+    [State('data_checklist', 'value'),
+     State('dropdown_line', 'value'),
+     State('dropdown_line2', 'value'),
+     State('result_data_store', 'data')],
+    prevent_initial_call=True
+)
+@report_expired_results(1)
+def download_table(n_clicks, data_checklist, drop1, drop2, run_id):
+    """
+    CSV file of the line graph variable for the checked cells, written by
+    the CSV export directly from the stored arrays
+    """
+    if not data_checklist or drop1 is None or run_id is None:
+        raise PreventUpdate
+    results = result_store.open(run_id)
+    if results.variable(drop1)['sub_variables'] is None:
+        drop2 = None
+    name = drop1 if drop2 is None else drop1 + ' - ' + drop2
+    writer, filename = export.export_results(
+        results, 'csv', names=[(drop1, drop2)],
+        cells=df.cell_numbers(data_checklist), name=name)
+    return dcc.send_bytes(writer, filename)
+
+
+@app.callback(
+    Output('results_download', 'data'),
+    Output('expired_run', 'data'),
+    Input('export_results_b', 'n_clicks'),
+    [State('export_variables', 'value'),
+     State('export_format', 'value'),
+     State('data_checklist', 'value'),
+     State('result_data_store', 'data')],
+    prevent_initial_call=True
+)
+@report_expired_results(1)
+def export_local_results(n_clicks, names, file_format, data_checklist,
+                         run_id):
+    """
+    Download selected (or all) local variables of the checked (or all)
+    cells, written on the server directly from the stored arrays
+    """
+    if run_id is None:
+        raise PreventUpdate
+    cells = df.cell_numbers(data_checklist) if data_checklist else None
+    writer, filename = export.export_results(
+        result_store.open(run_id), file_format, names=names or None,
+        cells=cells)
+    return dcc.send_bytes(writer, filename)
+
+
+@app.callback(
+    Output('sweep_parameter_table', 'data'),
+    Input('sweep_parameters', 'value'),
+    State('sweep_parameter_table', 'data'),
+    prevent_initial_call=True
+)
+def sweep_parameter_rows(parameter_ids, rows):
+    """
+    Keeps one row of the sweep parameter table for each selected input ID
+    """
+    if parameter_ids is None:
+        raise PreventUpdate
+    rows = {row['id']: row for row in rows or []}
+    return [rows.get(id_l, {'id': id_l, 'start': None, 'stop': None,
+                            'steps': 5}) for id_l in parameter_ids]
+
+
+@app.callback(
+    Output('sweep_jobs', 'data'),
+    Output('sweep_results', 'data'),
+    Output('sweep_interval', 'disabled'),
+    Output('sweep_status', 'children'),
+    Output('modal-title', 'children'),
+    Output('modal-body', 'children'),
+    Output('modal', 'is_open'),
+    Input('sweep_button', 'n_clicks'),
+    State('sweep_parameter_table', 'data'),
+    State({'type': 'input', 'id': ALL, 'specifier': ALL}, 'value'),
+    State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'value'),
+    State({'type': 'input', 'id': ALL, 'specifier': ALL}, 'id'),
+    State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'id'),
+    State('pending_inputs', 'data'),
+    State('session_id', 'data'),
+    State('modal', 'is_open'),
+    prevent_initial_call=True
+)
+def run_sweep(n_clicks, parameters, inputs, inputs2, ids, ids2, pending,
+              session, modal_state):
+    """
+    Starts a parameter sweep with one simulation job for each point of the
+    parameter grid. Jobs are submitted in portions of the session job limit
+    of the admission control (see sweep.submit_points), executed in
+    parallel by the job queue and collected by collect_sweep, which submits
+    the next points as jobs finish; points simulated before are taken from
+    the simulation cache right away.
+    """
+    if not parameters:
+        raise PreventUpdate
+    try:
+        input_data = INPUT_SCHEMA.input_data(inputs + inputs2, ids + ids2,
+                                             pending)
+        results = {'parameters': [p['id'] for p in parameters], 'units': {},
+                   'rows': []}
+        sweep_jobs = {'input_data': input_data,
+                      'jobs': [{'point': point, 'job_id': None}
+                               for point in sweep.sweep_grid(parameters)]}
+        submit_sweep_points(sweep_jobs, results, session)
+    except Exception as E:
+        modal_title, modal_body = \
+            dm.modal_process('sweep-error', error=repr(E))
+        return None, dash.no_update, True, None, modal_title, modal_body, \
+            not modal_state
+    n_pending = len(sweep_jobs['jobs'])
+    status = dl.sweep_status_display(len(results['rows']),
+                                     len(results['rows']) + n_pending)
+    return sweep_jobs if n_pending else None, results, not n_pending, \
+        status, None, None, modal_state
+
+
+def add_sweep_result(results, point, run_id=None, error=None):
+    """
+    Adds the global results of run_id (or the error) of a sweep point to
+    the sweep results
+    """
+    if error is None:
+        try:
+            global_data = result_store.open(run_id).global_data
+        except ResultsExpired as E:
+            error = str(E)
+    if error is not None:
+        results['rows'].append({**point, 'Error': error})
+        return
+    results['units'].update({k: v['units'] for k, v in global_data.items()})
+    results['rows'].append(sweep.result_row(point, global_data))
+
+
+def submit_sweep_points(sweep_jobs, results, session):
+    """
+    Submits further points of the sweep as far as the session job limit of
+    the admission control allows; finished points are added to results
+    """
+    def submit(point):
+        settings, overlay = simulation.prepare_settings(
+            sweep.point_input_data(sweep_jobs['input_data'], point),
+            simulation.OUTPUT_OVERRIDES)
+        job_id = simulation.settings_key(overlay)
+        run_id, _ = submit_simulation(job_id, settings, session)
+        return job_id, run_id
+
+    sweep_jobs['jobs'], finished = sweep.submit_points(
+        sweep_jobs['jobs'], admission.max_session_active, submit)
+    for point, run_id, error in finished:
+        add_sweep_result(results, point, run_id, error)
+
+
+@app.callback(
+    Output('sweep_jobs', 'data'),
+    Output('sweep_results', 'data'),
+    Output('sweep_interval', 'disabled'),
+    Output('sweep_status', 'children'),
+    Input('sweep_interval', 'n_intervals'),
+    State('sweep_jobs', 'data'),
+    State('sweep_results', 'data'),
+    State('session_id', 'data'),
+    prevent_initial_call=True
+)
+def collect_sweep(n_intervals, sweep_jobs, results, session):
+    """
+    Adds the results of finished sweep jobs to the sweep results as soon as
+    they are available and submits the next points of the sweep
+    """
+    if not sweep_jobs or results is None:
+        raise PreventUpdate
+    n_rows = len(results['rows'])
+    previous_jobs = list(sweep_jobs['jobs'])
+    submitted = [job for job in sweep_jobs['jobs']
+                 if job['job_id'] is not None]
+    statuses = job_statuses([job['job_id'] for job in submitted])
+    done = set()
+    for job in submitted:
+        job_id = job['job_id']
+        status = statuses[job_id]
+        if status is None:
+            if simulation_cache.get(job_id) is not None:
+                status = {'state': jobs.FINISHED}
+            else:
+                status = {'state': jobs.FAILED, 'error': 'Job has been lost'}
+        elif status['state'] == jobs.FINISHED:
+            collect_simulation(job_id, status)
+
+        if status['state'] == jobs.FINISHED:
+            add_sweep_result(results, job['point'], job_id)
+        elif status['state'] == jobs.FAILED:
+            add_sweep_result(results, job['point'], error=status['error'])
+        elif status['state'] == jobs.CANCELLED:
+            add_sweep_result(results, job['point'],
+                             error='Simulation has been stopped')
+        else:
+            continue
+        done.add(id(job))
+    sweep_jobs['jobs'] = [job for job in sweep_jobs['jobs']
+                          if id(job) not in done]
+    submit_sweep_points(sweep_jobs, results, session)
+    if len(results['rows']) == n_rows \
+            and sweep_jobs['jobs'] == previous_jobs:
+        raise PreventUpdate
+    n_pending = len(sweep_jobs['jobs'])
+    status = dl.sweep_status_display(len(results['rows']),
+                                     len(results['rows']) + n_pending)
+    return sweep_jobs if n_pending else None, results, not n_pending, status
+
+
+@app.callback(
+    Output('sweep_table', 'columns'),
+    Output('sweep_table', 'data'),
+    Output('dropdown_sweep', 'options'),
+    Output('dropdown_sweep', 'value'),
+    Output('sweep_graph', 'figure'),
+    Output('sweep_container', 'style'),
+    Input('sweep_results', 'data'),
+    Input('dropdown_sweep', 'value'),
+    prevent_initial_call=True
+)
+def update_sweep_results(results, y_key):
+    """
+    Table and plot of the global results over the first sweep parameter;
+    further sweep parameters are shown as separate lines
+    """
+    if not results or not results['rows']:
+        raise PreventUpdate
+    parameters = results['parameters']
+    units = results['units']
+    rows = sorted(results['rows'],
+                  key=lambda row: [row[p] for p in parameters])
+    quantities = [k for k in units if k not in parameters]
+    if y_key not in quantities:
+        y_key = quantities[0] if quantities else None
+
+    column_ids = parameters + quantities
+    if any('Error' in row for row in rows):
+        column_ids.append('Error')
+    columns = [{'name': k + (' / ' + units[k] if units.get(k) else ''),
+                'id': k} for k in column_ids]
+    options = [{'label': k, 'value': k} for k in quantities]
+
+    fig = go.Figure()
+    if y_key is not None:
+        x_key = parameters[0]
+        groups = {}
+        for row in rows:
+            if y_key in row:
+                label = ', '.join(f'{p} = {row[p]:.4g}'
+                                  for p in parameters[1:])
+                groups.setdefault(label, []).append(row)
+        for label, group in groups.items():
+            fig.add_trace(go.Scatter(x=[row[x_key] for row in group],
+                                     y=[row[y_key] for row in group],
+                                     mode='lines+markers',
+                                     name=label or y_key))
+        fig.update_layout(
+            font={'color': 'black', 'family': 'Arial'},
+            xaxis={'tickfont': {'size': 11}, 'titlefont': {'size': 14},
+                   'title': x_key},
+            yaxis={'tickfont': {'size': 11}, 'titlefont': {'size': 14},
+                   'title': y_key + ' / ' + str(units.get(y_key, '-'))},
+            margin={'l': 100, 'r': 20, 't': 20, 'b': 20},
+            showlegend=len(parameters) > 1)
+    return columns, rows, options, y_key, fig, None
+
+
 @app.callback(
     [Output({'type': 'input', 'id': ALL, 'specifier': ALL}, 'value'),
      Output({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'value'),
+     Output('pending_inputs', 'data'),
      Output('upload-file', 'contents'),
      Output('modal-title', 'children'),
      Output('modal-body', 'children'),
@@ -812,57 +1540,49 @@ def list_to_table(n1, n2, n3, data_checklist, cells_data, results,
      State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'value'),
      State({'type': 'input', 'id': ALL, 'specifier': ALL}, 'id'),
      State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'id'),
+     State('pending_inputs', 'data'),
      State('modal', 'is_open')]
 )
-def load_settings(contents, filename, value, multival, ids, ids2,
+def load_settings(contents, filename, value, multival, ids, ids2, pending,
                   modal_state):
     if contents is None:
         raise PreventUpdate
     else:
         if 'json' in filename:
             try:
-                j_file, err_l = df.parse_contents(contents)
-
-                dict_ids = {id_l: val for id_l, val in
-                            zip([id_l['id'] for id_l in ids], value)}
-                dict_ids2 = {id_l: val for id_l, val in
-                             zip([id_l['id'] for id_l in ids2], multival)}
-
-                id_match = set.union(set(dict_ids),
-                                     set([item[:-2] for item in dict_ids2]))
-
-                for k, v in j_file.items():
-                    if k in id_match:
-                        if isinstance(v, list):
-                            for num, val in enumerate(v):
-                                dict_ids2[k + f'_{num}'] = df.check_ifbool(val)
-                        else:
-                            dict_ids[k] = df.check_ifbool(v)
-                    else:
-                        continue
+                j_file, err_l = df.parse_contents(
+                    contents, INPUT_SCHEMA.entry_names)
+
+                new_value = INPUT_SCHEMA.update_values(j_file, value, ids)
+                new_multival = \
+                    INPUT_SCHEMA.update_values(j_file, multival, ids2)
+                # Inputs of tabs not rendered yet get their values when
+                # the tab is rendered
+                new_pending = INPUT_SCHEMA.pending_values(
+                    j_file, ids + ids2, pending)
 
                 if not err_l:
                     # All JSON settings match Dash IDs
                     modal_title, modal_body = dm.modal_process('loaded')
-                    return list(dict_ids.values()), list(dict_ids2.values()), \
+                    return new_value, new_multival, new_pending, \
                         None, modal_title, modal_body, not modal_state
                 else:
                     # Some JSON settings do not match Dash IDs; return values
                     # that matched with Dash IDs
                     modal_title, modal_body = \
                         dm.modal_process('id-not-loaded', err_l)
-                    return list(dict_ids.values()), list(dict_ids2.values()), \
+                    return new_value, new_multival, new_pending, \
                         None, modal_title, modal_body, not modal_state
             except Exception as E:
                 # Error / JSON file cannot be processed; return old value
                 modal_title, modal_body = \
                     dm.modal_process('error', error=repr(E))
-                return value, multival, None, modal_title, modal_body, \
-                    not modal_state
+                return value, multival, pending, None, modal_title, \
+                    modal_body, not modal_state
         else:
             # Not JSON file; return old value
             modal_title, modal_body = dm.modal_process('wrong-file')
-            return value, multival, None, modal_title, modal_body, \
+            return value, multival, pending, None, modal_title, modal_body, \
                 not modal_state
 
 
@@ -872,10 +1592,11 @@ def load_settings(contents, filename, value, multival, ids, ids2,
     [State({'type': 'input', 'id': ALL, 'specifier': ALL}, 'value'),
      State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'value'),
      State({'type': 'input', 'id': ALL, 'specifier': ALL}, 'id'),
-     State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'id')],
+     State({'type': 'multiinput', 'id': ALL, 'specifier': ALL}, 'id'),
+     State('pending_inputs', 'data')],
     prevent_initial_call=True,
 )
-def save_settings(n_clicks, val1, val2, ids, ids2):
+def save_settings(n_clicks, val1, val2, ids, ids2, pending):
     """
 
     @param n_clicks:
@@ -883,15 +1604,16 @@ def save_settings(n_clicks, val1, val2, ids, ids2):
     @param val2:
     @param ids:
     @param ids2:
+    @param pending: loaded values of inputs in tabs not rendered yet
     @return:
     """
     save_complete = True
 
-    dict_data = df.process_inputs(val1, val2, ids, ids2)  # values first
+    dict_data = INPUT_SCHEMA.values(val1 + val2, ids + ids2, pending)
 
     if not save_complete:  # ... save only GUI inputs
-        sep_id_list = [joined_id.split('-') for joined_id in
-                       dict_data.keys()]
+        sep_id_list = [INPUT_SCHEMA.sim_paths.get(name, name.split('-'))
+                       for name in dict_data]
 
         val_list = dict_data.values()
         new_dict = {}
@@ -912,22 +1634,22 @@ def save_settings(n_clicks, val1, val2, ids, ids2):
 
         # code portion of generate_inputs()
         # ------------------------
-        input_data = {}
-        for k, v in dict_data.items():
-            input_data[k] = {'sim_name': k.split('-'), 'value': v}
+        input_data = {name: {'sim_name': list(INPUT_SCHEMA.sim_paths.get(
+            name, name.split('-'))), 'value': val}
+            for name, val in dict_data.items()}
 
         # code portion of run_simulation()
         # ------------------------
 
-        pemfc_base_dir = os.path.dirname(pemfc.__file__)
-        with open(os.path.join(pemfc_base_dir, 'settings', 'settings.json')) \
-                as file:
-            settings = json.load(file)
-        settings, _ = data_transfer.gui_to_sim_transfer(input_data, settings)
+        settings = simulation.create_settings(input_data)
 
         return dict(content=json.dumps(settings, indent=2),
                     filename='settings.json')
 
 
 if __name__ == "__main__":
+    from pemfc_dash.dash_app import prepare_cache
+    from pemfc_dash.metrics import reset
+    prepare_cache()
+    reset()
     app.run_server(debug=True, use_reloader=False)
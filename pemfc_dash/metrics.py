@@ -0,0 +1,341 @@
+"""
+Callback instrumentation exposed in the Prometheus text format
+
+Every server-side callback registered on the app is wrapped to record per
+callback: wall time of the whole update request (including serialization of
+the response), time spent loading from and storing to the caching backend,
+size of the serialized response and the number of errors. The metrics are
+served on the /metrics route of the Flask server.
+
+Each process keeps its own counters and writes a snapshot of them to
+METRICS_DIR at most every SNAPSHOT_INTERVAL seconds; /metrics sums the
+snapshots of all processes, so the totals do not depend on which gunicorn
+worker serves the scrape. Snapshots of finished processes are kept, so all
+counters only increase until the snapshots are removed on startup. Further
+per-process counters (e.g. cache hits) are registered with
+add_process_counter and summed the same way.
+"""
+import collections
+import functools
+import glob
+import os
+import pickle
+import threading
+import time
+
+import flask
+from dash.exceptions import PreventUpdate
+
+METRICS_DIR = os.environ.get('PEMFC_DASH_METRICS_DIR', '/temp/metrics')
+# Minimum seconds between two snapshots of a process
+SNAPSHOT_INTERVAL = 5.0
+# Upper bounds of the callback duration histogram in seconds
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = 'pemfc_dash_callback'
+
+COUNTERS = ('requests', 'errors', 'seconds', 'response_bytes', 'loads',
+            'load_seconds', 'stores', 'store_seconds')
+
+# Backend methods reading or writing the cache
+BACKEND_OPERATIONS = {'get': 'load', 'get_many': 'load', 'has': 'load',
+                      'set': 'store', 'set_many': 'store', 'add': 'store',
+                      'delete': 'store'}
+
+
+def reset(directory=METRICS_DIR):
+    """
+    Remove snapshots of previous runs (only the snapshot files, the
+    directory may be shared); called once on startup
+    """
+    os.makedirs(directory, exist_ok=True)
+    for pattern in ('*.pkl', '*.pkl.tmp'):
+        for path in glob.glob(os.path.join(directory, pattern)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _new_entry():
+    entry = dict.fromkeys(COUNTERS, 0)
+    entry['buckets'] = [0] * len(DURATION_BUCKETS)
+    return entry
+
+
+def _merge(total, entries):
+    for name, entry in entries.items():
+        target = total[name]
+        for key in COUNTERS:
+            target[key] += entry[key]
+        target['buckets'] = [a + b for a, b in zip(target['buckets'],
+                                                   entry['buckets'])]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _labels(**labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(val)}"'
+                          for key, val in labels.items()) + '}'
+
+
+class CallbackMetrics:
+
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self.callbacks = collections.defaultdict(_new_entry)
+        self.collectors = []
+        self.process_counters = {}
+        self._snapshot_time = 0.0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _check_fork(self):
+        # counters inherited from the preloading master are not counted
+        # again by its forked workers
+        if self._pid != os.getpid():
+            self.callbacks.clear()
+            self._snapshot_time = 0.0
+            self._pid = os.getpid()
+
+    def add_collector(self, collector):
+        """
+        Register function returning further metrics as
+        [(name, type, help, [(labels, value), ...]), ...]
+        """
+        self.collectors.append(collector)
+
+    def add_process_counter(self, name, help_text, counter):
+        """
+        Register counter of this process, given by function returning its
+        current value; the values of all processes are summed on /metrics
+        """
+        self.process_counters[name] = (help_text, counter)
+
+    def _counter_values(self):
+        values = {}
+        for name, (_, counter) in self.process_counters.items():
+            try:
+                values[name] = counter()
+            except Exception:
+                continue
+        return values
+
+    # --- recording ---
+
+    def wrap_callback(self, func):
+        """
+        Wrap callback function to attribute the current update request to
+        it; errors other than PreventUpdate are counted
+        """
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if flask.has_request_context():
+                flask.g.metrics_callback = name
+            try:
+                return func(*args, **kwargs)
+            except PreventUpdate:
+                raise
+            except Exception:
+                if flask.has_request_context():
+                    flask.g.metrics_error = True
+                raise
+
+        return wrapper
+
+    def wrap_backend_method(self, operation, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not flask.has_request_context():
+                return method(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timings = flask.g.setdefault('metrics_backend',
+                                             {'load': [0, 0.0],
+                                              'store': [0, 0.0]})
+                timings[operation][0] += 1
+                timings[operation][1] += time.perf_counter() - start
+
+        return wrapper
+
+    def instrument_backend(self, backend):
+        """
+        Time the load and store methods of a cachelib compatible backend;
+        the methods are wrapped on the instance, so the backend type is
+        unchanged
+        """
+        for method_name, operation in BACKEND_OPERATIONS.items():
+            method = getattr(backend, method_name, None)
+            if method is not None:
+                setattr(backend, method_name,
+                        self.wrap_backend_method(operation, method))
+        return backend
+
+    def instrument(self, app):
+        """
+        Wrap all callbacks registered on app from now on and add the
+        /metrics route to its server
+        """
+        callback = app.callback
+
+        @functools.wraps(callback)
+        def instrumented_callback(*args, **kwargs):
+            register = callback(*args, **kwargs)
+
+            def decorator(func):
+                register(self.wrap_callback(func))
+                # the module keeps the plain function for direct calls
+                return func
+
+            return decorator
+
+        app.callback = instrumented_callback
+        server = app.server
+        server.before_request(self._before_request)
+        server.after_request(self._after_request)
+        server.add_url_rule('/metrics', 'metrics', self.response)
+
+    def _before_request(self):
+        flask.g.metrics_start = time.perf_counter()
+
+    def _after_request(self, response):
+        name = flask.g.get('metrics_callback')
+        if name is None:
+            return response
+        elapsed = time.perf_counter() - flask.g.metrics_start
+        backend = flask.g.get('metrics_backend',
+                              {'load': [0, 0.0], 'store': [0, 0.0]})
+        size = response.calculate_content_length() or 0
+        with self._lock:
+            self._check_fork()
+            entry = self.callbacks[name]
+            entry['requests'] += 1
+            entry['errors'] += int(flask.g.get('metrics_error', False))
+            entry['seconds'] += elapsed
+            entry['response_bytes'] += size
+            entry['loads'] += backend['load'][0]
+            entry['load_seconds'] += backend['load'][1]
+            entry['stores'] += backend['store'][0]
+            entry['store_seconds'] += backend['store'][1]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if elapsed <= bound:
+                    entry['buckets'][i] += 1
+            self._snapshot()
+        return response
+
+    # --- snapshots ---
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f'{pid}.pkl')
+
+    def _snapshot(self, force=False):
+        now = time.time()
+        if not force and now - self._snapshot_time < SNAPSHOT_INTERVAL:
+            return
+        self._snapshot_time = now
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._snapshot_path(self._pid)
+            with open(path + '.tmp', 'wb') as file:
+                pickle.dump({'callbacks': dict(self.callbacks),
+                             'counters': self._counter_values()}, file)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+    def totals(self):
+        """
+        Callback counters of all processes by callback name and the sums of
+        the process counters {name: value}
+        """
+        total = collections.defaultdict(_new_entry)
+        with self._lock:
+            self._check_fork()
+            _merge(total, self.callbacks)
+            own = self._snapshot_path(self._pid)
+        counters = self._counter_values()
+        for path in glob.glob(os.path.join(self.directory, '*.pkl')):
+            if path == own:
+                continue
+            try:
+                with open(path, 'rb') as file:
+                    snapshot = pickle.load(file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+            _merge(total, snapshot['callbacks'])
+            for name, value in snapshot['counters'].items():
+                if name in counters:
+                    counters[name] += value
+        return total, counters
+
+    # --- exposition ---
+
+    def render(self):
+        """
+        All metrics in the Prometheus text format
+        """
+        total, counters = self.totals()
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(**labels)} {value}')
+
+        names = sorted(total)
+        lines.append(f'# HELP {PREFIX}_duration_seconds Wall time of '
+                     f'callback requests including serialization')
+        lines.append(f'# TYPE {PREFIX}_duration_seconds histogram')
+        for name in names:
+            entry = total[name]
+            for bound, count in zip(DURATION_BUCKETS, entry['buckets']):
+                lines.append(f'{PREFIX}_duration_seconds_bucket'
+                             f'{_labels(callback=name, le=bound)} {count}')
+            lines.append(f'{PREFIX}_duration_seconds_bucket'
+                         f'{_labels(callback=name, le="+Inf")} '
+                         f'{entry["requests"]}')
+            lines.append(f'{PREFIX}_duration_seconds_sum'
+                         f'{_labels(callback=name)} {entry["seconds"]}')
+            lines.append(f'{PREFIX}_duration_seconds_count'
+                         f'{_labels(callback=name)} {entry["requests"]}')
+        metric(f'{PREFIX}_errors_total', 'counter',
+               'Callback requests raising an error',
+               [({'callback': name}, total[name]['errors'])
+                for name in names])
+        metric(f'{PREFIX}_response_bytes_total', 'counter',
+               'Serialized size of callback responses',
+               [({'callback': name}, total[name]['response_bytes'])
+                for name in names])
+        metric(f'{PREFIX}_backend_seconds_total', 'counter',
+               'Time spent loading from and storing to the caching backend',
+               [({'callback': name, 'operation': op},
+                 total[name][op + '_seconds'])
+                for name in names for op in ('load', 'store')])
+        metric(f'{PREFIX}_backend_operations_total', 'counter',
+               'Number of loads from and stores to the caching backend',
+               [({'callback': name, 'operation': op}, total[name][op + 's'])
+                for name in names for op in ('load', 'store')])
+        for name, value in counters.items():
+            metric(name, 'counter', self.process_counters[name][0],
+                   [({}, value)])
+        for collector in self.collectors:
+            try:
+                collected = collector()
+            except Exception:
+                continue
+            for name, metric_type, help_text, samples in collected:
+                metric(name, metric_type, help_text, samples)
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return flask.Response(self.render(),
+                              mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,274 @@
+"""
+Opt-in profiling of single simulation runs
+
+A profiled run records the time spent in each stage of the simulation
+pipeline (gui_to_sim_transfer, solver, result_conversion,
+store_serialization) and deterministic profiles (cProfile) of the parts
+executed by the web worker and the job process. Stages are marked in the
+code by `with profiling.stage(name)`, which costs a thread-local lookup
+only while no profile is active. Nested stages are counted exclusively, so
+the stage times add up to the profiled time.
+
+Profiling is available to admins only: the environment variable
+PEMFC_DASH_ADMIN_TOKEN must be set and entered on the /admin page, which
+sets the admin cookie (HttpOnly, derived from the token), see
+add_admin_login. The token is not passed in the url, so it does not show up
+in access logs, the browser history or Referer headers.
+"""
+import contextlib
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import tempfile
+import threading
+import time
+import zipfile
+
+import flask
+
+ADMIN_TOKEN = os.environ.get('PEMFC_DASH_ADMIN_TOKEN')
+ADMIN_COOKIE = 'pemfc_dash_admin'
+# Seconds until admins have to log in again
+ADMIN_COOKIE_AGE = 12 * 60 * 60
+
+ADMIN_LOGIN_FORM = """<!DOCTYPE html>
+<title>pemfc-dash admin</title>
+<form method="post">
+  <input type="password" name="token" placeholder="Admin token" autofocus>
+  <button type="submit">Log in</button>
+</form>
+"""
+
+PREFIX = 'profile'
+# Job ids of profiled runs are the settings key with this prefix, so they
+# are not coalesced with unprofiled runs of the same settings
+JOB_PREFIX = 'profile.'
+
+_local = threading.local()
+
+
+def _admin_cookie_value():
+    return hmac.new(ADMIN_TOKEN.encode(), ADMIN_COOKIE.encode(),
+                    'sha256').hexdigest()
+
+
+def is_admin():
+    """
+    Check the admin cookie of the current request
+    """
+    if not ADMIN_TOKEN or not flask.has_request_context():
+        return False
+    cookie = flask.request.cookies.get(ADMIN_COOKIE)
+    return cookie is not None and hmac.compare_digest(
+        cookie.encode(), _admin_cookie_value().encode())
+
+
+def admin_login():
+    """
+    Login form for admins; the correct admin token (POST) sets the admin
+    cookie and redirects to the dashboard
+    """
+    if flask.request.method == 'POST':
+        token = flask.request.form.get('token', '')
+        if ADMIN_TOKEN and hmac.compare_digest(token.encode(),
+                                               ADMIN_TOKEN.encode()):
+            response = flask.redirect('/')
+            response.set_cookie(ADMIN_COOKIE, _admin_cookie_value(),
+                                max_age=ADMIN_COOKIE_AGE, httponly=True,
+                                samesite='Strict',
+                                secure=flask.request.is_secure)
+            return response
+        return ADMIN_LOGIN_FORM, 403
+    return ADMIN_LOGIN_FORM
+
+
+def add_admin_login(server):
+    """
+    Add the /admin login route to the Flask server
+    """
+    server.add_url_rule('/admin', 'admin_login', admin_login,
+                        methods=['GET', 'POST'])
+
+
+def job_id(settings_key):
+    return JOB_PREFIX + settings_key
+
+
+def is_profile_job(job_id):
+    return job_id.startswith(JOB_PREFIX)
+
+
+def settings_key(job_id):
+    return job_id[len(JOB_PREFIX):]
+
+
+class RunProfile:
+    """
+    Stage times {stage: seconds} and marshalled cProfile statistics
+    {part: bytes} of a profiled run
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.parts = {}
+        self.stats = {}
+        self._stack = []
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def profile(self, part):
+        """
+        Run cProfile and measure the wall time of part (e.g. 'web', 'job')
+        """
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is active in this process, only the wall
+            # time is recorded
+            profiler = None
+        try:
+            yield self
+        finally:
+            self.parts[part] = self.parts.get(part, 0.0) \
+                + time.perf_counter() - start
+            if profiler is None:
+                return
+            profiler.disable()
+            profiler.create_stats()
+            stats = profiler.stats
+            if part in self.stats:
+                combined = self._load_stats(self.stats[part])
+                combined.add(self._load_stats(marshal.dumps(stats)))
+                stats = combined.stats
+            self.stats[part] = marshal.dumps(stats)
+
+    def merge(self, other):
+        for name, seconds in other.stages.items():
+            self.add_stage(name, seconds)
+        for part, seconds in other.parts.items():
+            self.parts[part] = self.parts.get(part, 0.0) + seconds
+        self.stats.update(other.stats)
+
+    def __getstate__(self):
+        return {'stages': self.stages, 'parts': self.parts,
+                'stats': self.stats}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.__dict__.update(state)
+
+    @staticmethod
+    def _load_stats(data):
+        with tempfile.NamedTemporaryFile(suffix='.prof', delete=False) \
+                as file:
+            file.write(data)
+        try:
+            return pstats.Stats(file.name)
+        finally:
+            os.remove(file.name)
+
+    def report(self, limit=40):
+        """
+        Text report: stage breakdown, wall time of each part and the top
+        functions of each part by cumulative time
+        """
+        total = sum(self.stages.values())
+        lines = ['Stage breakdown', '']
+        for name, seconds in sorted(self.stages.items(),
+                                    key=lambda item: -item[1]):
+            share = seconds / total * 100.0 if total else 0.0
+            lines.append('{:<24} {:>10.3f} s {:>6.1f} %'.format(
+                name, seconds, share))
+        lines += ['', 'Profiled parts', '']
+        for part, seconds in self.parts.items():
+            lines.append('{:<24} {:>10.3f} s'.format(part, seconds))
+        for part, data in self.stats.items():
+            stream = io.StringIO()
+            stats = self._load_stats(data)
+            stats.stream = stream
+            stats.sort_stats('cumulative').print_stats(limit)
+            lines += ['', '', 'Profile of part: ' + part, '',
+                      stream.getvalue()]
+        return '\n'.join(lines)
+
+    def write_archive(self, buffer):
+        """
+        Zip archive with the text report and the statistics of each part
+        in the .prof format of pstats (e.g. for snakeviz)
+        """
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('profile.txt', self.report())
+            for part, data in self.stats.items():
+                archive.writestr(part + '.prof', data)
+
+
+def active_profile():
+    return getattr(_local, 'profile', None)
+
+
+@contextlib.contextmanager
+def activate(profile):
+    """
+    Record stages of the current thread in profile (None: no profiling)
+    """
+    previous = active_profile()
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Record the time of a pipeline stage in the active profile, excluding
+    the time of nested stages
+    """
+    profile = active_profile()
+    if profile is None:
+        yield
+        return
+    stack = profile._stack
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = stack.pop()
+        profile.add_stage(name, elapsed - nested)
+        if stack:
+            stack[-1] += elapsed
+
+
+def profiled_run(settings):
+    """
+    Job function of profiled runs: simulation.run within the job process
+    profile; returns {'result': result, 'profile': RunProfile}
+    """
+    from pemfc_dash import simulation
+
+    profile = RunProfile()
+    with activate(profile), profile.profile('job'):
+        result = simulation.run(settings)
+    return {'result': result, 'profile': profile}
+
+
+def store_profile(backend, name, profile, timeout=24 * 60 * 60):
+    backend.set(f'{PREFIX}:{name}', profile, timeout=timeout)
+
+
+def load_profile(backend, name):
+    return backend.get(f'{PREFIX}:{name}')
+
+
+def delete_profile(backend, name):
+    backend.delete(f'{PREFIX}:{name}')
@@ -0,0 +1,430 @@
+"""
+Storage of simulation results on the caching backend
+
+The local results of a run are split into one contiguous NumPy array per
+variable, stored in .npy format under its own key, together with a small
+index holding keys, units, xkey, shape and dtype of each variable. Callbacks
+therefore load only the index and the arrays they actually need instead of
+deserializing the complete result. Runs are identified by content (digest of
+their settings) and never change once stored, so every loaded field is
+memoized in a per-process LRU cache.
+
+Additionally, a compact manifest of each run is stored, holding the global
+data and names, units, xkey, shape and value range of each local variable
+(no storage keys), from which the result widgets are filled.
+
+Numeric work needed by the plots is done once at store time: node and
+cell-centred coordinates of each x-axis variable (index['axes']) and the
+minimum, maximum and mean of each variable per cell (array of shape
+(3, number of cells) under the variable key + ':stats', shown in the hover
+text of the line graph).
+
+Index structure:
+    {'variables':
+        {name: {'units': str, 'xkey': str, 'key': str, 'shape': list,
+                'dtype': str, 'min': float, 'max': float,
+                'stats_key': str, 'sub_variables': None},
+         name_2: {'units': str, 'xkey': str, 'sub_variables':
+                  {sub_name: {'units': str, 'key': str, 'shape': list,
+                              'dtype': str, 'min': float, 'max': float,
+                              'stats_key': str}}},
+         ...},
+     'axes': {x_key: {'nodes': str, 'centres': str}, ...}}
+"""
+import io
+import warnings
+
+import numpy as np
+
+from pemfc_dash import profiling
+from pemfc_dash.lru_cache import LRUCache
+
+OBJECT_DTYPE = 'object'
+
+
+class ResultsExpired(Exception):
+    """
+    Raised by ResultHandle if the run is not stored anymore (evicted by the
+    simulation cache or expired on the backend)
+    """
+
+    def __init__(self, run_id):
+        super().__init__(f'Results of run {run_id} are not available anymore')
+        self.run_id = run_id
+
+
+def pack_array(value, dtype=np.float64):
+    """
+    Convert value to contiguous array of given dtype and serialize it in
+    .npy format; returns (bytes, shape, dtype name)
+    """
+    array = np.ascontiguousarray(np.asarray(value, dtype=dtype))
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue(), list(array.shape), array.dtype.name
+
+
+def unpack_array(data):
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+def value_range(array):
+    """
+    (min, max) of the finite values of array or (None, None)
+    """
+    finite = array[np.isfinite(array)] if array.dtype.kind == 'f' else array
+    if finite.size == 0:
+        return None, None
+    return float(finite.min()), float(finite.max())
+
+
+def cell_statistics(array):
+    """
+    Minimum, maximum and mean of each row (cell) of array as array of shape
+    (3, number of rows); NaN values are ignored
+    """
+    rows = np.atleast_2d(array)
+    if rows.shape[-1] == 0:
+        return np.full((3, rows.shape[0]), np.nan)
+    rows = rows.reshape(rows.shape[0], -1)
+    with warnings.catch_warnings():
+        # rows of NaN values only
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.array([np.nanmin(rows, axis=1), np.nanmax(rows, axis=1),
+                         np.nanmean(rows, axis=1)])
+
+
+def node_axis(array):
+    """
+    Coordinates of the nodes (first row of arrays with one row per cell)
+    """
+    array = np.asarray(array)
+    return array[0] if array.ndim > 1 else array
+
+
+def centre_axis(nodes):
+    """
+    Cell-centred coordinates between consecutive nodes (as
+    pemfc.src.interpolation.interpolate_1d)
+    """
+    return 0.5 * (nodes[:-1] + nodes[1:])
+
+
+def _manifest_entry(var):
+    entry = {key: var.get(key) for key in ('units', 'shape', 'min', 'max')}
+    if 'xkey' in var:
+        entry['xkey'] = var['xkey']
+    if 'sub_variables' in var:
+        entry['sub_variables'] = None if var['sub_variables'] is None else \
+            {sub_name: _manifest_entry(sub_var)
+             for sub_name, sub_var in var['sub_variables'].items()}
+    return entry
+
+
+def build_manifest(index, global_data):
+    """
+    Compact description of a run for the result widgets
+    """
+    return {'global_data': global_data,
+            'variables': {name: _manifest_entry(var) for name, var
+                          in index['variables'].items()}}
+
+
+class ResultStore:
+    """
+    Stores simulation results as index plus one entry per local variable on a
+    cachelib compatible backend (RedisStore, FileSystemStore)
+    """
+
+    prefix = 'result'
+
+    def __init__(self, backend, dtype=np.float64, timeout=24 * 60 * 60,
+                 memory_cache=None):
+        self.backend = backend
+        self.dtype = dtype
+        self.timeout = timeout
+        if memory_cache is None:
+            memory_cache = LRUCache(max_entries=256, max_bytes=256 * 1024 ** 2)
+        self.memory_cache = memory_cache
+
+    def _load(self, run_id, key):
+        full_key = self._key(run_id, key)
+        return self.memory_cache.get_or_load(
+            full_key, lambda: self.backend.get(full_key))
+
+    def _key(self, run_id, key):
+        return f'{self.prefix}:{run_id}:{key}'
+
+    def _store_value(self, run_id, key, value, timeout):
+        """
+        Store single result value and return its index entry
+        """
+        try:
+            with profiling.stage('result_conversion'):
+                array = np.ascontiguousarray(np.asarray(value,
+                                                        dtype=self.dtype))
+                data, shape, dtype = pack_array(array, dtype=self.dtype)
+        except (ValueError, TypeError):
+            # non-numeric values are stored as they are
+            self.backend.set(self._key(run_id, key), value, timeout=timeout)
+            return {'key': key, 'shape': [], 'dtype': OBJECT_DTYPE,
+                    'min': None, 'max': None, 'stats_key': None}
+        self.backend.set(self._key(run_id, key), data, timeout=timeout)
+        with profiling.stage('result_conversion'):
+            min_value, max_value = value_range(array)
+            stats = pack_array(cell_statistics(array))[0]
+        stats_key = key + ':stats'
+        self.backend.set(self._key(run_id, stats_key), stats,
+                         timeout=timeout)
+        return {'key': key, 'shape': shape, 'dtype': dtype,
+                'min': min_value, 'max': max_value, 'stats_key': stats_key}
+
+    def _store_axes(self, run_id, local_data, variables, timeout):
+        """
+        Store node and cell-centred coordinates of all x-axis variables
+        (and the cells) and return their index entries
+        """
+        x_keys = {var['xkey'] for var in variables.values() if var['xkey']}
+        x_keys.add('Cells')
+        axes = {}
+        for i, name in enumerate(local_data):
+            var = variables[name]
+            if name not in x_keys or var['sub_variables'] is not None \
+                    or var['dtype'] == OBJECT_DTYPE:
+                continue
+            nodes = node_axis(np.asarray(local_data[name]['value'],
+                                         dtype=self.dtype))
+            axes[name] = {}
+            for kind, axis in (('nodes', nodes),
+                               ('centres', centre_axis(nodes))):
+                key = f'axis.{i}.{kind}'
+                self.backend.set(self._key(run_id, key),
+                                 pack_array(axis, dtype=self.dtype)[0],
+                                 timeout=timeout)
+                axes[name][kind] = key
+        return axes
+
+    def store(self, run_id, global_data, local_data, timeout=None):
+        """
+        Store global data, all local variables, the manifest and finally the
+        index, whose presence marks the result as complete
+        """
+        timeout = self.timeout if timeout is None else timeout
+        variables = {}
+        for i, (name, entry) in enumerate(local_data.items()):
+            var = {'units': entry.get('units'), 'xkey': entry.get('xkey')}
+            if 'value' in entry:
+                var.update(self._store_value(run_id, str(i), entry['value'],
+                                             timeout))
+                var['sub_variables'] = None
+            else:
+                var['sub_variables'] = {}
+                for j, (sub_name, sub_entry) in enumerate(entry.items()):
+                    if not isinstance(sub_entry, dict) \
+                            or 'value' not in sub_entry:
+                        continue
+                    sub_var = {'units': sub_entry.get('units')}
+                    sub_var.update(self._store_value(
+                        run_id, f'{i}.{j}', sub_entry['value'], timeout))
+                    var['sub_variables'][sub_name] = sub_var
+            variables[name] = var
+        index = {'variables': variables,
+                 'axes': self._store_axes(run_id, local_data, variables,
+                                          timeout)}
+        self.backend.set(self._key(run_id, 'global'), global_data,
+                         timeout=timeout)
+        self.backend.set(self._key(run_id, 'manifest'),
+                         build_manifest(index, global_data), timeout=timeout)
+        self.backend.set(self._key(run_id, 'index'), index, timeout=timeout)
+
+    @staticmethod
+    def _run_keys(index):
+        """
+        Keys of all entries of a run (without prefix and run id)
+        """
+        keys = ['index', 'global', 'manifest']
+        for var in index['variables'].values():
+            entries = [var] if var['sub_variables'] is None \
+                else var['sub_variables'].values()
+            for entry in entries:
+                keys.append(entry['key'])
+                if entry.get('stats_key') is not None:
+                    keys.append(entry['stats_key'])
+        for axis_keys in index.get('axes', {}).values():
+            keys.extend(axis_keys.values())
+        return keys
+
+    def exists(self, run_id):
+        """
+        Check that all entries of the run are stored; runs missing single
+        entries (expired or evicted by the backend) are reported as missing.
+        The manifest is not required, it is rebuilt from the index.
+        """
+        index = self.backend.get(self._key(run_id, 'index'))
+        if index is None:
+            return False
+        return all(self.backend.has(self._key(run_id, key))
+                   for key in self._run_keys(index)
+                   if key not in ('index', 'manifest'))
+
+    def open(self, run_id):
+        return ResultHandle(self, run_id)
+
+    def index(self, run_id):
+        return self._load(run_id, 'index')
+
+    def global_data(self, run_id):
+        return self._load(run_id, 'global')
+
+    def manifest(self, run_id):
+        """
+        Manifest of the run; built from index and global data for runs
+        stored without manifest
+        """
+        manifest = self._load(run_id, 'manifest')
+        if manifest is None:
+            index = self.index(run_id)
+            if index is None:
+                return None
+            manifest = build_manifest(index, self.global_data(run_id))
+        return manifest
+
+    def variable(self, run_id, name, sub_name=None, index=None):
+        """
+        Index entry of a local variable or one of its sub variables
+        """
+        if index is None:
+            index = self.index(run_id)
+        var = index['variables'][name]
+        if sub_name is not None:
+            var = var['sub_variables'][sub_name]
+        return var
+
+    def array(self, run_id, name, sub_name=None, index=None):
+        """
+        Load the values of a single local variable
+        """
+        var = self.variable(run_id, name, sub_name, index=index)
+        if var['dtype'] == OBJECT_DTYPE:
+            return self._load(run_id, var['key'])
+        return self._load_array(run_id, var['key'])
+
+    def _load_array(self, run_id, key):
+        full_key = self._key(run_id, key) + ':array'
+        return self.memory_cache.get_or_load(
+            full_key, lambda: self._unpack(run_id, key))
+
+    def axes(self, run_id, x_key, index=None):
+        """
+        Node and cell-centred coordinates of x-axis variable x_key; computed
+        from the variable for runs stored without axes; (None, None) if the
+        run is not stored anymore
+        """
+        if index is None:
+            index = self.index(run_id)
+        keys = index.get('axes', {}).get(x_key)
+        if keys is not None:
+            return self._load_array(run_id, keys['nodes']), \
+                self._load_array(run_id, keys['centres'])
+        values = self.array(run_id, x_key, index=index)
+        if values is None:
+            return None, None
+        nodes = node_axis(values)
+        return nodes, centre_axis(nodes)
+
+    def axis(self, run_id, x_key, n, index=None):
+        """
+        Coordinates of x_key matching n values per cell: the cell-centred
+        coordinates for values between the nodes, otherwise the nodes
+        """
+        nodes, centres = self.axes(run_id, x_key, index=index)
+        if nodes is None or centres is None:
+            return None
+        return centres if len(centres) == n != len(nodes) else nodes
+
+    def statistics(self, run_id, name, sub_name=None, index=None):
+        """
+        Minimum, maximum and mean of a local variable per cell as
+        {'min': array, 'max': array, 'mean': array}
+        """
+        var = self.variable(run_id, name, sub_name, index=index)
+        if var['dtype'] == OBJECT_DTYPE:
+            return None
+        if var.get('stats_key') is not None:
+            stats = self._load_array(run_id, var['stats_key'])
+        else:
+            stats = cell_statistics(self.array(run_id, name, sub_name,
+                                               index=index))
+        return dict(zip(('min', 'max', 'mean'), stats))
+
+    def _unpack(self, run_id, key):
+        data = self.backend.get(self._key(run_id, key))
+        if data is None:
+            return None
+        array = unpack_array(data)
+        # memoized arrays are shared between callbacks
+        array.flags.writeable = False
+        return array
+
+    def delete(self, run_id):
+        index = self.index(run_id)
+        keys = ['index', 'global', 'manifest'] if index is None \
+            else self._run_keys(index)
+        for key in keys:
+            self.backend.delete(self._key(run_id, key))
+            self.memory_cache.discard(self._key(run_id, key))
+            self.memory_cache.discard(self._key(run_id, key) + ':array')
+
+
+class ResultHandle:
+    """
+    Lazy access to the fields of a single stored run; callbacks receive the
+    run id from result_data_store and fetch only the fields they need.
+    Raises ResultsExpired if a field of the run is not stored anymore.
+    """
+
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+
+    def _check(self, value):
+        if value is None:
+            raise ResultsExpired(self.run_id)
+        return value
+
+    @property
+    def index(self):
+        return self._check(self.store.index(self.run_id))
+
+    @property
+    def variables(self):
+        return self.index['variables']
+
+    @property
+    def global_data(self):
+        return self._check(self.store.global_data(self.run_id))
+
+    @property
+    def manifest(self):
+        return self._check(self.store.manifest(self.run_id))
+
+    def variable(self, name, sub_name=None):
+        return self.store.variable(self.run_id, name, sub_name,
+                                   index=self.index)
+
+    def array(self, name, sub_name=None):
+        return self._check(self.store.array(self.run_id, name, sub_name,
+                                            index=self.index))
+
+    def axes(self, x_key):
+        nodes, centres = self.store.axes(self.run_id, x_key,
+                                         index=self.index)
+        return self._check(nodes), self._check(centres)
+
+    def axis(self, x_key, n):
+        return self._check(self.store.axis(self.run_id, x_key, n,
+                                           index=self.index))
+
+    def statistics(self, name, sub_name=None):
+        return self.store.statistics(self.run_id, name, sub_name,
+                                     index=self.index)
@@ -0,0 +1,335 @@
+"""
+Simulation runner for the pemfc core module
+
+The default settings.json of the pemfc core module is loaded only once per
+process and kept as read-only template. User inputs are applied to a
+copy-on-write view of the template: only the sections actually accessed
+are copied, all other sections are shared with the template. The changed
+values form a canonical overlay (diff to the template), which identifies
+the simulation settings for caching and logging.
+
+Simulations run as background job publish their progress (iteration,
+convergence error, elapsed time) after each solver iteration and check
+whether they have been cancelled, see ProgressReporter.
+
+The solver is a pluggable backend chosen by the environment variable
+PEMFC_DASH_SIMULATION_BACKEND: 'pemfc' (default) runs the pemfc core
+module, 'fake' returns synthetic results after a configurable latency (see
+pemfc_dash.fake_solver) for load tests of the web tier.
+"""
+import contextlib
+import copy
+import functools
+import json
+import logging
+import os
+import time
+
+from pemfc_gui import data_transfer
+
+from pemfc_dash import jobs, profiling
+from pemfc_dash.simulation_cache import settings_digest
+
+# Settings which are always changed for simulations started by the dashboard
+OUTPUT_OVERRIDES = {('output', 'save_csv'): False,
+                    ('output', 'save_plot'): False}
+
+_MISSING = object()
+
+# Solver method called once per iteration of pemfc.src.simulation.Simulation
+# returning the convergence errors (current_error, temp_error); wrapped to
+# report progress
+PROGRESS_HOOK = ('pemfc.src.simulation', 'Simulation',
+                 'calc_convergence_criteria')
+# Maximum number of points of the published convergence history
+MAX_HISTORY = 500
+
+SIMULATION_BACKEND = os.environ.get('PEMFC_DASH_SIMULATION_BACKEND', 'pemfc')
+
+logger = logging.getLogger(__name__)
+
+
+class _CopyOnWriteDict(dict):
+    """
+    Shallow copy of a settings section; nested sections are wrapped and
+    lists are deep-copied (they may hold sections) when accessed for the
+    first time, so any changes never reach the template and untouched
+    sections remain shared with it
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # keys of lists already copied from the template
+        self._copied = set()
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, dict) \
+                and not isinstance(value, _CopyOnWriteDict):
+            value = _CopyOnWriteDict(value)
+            super().__setitem__(key, value)
+        elif isinstance(value, list) and key not in self._copied:
+            value = copy.deepcopy(value)
+            super().__setitem__(key, value)
+            self._copied.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._copied.add(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+
+def _materialize(value):
+    """
+    Convert copy-on-write sections back to plain dictionaries
+    """
+    if isinstance(value, _CopyOnWriteDict):
+        return {key: _materialize(val) for key, val in dict.items(value)}
+    if isinstance(value, list):
+        return [_materialize(val) for val in value]
+    return value
+
+
+def _overlay(value, template, path=()):
+    """
+    Changed values of a copy-on-write view compared to the template as
+    {'section/.../key': value}; removed keys are given as None
+    """
+    overlay = {}
+    for key, val in dict.items(value):
+        base = template.get(key, _MISSING)
+        if isinstance(val, _CopyOnWriteDict) and isinstance(base, dict):
+            overlay.update(_overlay(val, base, path + (key,)))
+        elif val is not base:
+            val = _materialize(val)
+            if val != base:
+                overlay['/'.join(path + (key,))] = val
+    for key in template:
+        if key not in value:
+            overlay['/'.join(path + (key,))] = None
+    return overlay
+
+
+@functools.lru_cache(maxsize=None)
+def _settings_template():
+    """
+    Default simulation settings from the settings.json file in the pemfc
+    core module together with their digest
+    """
+    import pemfc
+
+    pemfc_base_dir = os.path.dirname(pemfc.__file__)
+    with open(os.path.join(pemfc_base_dir, 'settings', 'settings.json')) \
+            as file:
+        template = json.load(file)
+    return template, settings_digest(template)
+
+
+def template_digest():
+    return _settings_template()[1]
+
+
+def prepare_settings(input_data, overrides=None):
+    """
+    Default simulation settings changed according to the dashboard user
+    input and the given overrides ({(section, ..., key): value}).
+
+    Returns the settings and their overlay on the default settings. Sections
+    without changes are shared with the template, so the settings must not
+    be modified afterwards (the job queues pass them to the workers as
+    pickled copies).
+    """
+    template = _settings_template()[0]
+    settings = _CopyOnWriteDict(template)
+    with profiling.stage('gui_to_sim_transfer'):
+        settings, _ = data_transfer.gui_to_sim_transfer(input_data, settings)
+    if not isinstance(settings, _CopyOnWriteDict):
+        settings = _CopyOnWriteDict(settings)
+    for path, value in (overrides or {}).items():
+        section = settings
+        for key in path[:-1]:
+            section = section[key]
+        section[path[-1]] = value
+    overlay = _overlay(settings, template)
+    return _materialize(settings), overlay
+
+
+def create_settings(input_data, overrides=None):
+    """
+    Default simulation settings from the settings.json file in the pemfc core
+    module, changed according to the dashboard user input
+    """
+    return prepare_settings(input_data, overrides)[0]
+
+
+def settings_key(overlay):
+    """
+    Run id of settings given by their overlay on the default settings
+    """
+    return settings_digest({'template': template_digest(),
+                            'overlay': overlay})
+
+
+def convergence_error(criteria):
+    """
+    Convergence error from the return value of the PROGRESS_HOOK method
+    (current_error, temp_error) or None; the current error is reported
+    """
+    if isinstance(criteria, (list, tuple)):
+        criteria = criteria[0] if criteria else None
+    try:
+        return float(criteria)
+    except (TypeError, ValueError):
+        return None
+
+
+class ProgressReporter:
+    """
+    Publishes the progress of the simulation job at most every interval
+    seconds; the convergence history is thinned out to MAX_HISTORY points
+    """
+
+    def __init__(self, job, interval=0.5):
+        self.job = job
+        self.interval = interval
+        self.start = time.time()
+        self.published = 0.0
+        self.iteration = 0
+        self.history = []
+
+    def update(self, error=None):
+        self.iteration += 1
+        if error is not None:
+            self.history.append([self.iteration, error])
+            if len(self.history) > MAX_HISTORY:
+                self.history = self.history[::2]
+        now = time.time()
+        if now - self.published >= self.interval:
+            self.published = now
+            self.publish()
+        # cooperative abort between iterations
+        self.job.check()
+
+    def publish(self):
+        self.job.publish({'iteration': self.iteration,
+                          'error': self.history[-1][1] if self.history
+                          else None,
+                          'started': self.start,
+                          'elapsed': time.time() - self.start,
+                          'history': self.history})
+
+
+@contextlib.contextmanager
+def report_progress(job):
+    """
+    Wrap the iteration method of the pemfc solver (PROGRESS_HOOK) to report
+    progress to job; if the pemfc version in use does not provide this
+    method, a warning is logged and only the elapsed time is reported
+    """
+    reporter = ProgressReporter(job)
+    reporter.publish()
+    module_name, class_name, method_name = PROGRESS_HOOK
+    try:
+        module = __import__(module_name, fromlist=[class_name])
+    except ImportError:
+        module = None
+    solver_class = getattr(module, class_name, None)
+    method = getattr(solver_class, method_name, None)
+    if method is None:
+        logger.warning('Solver method %s not found, the simulation '
+                       'progress is not reported', '.'.join(PROGRESS_HOOK))
+        yield reporter
+        return
+
+    @functools.wraps(method)
+    def hooked(solver, *args, **kwargs):
+        result = method(solver, *args, **kwargs)
+        reporter.update(convergence_error(result))
+        return result
+
+    setattr(solver_class, method_name, hooked)
+    try:
+        yield reporter
+    finally:
+        setattr(solver_class, method_name, method)
+        reporter.publish()
+
+
+class SimulationBackend:
+    """
+    Interface of simulation backends
+    """
+
+    def run(self, settings):
+        """
+        Simulate settings and return [global_data, local_data] of the first
+        operating point
+        """
+        raise NotImplementedError
+
+
+class PemfcBackend(SimulationBackend):
+    """
+    Solver of the pemfc core module; progress is reported if run as
+    background job
+    """
+
+    def run(self, settings):
+        from pemfc import main_app
+
+        job = jobs.current_job()
+        with report_progress(job) if job is not None \
+                else contextlib.nullcontext(), profiling.stage('solver'):
+            global_data, local_data, sim = \
+                main_app.main(settings=settings, save_settings=False)
+        with profiling.stage('result_conversion'):
+            return [global_data[0], local_data[0]]
+
+
+def _fake_backend():
+    from pemfc_dash.fake_solver import FakeBackend
+    return FakeBackend.from_environment()
+
+
+BACKENDS = {'pemfc': PemfcBackend, 'fake': _fake_backend}
+
+
+def register_backend(name, factory):
+    """
+    Make backend created by factory() available as name; backends created
+    before are discarded, so a replaced backend takes effect
+    """
+    BACKENDS[name] = factory
+    get_backend.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend(name=None):
+    name = SIMULATION_BACKEND if name is None else name
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise ValueError('Unknown simulation backend: {}'.format(name))
+    return factory()
+
+
+def run(settings):
+    """
+    Run simulation with the configured backend and return global and local
+    results of the first operating point
+    """
+    return get_backend().run(settings)
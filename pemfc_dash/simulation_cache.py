@@ -0,0 +1,181 @@
+"""
+Content-addressed cache for simulation results
+
+Results are stored in the ResultStore on the server-side caching backend
+(RedisStore or FileSystemStore) under a run id derived from a canonical hash
+of the simulation settings (see simulation.settings_key). Identical settings
+therefore return the stored result instead of running the pemfc solver
+again.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+
+from pemfc_dash.locks import ThreadLocks
+
+
+def _json_default(obj):
+    """
+    Fallback for json.dumps to serialize numpy scalars and arrays as well as
+    any other object by its string representation
+    """
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+@functools.lru_cache(maxsize=None)
+def _pemfc_version():
+    """
+    Version of the pemfc core module, imported only when needed (the fake
+    simulation backend runs without it)
+    """
+    try:
+        import pemfc
+    except ImportError:
+        return ''
+    return getattr(pemfc, '__version__', '')
+
+
+def settings_digest(settings):
+    """
+    Canonical hash of a settings dictionary (independent of key order)
+    """
+    canonical = json.dumps(settings, sort_keys=True, separators=(',', ':'),
+                           default=_json_default)
+    version = _pemfc_version()
+    return hashlib.sha256(
+        (version + canonical).encode('utf-8')).hexdigest()
+
+
+class SimulationCache:
+    """
+    Result cache with size- and age-based eviction on top of a ResultStore.
+    Results are stored with the settings digest as run id, so a cache hit
+    returns the run id of the stored result.
+
+    The digests of all stored results are tracked with the time of their
+    last use in an index entry on the backend itself, changed within a lock
+    shared by all processes (see pemfc_dash.locks), so eviction of the least
+    recently used results works across processes sharing the backend.
+    Results are stored without timeout and removed by this eviction only:
+    once unused for max_age seconds or as least recently used beyond
+    max_entries. Index entries of results which are not stored completely
+    anymore are dropped on lookup. Hit/miss counters are kept per process
+    (summed on /metrics).
+    """
+
+    prefix = 'simulation_cache'
+    # Minimum seconds between two updates of the last use of a result
+    TOUCH_INTERVAL = 60.0
+
+    def __init__(self, results, max_entries=50, max_age=24 * 60 * 60,
+                 locks=None):
+        self.results = results
+        self.backend = results.backend
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.locks = ThreadLocks() if locks is None else locks
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _index_lock(self):
+        return self.locks.lock(self._key('index'))
+
+    def _key(self, digest):
+        return f'{self.prefix}:{digest}'
+
+    def _load_index(self):
+        return self.backend.get(self._key('index')) or {}
+
+    def _store_index(self, index):
+        self.backend.set(self._key('index'), index, timeout=0)
+
+    def get(self, digest):
+        """
+        Return run id of the stored result for the given settings digest or
+        None
+        """
+        found = self.results.exists(digest)
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if found:
+            self.touch(digest)
+        else:
+            self.discard(digest)
+        return digest if found else None
+
+    def touch(self, digest):
+        """
+        Mark the result as used now, so it is evicted after results not
+        used since; updates within TOUCH_INTERVAL are skipped
+        """
+        now = time.time()
+        index = self._load_index()
+        if digest not in index or now - index[digest] < self.TOUCH_INTERVAL:
+            return
+        with self._index_lock():
+            index = self._load_index()
+            if digest in index:
+                index[digest] = now
+                self._store_index(index)
+
+    def discard(self, digest):
+        """
+        Drop the index entry of a result which is not stored completely
+        anymore and delete its remaining entries
+        """
+        if digest not in self._load_index():
+            return
+        with self._index_lock():
+            index = self._load_index()
+            if index.pop(digest, None) is None:
+                return
+            self._store_index(index)
+        self.results.delete(digest)
+
+    def set(self, digest, result):
+        """
+        Store result ([global_data, local_data]) for the given settings
+        digest and evict expired entries as well as the least recently used
+        entries exceeding max_entries; returns the run id
+        """
+        # evicted by the index only, so results in use do not expire
+        self.results.store(digest, *result, timeout=0)
+
+        with self._index_lock():
+            now = time.time()
+            index = self._load_index()
+            index[digest] = now
+            expired = [k for k, t in index.items()
+                       if self.max_age and now - t > self.max_age]
+            oldest = sorted((k for k in index if k not in expired),
+                            key=index.get)
+            expired += oldest[:max(len(oldest) - self.max_entries, 0)]
+            for k in expired:
+                del index[k]
+            self._store_index(index)
+        for k in expired:
+            self.results.delete(k)
+        return digest
+
+    def clear(self):
+        with self._index_lock():
+            index = self._load_index()
+            self._store_index({})
+        for k in index:
+            self.results.delete(k)
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {'hits': hits, 'misses': misses,
+                'hit_ratio': hits / total if total else 0.0,
+                'entries': len(self._load_index())}
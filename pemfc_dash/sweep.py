@@ -0,0 +1,105 @@
+"""
+Parameter sweeps over one or more dashboard inputs, e.g. to build
+polarization curves or sensitivity studies
+"""
+import copy
+import itertools
+
+import numpy as np
+
+from pemfc_dash.admission import AdmissionError
+
+MAX_POINTS = 200
+
+
+def parameter_values(start, stop, steps):
+    """
+    Evenly spaced values for a single sweep parameter
+    """
+    steps = int(steps)
+    if steps < 1:
+        raise ValueError('Number of steps must be at least 1')
+    return np.linspace(float(start), float(stop), steps).tolist()
+
+
+def sweep_grid(parameters):
+    """
+    Create all combinations of parameter values
+
+    parameters: list of dicts {'id': ..., 'start': ..., 'stop': ...,
+        'steps': ...} as edited in the sweep parameter table
+    Returns list of dicts {id1: value1, id2: value2, ...}
+    """
+    ids = [p['id'] for p in parameters]
+    values = [parameter_values(p['start'], p['stop'], p['steps'])
+              for p in parameters]
+    n_points = int(np.prod([len(v) for v in values]))
+    if n_points > MAX_POINTS:
+        raise ValueError(f'Sweep contains {n_points} points, only '
+                         f'{MAX_POINTS} points are allowed')
+    return [dict(zip(ids, point)) for point in itertools.product(*values)]
+
+
+def point_input_data(input_data, point):
+    """
+    Input data (as created in generate_inputs) with the values of a single
+    sweep point
+    """
+    new_input_data = copy.deepcopy(input_data)
+    for id_l, val in point.items():
+        if isinstance(new_input_data[id_l]['value'], int):
+            val = int(round(val))
+        new_input_data[id_l]['value'] = val
+    return new_input_data
+
+
+def result_row(point, global_data):
+    """
+    Row of the sweep results table from the global results of a single point
+    """
+    row = dict(point)
+    for k, v in global_data.items():
+        val = v['value']
+        row[k] = val.tolist() if hasattr(val, 'tolist') else val
+    return row
+
+
+def submit_points(jobs, window, submit):
+    """
+    Submit the points of a sweep which have not been submitted yet, as long
+    as less than window of its jobs are in flight, so a large sweep neither
+    exceeds the admission queue of its session nor blocks other runs of
+    the session; called again whenever jobs of the sweep have finished
+
+    jobs: list of dicts {'point': ..., 'job_id': ...} with job_id None for
+        points not submitted yet
+    submit: function submit(point) -> (job_id, run_id) submitting the job
+        of a point, run_id is the run id of results available already (None
+        if a job has been submitted); raises AdmissionError if the job
+        cannot be accepted now
+    Returns jobs still pending (submitted or not) and finished points as
+    list of tuples (point, run_id, error)
+    """
+    in_flight = sum(1 for job in jobs if job['job_id'] is not None)
+    pending = []
+    finished = []
+    for job in jobs:
+        if job['job_id'] is not None or in_flight >= window:
+            pending.append(job)
+            continue
+        try:
+            job_id, run_id = submit(job['point'])
+        except AdmissionError:
+            # retried when the sweep is polled next time
+            in_flight = window
+            pending.append(job)
+            continue
+        except Exception as E:
+            finished.append((job['point'], None, repr(E)))
+            continue
+        if run_id is not None:
+            finished.append((job['point'], run_id, None))
+        else:
+            pending.append({**job, 'job_id': job_id})
+            in_flight += 1
+    return pending, finished
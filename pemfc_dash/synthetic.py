@@ -0,0 +1,115 @@
+"""
+Synthetic simulation results shaped like the output of the pemfc core module
+
+Results are generated from smooth profiles along the channel with cell to
+cell variation and seeded noise, so repeated calls with the same arguments
+return identical data. Used by the benchmarks and the fake solver backend
+in place of real simulations.
+
+Structure (as returned by simulation.run):
+    global_data: {name: {'value': float, 'units': str}}
+    local_data: {name: {'value': array, 'units': str, 'xkey': str},
+                 name_2: {'xkey': str,
+                          sub_name: {'value': array, 'units': str}, ...}}
+with arrays of shape (cells, nodes) for node values and (cells, nodes - 1)
+for values between the nodes.
+"""
+import numpy as np
+
+X_KEY = 'Channel Location'
+
+# name: (units, offset, amplitude, between nodes)
+LOCAL_VARIABLES = {
+    'Current Density': ('A/m²', 10000.0, 2000.0, True),
+    'Membrane Temperature': ('K', 343.15, 5.0, True),
+    'Membrane Water Content': ('-', 10.0, 4.0, True),
+    'Coolant Temperature': ('K', 338.15, 8.0, False),
+    'Cathode Channel Pressure': ('Pa', 101325.0, 5000.0, False),
+    'Anode Channel Pressure': ('Pa', 101325.0, 3000.0, False),
+    'Cathode Channel Velocity': ('m/s', 5.0, 2.0, False),
+    'Anode Channel Velocity': ('m/s', 3.0, 1.0, False),
+}
+
+# name: (units, {sub_name: (offset, amplitude)}, between nodes)
+SUB_VARIABLES = {
+    'Cathode Channel Mole Fraction':
+        ('-', {'O2': (0.21, -0.1), 'N2': (0.7, 0.02), 'H2O': (0.09, 0.08)},
+         False),
+    'Anode Channel Mole Fraction':
+        ('-', {'H2': (0.9, -0.3), 'H2O': (0.1, 0.3)}, False),
+    'Cathode Channel Gas Temperature':
+        ('K', {'Gas': (343.15, 6.0), 'Wall': (342.15, 6.0)}, False),
+}
+
+
+def _profile(rng, n_cells, n_nodes, offset, amplitude):
+    """
+    Smooth profile along the channel for each cell with cell to cell
+    variation (higher at the stack ends) and small noise
+    """
+    x = np.linspace(0.0, 1.0, n_nodes)
+    cells = np.linspace(-1.0, 1.0, n_cells)[:, np.newaxis] \
+        if n_cells > 1 else np.zeros((1, 1))
+    shape = np.sin(np.pi * x) * (1.0 - 0.3 * x)
+    values = offset + amplitude * (shape[np.newaxis] * (1.0 + 0.1 * cells ** 2)
+                                   + 0.01 * rng.standard_normal(
+                                       (n_cells, n_nodes)))
+    return values
+
+
+def global_results(n_cells=10, seed=0):
+    rng = np.random.default_rng(seed)
+    cell_voltage = 0.7 + 0.01 * rng.standard_normal()
+    current_density = 10000.0
+    area = 0.01
+    return {
+        'Stack Voltage': {'value': cell_voltage * n_cells, 'units': 'V'},
+        'Average Cell Voltage': {'value': cell_voltage, 'units': 'V'},
+        'Minimum Cell Voltage': {'value': cell_voltage - 0.01,
+                                 'units': 'V'},
+        'Maximum Cell Voltage': {'value': cell_voltage + 0.01,
+                                 'units': 'V'},
+        'Average Current Density': {'value': current_density,
+                                    'units': 'A/m²'},
+        'Stack Power': {'value': cell_voltage * n_cells * current_density
+                        * area, 'units': 'W'},
+        'Stack Power Density': {'value': cell_voltage * current_density,
+                                'units': 'W/m²'},
+        'Cathode Stoichiometry': {'value': 2.0, 'units': '-'},
+        'Anode Stoichiometry': {'value': 1.5, 'units': '-'},
+    }
+
+
+def local_results(n_cells=10, n_nodes=100, seed=0):
+    rng = np.random.default_rng(seed)
+    location = np.linspace(0.0, 0.4, n_nodes)
+    local_data = {
+        X_KEY: {'value': np.tile(location, (n_cells, 1)), 'units': 'm',
+                'xkey': None},
+        'Cells': {'value': np.arange(n_cells, dtype=float), 'units': '-',
+                  'xkey': None},
+    }
+    for name, (units, offset, amplitude, elements) \
+            in LOCAL_VARIABLES.items():
+        n = n_nodes - 1 if elements else n_nodes
+        local_data[name] = {
+            'value': _profile(rng, n_cells, n, offset, amplitude),
+            'units': units, 'xkey': X_KEY}
+    for name, (units, sub_variables, elements) in SUB_VARIABLES.items():
+        n = n_nodes - 1 if elements else n_nodes
+        entry = {'xkey': X_KEY}
+        for sub_name, (offset, amplitude) in sub_variables.items():
+            entry[sub_name] = {
+                'value': _profile(rng, n_cells, n, offset, amplitude),
+                'units': units}
+        local_data[name] = entry
+    return local_data
+
+
+def synthetic_results(n_cells=10, n_nodes=100, seed=0):
+    """
+    [global_data, local_data] of a synthetic run, as returned by
+    simulation.run
+    """
+    return [global_results(n_cells, seed), local_results(n_cells, n_nodes,
+                                                         seed)]
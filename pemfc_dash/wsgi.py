@@ -0,0 +1,26 @@
+"""
+App factory for WSGI servers
+
+create_server imports pemfc and plotly, loads the default simulation
+settings, registers all callbacks and renders the layout of every settings
+tab. With gunicorn preload_app (see gunicorn.conf.py) this happens once in
+the master process; the forked workers and their job processes share this
+memory copy-on-write. Connections to the caching backend
+are created by each worker on first use (see dash_app.ProcessLocal).
+"""
+
+
+def create_server(prerender=True):
+    # the simulation module imports the pemfc solver lazily (see
+    # simulation.PemfcBackend), so it is imported here explicitly
+    import pemfc.main_app  # noqa: F401
+    import pemfc_gui.input as gui_input
+    from pemfc_dash import dash_layout as dl, simulation
+    from pemfc_dash.main import app
+
+    simulation._settings_template()
+
+    if prerender:
+        for n in range(len(gui_input.main_frame_dicts)):
+            dl.tab_content(gui_input.main_frame_dicts, n)
+    return app.server
@@ -0,0 +1,71 @@
+from pemfc_dash import jobs
+
+
+class MemoryBackend:
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class ManualJobQueue(jobs.JobQueue):
+    """
+    Job queue executing its queued jobs on calls of run_all
+    """
+
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.queued = {}
+
+    def submit(self, job_id, func, *args):
+        if self.is_active(job_id):
+            return job_id
+        self._set_state(job_id, jobs.QUEUED)
+        self.queued[job_id] = (func, args)
+        return job_id
+
+    def run_all(self):
+        queued, self.queued = self.queued, {}
+        for job_id, (func, args) in queued.items():
+            self._execute(job_id, func, args)
+
+
+def file_system_store(path):
+    """
+    cachelib file system cache as created by
+    dash_app.create_file_system_store (FileSystemStore of dash_extensions
+    only adds loading of expired entries)
+    """
+    from cachelib import FileSystemCache
+    return FileSystemCache(str(path), threshold=0)
+
+
+def local_results(seed=0, n_cells=4, n_nodes=11, n_variables=12):
+    """
+    Synthetic [global_data, local_data] in the format of the pemfc solver
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    local_data = {'Channel Location': {
+        'value': np.tile(np.linspace(0.0, 0.4, n_nodes), (n_cells, 1)),
+        'units': 'm', 'xkey': None}}
+    local_data['Cells'] = {'value': np.arange(n_cells), 'units': '-',
+                           'xkey': None}
+    for i in range(n_variables):
+        local_data[f'Variable {i}'] = {
+            'value': rng.random((n_cells, n_nodes - 1)) + seed,
+            'units': '-', 'xkey': 'Channel Location'}
+    local_data['Temperature'] = {
+        'Cathode': {'value': rng.random((n_cells, n_nodes)), 'units': 'K'},
+        'Anode': {'value': rng.random((n_cells, n_nodes)), 'units': 'K'}}
+    global_data = {'Stack Voltage': {'value': 0.7 * n_cells, 'units': 'V'}}
+    return [global_data, local_data]
@@ -0,0 +1,65 @@
+import pytest
+
+from pemfc_dash import jobs
+from pemfc_dash.admission import AdmissionControl
+
+from .helpers import ManualJobQueue, MemoryBackend, file_system_store, \
+    local_results
+
+
+def admission_control(**kwargs):
+    return AdmissionControl(ManualJobQueue(MemoryBackend()), **kwargs)
+
+
+def test_cancel_keeps_job_joined_by_other_session():
+    admission = admission_control()
+    assert admission.request('job', 'a', abs, 1) is None
+    assert admission.request('job', 'b', abs, 1) is None
+
+    assert not admission.cancel('job', 'a')
+    assert admission.job_queue.is_active('job')
+    assert admission.cancel('job', 'b')
+
+
+def test_cancel_keeps_waiting_job_joined_by_other_session():
+    admission = admission_control(max_active=1)
+    admission.request('running', 'c', abs, 1)
+    assert admission.request('job', 'a', abs, 1) == 1
+    assert admission.request('job', 'b', abs, 1) == 1
+
+    assert not admission.cancel('job', 'a')
+    assert admission.poll(['job']) == {'job': 1}
+    assert admission.cancel('job', 'b')
+    assert admission.poll(['job']) == {'job': None}
+
+
+def test_waiting_job_is_admitted_when_slot_is_free():
+    admission = admission_control(max_active=1)
+    admission.request('first', 'a', abs, 1)
+    assert admission.request('second', 'b', abs, 1) == 1
+
+    admission.job_queue.run_all()
+    assert admission.job_queue.status('first')['state'] == jobs.FINISHED
+    admission.job_queue.discard('first')
+
+    assert admission.poll(['second']) == {'second': None}
+    assert admission.job_queue.is_active('second')
+
+
+def test_state_is_kept_on_file_system_store_with_many_results(tmp_path):
+    pytest.importorskip('numpy')
+    pytest.importorskip('cachelib')
+    pytest.importorskip('flask')
+    from pemfc_dash.results import ResultStore
+
+    backend = file_system_store(tmp_path / 'store')
+    admission = AdmissionControl(ManualJobQueue(backend), max_active=1)
+    admission.request('running', 'a', abs, 1)
+    assert admission.request('waiting', 'b', abs, 1) == 1
+
+    results = ResultStore(backend)
+    for i in range(25):
+        results.store(f'run{i}', *local_results(i), timeout=3600)
+
+    assert admission.stats() == {'active': 1, 'waiting': 1}
+    assert admission.poll(['waiting']) == {'waiting': 1}
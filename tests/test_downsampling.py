@@ -0,0 +1,75 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pemfc_dash import downsampling as ds  # noqa: E402
+
+
+def test_trace_point_budget_has_lower_bound():
+    assert ds.trace_point_budget(4, budget=1000) == 250
+    assert ds.trace_point_budget(1000, budget=1000) == ds.MIN_TRACE_POINTS
+    assert ds.trace_point_budget(0, budget=1000) == 1000
+
+
+def test_decimate_line_keeps_peaks_and_ends():
+    x = np.linspace(0.0, 1.0, 10001)
+    y = np.sin(20 * x)
+    y[4321] = 5.0
+    y[6789] = -5.0
+
+    x_plot, y_plot = ds.decimate_line(x, y, 200)
+
+    assert len(x_plot) <= 202
+    assert y_plot.max() == 5.0 and y_plot.min() == -5.0
+    assert (x_plot[0], x_plot[-1]) == (x[0], x[-1])
+    assert np.all(np.diff(x_plot) > 0)
+
+
+def test_decimate_line_refines_to_x_range():
+    x = np.linspace(0.0, 1.0, 10001)
+    y = np.cos(x)
+
+    x_plot, y_plot = ds.decimate_line(x, y, 200, x_range=[0.51, 0.5])
+
+    # full resolution within the range plus one neighbour on each side
+    assert len(x_plot) == 103
+    assert x_plot[0] < 0.5 and x_plot[-1] > 0.51
+    np.testing.assert_array_equal(y_plot, np.cos(x_plot))
+
+
+def test_short_line_is_unchanged():
+    x, y = np.arange(5), np.arange(5) ** 2
+
+    x_plot, y_plot = ds.decimate_line(x, y, 100)
+
+    np.testing.assert_array_equal(x_plot, x)
+    np.testing.assert_array_equal(y_plot, y)
+
+
+def test_block_average_surface_fits_budget():
+    x = np.linspace(0.0, 1.0, 1000)
+    y = np.arange(101)
+    z = np.add.outer(y, x)
+
+    x_avg, y_avg, z_avg = ds.block_average_surface(x, y, z, max_points=5000)
+
+    assert z_avg.size <= 5000
+    assert z_avg.shape == (len(y_avg), len(x_avg))
+    # averages of a linear function are the function of averaged axes
+    np.testing.assert_allclose(z_avg, np.add.outer(y_avg, x_avg))
+
+
+def test_shorter_last_block_is_averaged_over_its_size():
+    values = np.arange(5.0)
+
+    np.testing.assert_array_equal(ds._block_mean(values, 2, 0),
+                                  [0.5, 2.5, 4.0])
+
+
+def test_small_surface_is_unchanged():
+    x, y = np.arange(10), np.arange(4)
+    z = np.ones((4, 10))
+
+    x_avg, y_avg, z_avg = ds.block_average_surface(x, y, z, max_points=40)
+    np.testing.assert_array_equal(z_avg, z)
+    assert x_avg is x and y_avg is y
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cachelib')
+pytest.importorskip('flask')
+
+from pemfc_dash.results import ResultStore, ResultsExpired  # noqa: E402
+
+from .helpers import file_system_store, local_results  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(file_system_store(tmp_path / 'store'))
+
+
+def test_arrays_are_stored_per_variable(store):
+    global_data, local_data = local_results()
+    store.store('run', global_data, local_data)
+    results = store.open('run')
+
+    np.testing.assert_array_equal(results.array('Variable 2'),
+                                  local_data['Variable 2']['value'])
+    np.testing.assert_array_equal(
+        results.array('Temperature', 'Anode'),
+        local_data['Temperature']['Anode']['value'])
+    assert results.global_data == global_data
+    assert not results.array('Variable 2').flags.writeable
+
+
+def test_axes_and_statistics_are_precomputed(store):
+    _, local_data = local_results()
+    store.store('run', *local_results())
+    results = store.open('run')
+    nodes = local_data['Channel Location']['value'][0]
+
+    np.testing.assert_array_equal(results.axis('Channel Location', 11),
+                                  nodes)
+    np.testing.assert_allclose(results.axis('Channel Location', 10),
+                               0.5 * (nodes[:-1] + nodes[1:]))
+    stats = results.statistics('Variable 0')
+    values = local_data['Variable 0']['value']
+    np.testing.assert_allclose(stats['min'], values.min(axis=1))
+    np.testing.assert_allclose(stats['max'], values.max(axis=1))
+    np.testing.assert_allclose(stats['mean'], values.mean(axis=1))
+
+
+def test_manifest_describes_variables(store):
+    store.store('run', *local_results())
+
+    manifest = store.open('run').manifest
+
+    variable = manifest['variables']['Variable 0']
+    assert variable['shape'] == [4, 10]
+    assert variable['xkey'] == 'Channel Location'
+    assert set(manifest['variables']['Temperature']['sub_variables']) == \
+        {'Cathode', 'Anode'}
+
+
+def test_non_numeric_values_are_stored_as_they_are(store):
+    global_data, local_data = local_results()
+    local_data['Names'] = {'value': ['a', 'b'], 'units': '-', 'xkey': None}
+    store.store('run', global_data, local_data)
+
+    assert store.open('run').array('Names') == ['a', 'b']
+    assert store.open('run').statistics('Names') is None
+
+
+def test_deleted_run_expires(store):
+    store.store('run', *local_results())
+    results = store.open('run')
+    results.array('Variable 0')
+
+    store.delete('run')
+
+    assert not store.exists('run')
+    assert os.listdir(store.backend._path) == []
+    with pytest.raises(ResultsExpired):
+        results.array('Variable 0')
+
+
+def test_partly_removed_run_does_not_exist(store):
+    store.store('run', *local_results())
+    assert store.exists('run')
+    key = store.variable('run', 'Variable 3')['key']
+
+    os.remove(store.backend._get_filename(store._key('run', key)))
+
+    assert not store.exists('run')
+    with pytest.raises(ResultsExpired):
+        store.open('run').array('Variable 3')
+
+
+def test_many_runs_are_kept(store):
+    for i in range(25):
+        store.store(f'run{i}', *local_results(i), timeout=3600)
+
+    assert all(store.exists(f'run{i}') for i in range(25))
+    assert store.open('run0').array('Variable 11').shape == (4, 10)
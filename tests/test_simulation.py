@@ -0,0 +1,123 @@
+import pytest
+
+pytest.importorskip('pemfc_gui')
+
+from pemfc_dash import simulation  # noqa: E402
+from pemfc_dash.simulation_cache import settings_digest  # noqa: E402
+
+
+@pytest.fixture
+def template(monkeypatch):
+    template = {'stack': {'cell_number': 10},
+                'channels': [{'length': 0.4}, {'length': 0.4}]}
+    digest = settings_digest(template)
+    monkeypatch.setattr(simulation, '_settings_template',
+                        lambda: (template, digest))
+    return template
+
+
+def transfer_in_place(input_data, settings):
+    # edits as done by gui_to_sim_transfer: sections within lists are
+    # changed in place
+    for key, value in input_data.items():
+        settings['channels'][0][key] = value
+    return settings, None
+
+
+def test_prepare_settings_keeps_template(template, monkeypatch):
+    monkeypatch.setattr(simulation.data_transfer, 'gui_to_sim_transfer',
+                        transfer_in_place)
+    digest = simulation.template_digest()
+
+    settings, overlay = simulation.prepare_settings({'length': 0.2})
+
+    assert settings['channels'][0]['length'] == 0.2
+    assert settings_digest(template) == digest
+    assert overlay == {'channels': [{'length': 0.2}, {'length': 0.4}]}
+
+
+def test_different_inputs_give_different_keys(template, monkeypatch):
+    monkeypatch.setattr(simulation.data_transfer, 'gui_to_sim_transfer',
+                        transfer_in_place)
+
+    keys = {simulation.settings_key(
+        simulation.prepare_settings({'length': length})[1])
+        for length in (0.2, 0.3, 0.4)}
+
+    assert len(keys) == 3
+
+
+class StubSolver:
+    """
+    Iterates like pemfc.src.simulation.Simulation
+    """
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+
+    def calc_convergence_criteria(self):
+        error = self.errors.pop(0)
+        return error, error / 10.0
+
+    def run(self):
+        while self.errors:
+            self.calc_convergence_criteria()
+
+
+class RecordingJob:
+
+    def __init__(self):
+        self.progress = []
+
+    def publish(self, progress):
+        self.progress.append(progress)
+
+    def check(self):
+        pass
+
+
+def test_report_progress_hooks_solver(monkeypatch):
+    monkeypatch.setattr(simulation, 'PROGRESS_HOOK',
+                        (__name__, 'StubSolver', 'calc_convergence_criteria'))
+    method = StubSolver.calc_convergence_criteria
+    job = RecordingJob()
+
+    with simulation.report_progress(job):
+        StubSolver([1.0, 0.1, 0.01]).run()
+
+    assert StubSolver.calc_convergence_criteria is method
+    assert job.progress[-1]['iteration'] == 3
+    assert job.progress[-1]['error'] == 0.01
+    assert job.progress[-1]['history'] == [[1, 1.0], [2, 0.1], [3, 0.01]]
+
+
+def test_report_progress_warns_without_hook(monkeypatch, caplog):
+    monkeypatch.setattr(simulation, 'PROGRESS_HOOK',
+                        (__name__, 'StubSolver', 'missing_method'))
+    job = RecordingJob()
+
+    with simulation.report_progress(job):
+        StubSolver([1.0]).run()
+
+    assert 'missing_method' in caplog.text
+    assert job.progress[-1]['iteration'] == 0
+
+
+class StubBackend(simulation.SimulationBackend):
+
+    def __init__(self, name):
+        self.name = name
+
+    def run(self, settings):
+        return [{'backend': self.name}, {}]
+
+
+def test_register_backend_replaces_created_backend(monkeypatch):
+    monkeypatch.setattr(simulation, 'BACKENDS', dict(simulation.BACKENDS))
+    simulation.register_backend('stub', lambda: StubBackend('first'))
+    assert simulation.get_backend('stub').name == 'first'
+
+    simulation.register_backend('stub', lambda: StubBackend('second'))
+
+    assert simulation.get_backend('stub').name == 'second'
+    simulation.get_backend.cache_clear()
@@ -0,0 +1,75 @@
+import os
+import struct
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('cachelib')
+pytest.importorskip('flask')
+
+from pemfc_dash.results import ResultStore  # noqa: E402
+from pemfc_dash.simulation_cache import SimulationCache  # noqa: E402
+
+from .helpers import file_system_store, local_results  # noqa: E402
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SimulationCache(ResultStore(file_system_store(tmp_path / 'store')),
+                           max_entries=3)
+
+
+def index(cache):
+    return cache._load_index()
+
+
+def test_hit_and_miss(cache):
+    assert cache.get('run') is None
+    cache.set('run', local_results())
+
+    assert cache.get('run') == 'run'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_run_is_evicted(cache, monkeypatch):
+    for i in range(3):
+        cache.set(f'run{i}', local_results(i))
+    now = max(index(cache).values())
+    monkeypatch.setattr('time.time', lambda: now + cache.TOUCH_INTERVAL)
+
+    assert cache.get('run0') == 'run0'
+    cache.set('run3', local_results(3))
+
+    assert set(index(cache)) == {'run0', 'run2', 'run3'}
+    assert not cache.results.exists('run1')
+
+
+def test_results_are_stored_without_timeout(cache):
+    cache.set('run', local_results())
+    key = cache.results._key('run', 'index')
+
+    with open(cache.backend._get_filename(key), 'rb') as file:
+        # expiry stamp written by cachelib in front of the value
+        expires = struct.unpack('I', file.read(4))[0]
+
+    assert expires == 0
+
+
+def test_partly_removed_run_is_dropped_from_index(cache):
+    cache.set('run', local_results())
+    key = cache.results.variable('run', 'Variable 0')['key']
+    os.remove(cache.backend._get_filename(cache.results._key('run', key)))
+
+    assert cache.get('run') is None
+    assert 'run' not in index(cache)
+    assert cache.backend.get(cache.results._key('run', 'index')) is None
+
+
+def test_index_is_kept_on_file_system_store(tmp_path):
+    cache = SimulationCache(
+        ResultStore(file_system_store(tmp_path / 'store')), max_entries=50)
+    for i in range(25):
+        cache.set(f'run{i}', local_results(i))
+
+    assert len(index(cache)) == 25
+    assert all(cache.get(f'run{i}') == f'run{i}' for i in range(25))
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from pemfc_dash import jobs, sweep  # noqa: E402
+from pemfc_dash.admission import AdmissionControl  # noqa: E402
+
+from .helpers import ManualJobQueue, MemoryBackend  # noqa: E402
+
+
+def test_sweep_of_max_points_completes():
+    job_queue = ManualJobQueue(MemoryBackend())
+    admission = AdmissionControl(job_queue, max_active=4,
+                                 max_session_active=2, max_queued=100,
+                                 max_session_queued=50)
+
+    def submit(point):
+        job_id = 'point-{}'.format(point['x'])
+        admission.request(job_id, 'session', abs, point['x'])
+        return job_id, None
+
+    pending = [{'point': {'x': x}, 'job_id': None}
+               for x in range(sweep.MAX_POINTS)]
+    rows = []
+    for _ in range(10 * sweep.MAX_POINTS):
+        pending, finished = sweep.submit_points(
+            pending, admission.max_session_active, submit)
+        rows.extend(finished)
+        if not pending:
+            break
+        job_queue.run_all()
+        submitted = [job['job_id'] for job in pending if job['job_id']]
+        admission.poll(submitted)
+        still_pending = []
+        for job in pending:
+            status = job_queue.status(job['job_id']) \
+                if job['job_id'] else None
+            if status is not None and status['state'] == jobs.FINISHED:
+                rows.append((job['point'], job['job_id'], None))
+                job_queue.discard(job['job_id'])
+            else:
+                still_pending.append(job)
+        pending = still_pending
+
+    assert not pending
+    assert len(rows) == sweep.MAX_POINTS
+    assert all(error is None for _, _, error in rows)